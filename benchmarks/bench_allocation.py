@@ -0,0 +1,167 @@
+"""Selection throughput and fairness of the allocation algorithms.
+
+Every round, the vitals of `UPDATES` random resources change and the best resource is
+selected, as the Gateway does when new heartbeats come in. The `PriorityAllocation` heap
+is compared with a scan of the whole report for the lowest CPU.
+
+`RoundRobinAllocation` is drained by `CONSUMERS` threads at once, from queues of
+`WEIGHTS`, while they are all backlogged: the share of each queue should match its
+weight. `FairResourceAllocation` serves `TENANTS` tenants with different demands,
+releasing a random running task whenever the capacity is full: their dominant shares
+should stay close to each other.
+
+Run from the repository root with `python -m benchmarks.bench_allocation`.
+"""
+import random
+import threading
+import time
+from collections import Counter
+from queue import Empty
+from typing import Any, Callable, Dict, List, Tuple
+
+from serpytor.components.utils.algorithms.allocation import (
+    FairResourceAllocation, PriorityAllocation, RoundRobinAllocation)
+
+RESOURCES: int = 10000
+UPDATES: int = 10
+ROUNDS: int = 2000
+
+WEIGHTS: List[int] = [5, 3, 1, 1]
+CONSUMERS: int = 4
+ITEMS: int = 50000
+
+TENANTS: Dict[str, Dict[str, float]] = {
+    "cpu-heavy": {"cpu": 30.0, "memory": 5.0},
+    "memory-heavy": {"cpu": 5.0, "memory": 30.0},
+    "balanced": {"cpu": 10.0, "memory": 10.0},
+    "tiny": {"cpu": 1.0, "memory": 1.0},
+}
+SELECTIONS: int = 50000
+
+
+def make_report(rng: random.Random) -> Dict[str, Dict[str, Any]]:
+    return {
+        f"http://10.0.{idx // 250}.{idx % 250}:8100/exec": {
+            "cpu": rng.uniform(0, 100),
+            "memory": rng.uniform(0, 100),
+        }
+        for idx in range(RESOURCES)
+    }
+
+
+def run_rounds(
+    report: Dict[str, Dict[str, Any]],
+    update: Callable[[str, Dict[str, Any]], None],
+    select: Callable[[], str],
+) -> float:
+    """Selections per second."""
+    rng: random.Random = random.Random(1)
+    resources: List[str] = list(report)
+    start_time: float = time.perf_counter()
+    for _ in range(ROUNDS):
+        for resource in rng.sample(resources, UPDATES):
+            update(resource, {"cpu": rng.uniform(0, 100), "memory": rng.uniform(0, 100)})
+        select()
+    return ROUNDS / (time.perf_counter() - start_time)
+
+
+def run_priority() -> None:
+    report: Dict[str, Dict[str, Any]] = make_report(random.Random(0))
+    print(f"{'selection':<28}{'selections/s':>14}")
+
+    scanned: Dict[str, Dict[str, Any]] = dict(report)
+    throughput: float = run_rounds(
+        scanned,
+        scanned.__setitem__,
+        lambda: min(scanned, key=lambda resource: scanned[resource]["cpu"]),
+    )
+    print(f"{'linear scan':<28}{throughput:>14.0f}")
+
+    allocation: PriorityAllocation = PriorityAllocation(sortable_fields=["cpu"])
+    allocation.put(report)
+    throughput = run_rounds(
+        report,
+        lambda resource, vitals: allocation.put({resource: vitals}),
+        allocation.queue,
+    )
+    print(f"{'PriorityAllocation':<28}{throughput:>14.0f}")
+
+
+def run_round_robin() -> None:
+    allocation: RoundRobinAllocation = RoundRobinAllocation(
+        num_queues=len(WEIGHTS), weights=WEIGHTS
+    )
+    for index in range(len(WEIGHTS)):
+        allocation.put(range(ITEMS), index=index)
+    served: List[List[int]] = [[] for _ in range(CONSUMERS)]
+
+    def consume(consumer: int) -> None:
+        # Count the queues served while they are all still backlogged.
+        for _ in range(ITEMS // CONSUMERS):
+            index: int = allocation.next_index()
+            allocation.queue_silo[index].get_nowait()
+            served[consumer].append(index)
+
+    threads: List[threading.Thread] = [
+        threading.Thread(target=consume, args=(consumer,)) for consumer in range(CONSUMERS)
+    ]
+    start_time: float = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    throughput: float = ITEMS / (time.perf_counter() - start_time)
+    print(f"{'RoundRobinAllocation':<28}{throughput:>14.0f}  ({CONSUMERS} threads)")
+
+    counts: Counter = Counter(index for indices in served for index in indices)
+    print(f"{'queue':<8}{'weight':>8}{'expected':>10}{'served':>10}")
+    for index, weight in enumerate(WEIGHTS):
+        print(
+            f"{index:<8}{weight:>8}{weight / sum(WEIGHTS):>10.3f}"
+            f"{counts[index] / ITEMS:>10.3f}"
+        )
+    while True:
+        try:
+            allocation.queue()
+        except Empty:
+            break
+
+
+def run_fair_resource() -> None:
+    rng: random.Random = random.Random(2)
+    allocation: FairResourceAllocation = FairResourceAllocation()
+    allocation.put({f"r{idx}": {"cpu": 0.0, "memory": 0.0} for idx in range(10)})
+    for tenant, demand in TENANTS.items():
+        for idx in range(SELECTIONS):
+            allocation.put(idx, index=tenant, demand=demand)
+    running: List[Tuple[str, Dict[str, float]]] = []
+    shares: Dict[str, float] = {tenant: 0.0 for tenant in TENANTS}
+
+    start_time: float = time.perf_counter()
+    for _ in range(SELECTIONS):
+        allocated = allocation.queue()
+        while allocated is None:
+            tenant, demand = running.pop(rng.randrange(len(running)))
+            allocation.release(tenant, demand)
+            allocated = allocation.queue()
+        running.append((allocated[0], allocated[2]))
+        for tenant in TENANTS:
+            shares[tenant] += allocation.dominant_share(tenant)
+    throughput: float = SELECTIONS / (time.perf_counter() - start_time)
+    print(f"{'FairResourceAllocation':<28}{throughput:>14.0f}  (with the releases)")
+
+    print(f"{'tenant':<16}{'mean dominant share':>20}")
+    for tenant in TENANTS:
+        print(f"{tenant:<16}{shares[tenant] / SELECTIONS:>20.3f}")
+
+
+def run() -> None:
+    run_priority()
+    print()
+    run_round_robin()
+    print()
+    run_fair_resource()
+
+
+if __name__ == "__main__":
+    run()
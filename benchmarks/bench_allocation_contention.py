@@ -0,0 +1,103 @@
+"""Enqueue latency of BaseAllocation.put with many producer threads.
+
+`PRODUCERS` threads put `PUTS` items each, at once. The previous `put`, which took a
+`multiprocessing.Lock` around every enqueue, is compared with the sharded `put` (every
+producer puts in its own queue of the silo, under that queue's mutex only), and with
+batched puts of `BATCH` items.
+
+Run from the repository root with `python -m benchmarks.bench_allocation_contention`.
+"""
+import multiprocessing as mp
+import threading
+import time
+from typing import Any, Callable, List, Tuple
+
+from serpytor.components.connection.monitor.metrics import percentile
+from serpytor.components.utils.algorithms.allocation.base_allocation import \
+    BaseAllocation
+
+PRODUCERS: int = 16
+PUTS: int = 5000
+BATCH: int = 64
+QUEUES: int = 8
+
+
+class LockedAllocation(BaseAllocation):
+    """`BaseAllocation.put` as it was, with a process lock around every put."""
+
+    def __init__(self, *args: Any, **kwargs: Any) -> None:
+        super().__init__(*args, **kwargs)
+        self.process_lock = mp.Lock()
+
+    def put(self, item: Any, index: int = 0, *args: Any, **kwargs: Any) -> None:
+        self.process_lock.acquire()
+        if hasattr(item, "__iter__"):
+            for i in item:
+                self.queue_silo[index].put_nowait(i)
+        else:
+            self.queue_silo[index].put_nowait(item)
+        self.process_lock.release()
+
+
+def run_producers(produce: Callable[[List[float]], None]) -> Tuple[float, List[float]]:
+    """Items put per second, and the latency of every put, in microseconds."""
+    latencies: List[List[float]] = [[] for _ in range(PRODUCERS)]
+    barrier: threading.Barrier = threading.Barrier(PRODUCERS + 1)
+
+    def producer(samples: List[float]) -> None:
+        barrier.wait()
+        produce(samples)
+
+    threads: List[threading.Thread] = [
+        threading.Thread(target=producer, args=(samples,)) for samples in latencies
+    ]
+    for thread in threads:
+        thread.start()
+    barrier.wait()
+    start_time: float = time.perf_counter()
+    for thread in threads:
+        thread.join()
+    elapsed: float = time.perf_counter() - start_time
+    return PRODUCERS * PUTS / elapsed, [value for samples in latencies for value in samples]
+
+
+def single_puts(allocation: BaseAllocation, **put_kwargs: Any) -> Callable[[List[float]], None]:
+    def produce(samples: List[float]) -> None:
+        for idx in range(PUTS):
+            start_time: int = time.perf_counter_ns()
+            allocation.put(idx, **put_kwargs)
+            samples.append((time.perf_counter_ns() - start_time) / 1000)
+
+    return produce
+
+
+def batched_puts(allocation: BaseAllocation) -> Callable[[List[float]], None]:
+    def produce(samples: List[float]) -> None:
+        for start in range(0, PUTS, BATCH):
+            items: List[int] = list(range(start, min(start + BATCH, PUTS)))
+            start_time: int = time.perf_counter_ns()
+            allocation.put(items)
+            samples.append((time.perf_counter_ns() - start_time) / 1000 / len(items))
+
+    return produce
+
+
+def run() -> None:
+    scenarios: List[Tuple[str, Callable[[List[float]], None]]] = [
+        ("mp.Lock, one queue", single_puts(LockedAllocation(num_queues=1), index=0)),
+        ("one queue", single_puts(BaseAllocation(num_queues=1), index=0)),
+        ("sharded", single_puts(BaseAllocation(num_queues=QUEUES))),
+        (f"sharded, batches of {BATCH}", batched_puts(BaseAllocation(num_queues=QUEUES))),
+    ]
+    print(f"{PRODUCERS} producers, {PUTS} items each")
+    print(f"{'put':<28}{'items/s':>12}{'p50 (us)':>10}{'p99 (us)':>10}")
+    for name, produce in scenarios:
+        throughput, latencies = run_producers(produce)
+        print(
+            f"{name:<28}{throughput:>12.0f}"
+            f"{percentile(latencies, 50):>10.2f}{percentile(latencies, 99):>10.2f}"
+        )
+
+
+if __name__ == "__main__":
+    run()
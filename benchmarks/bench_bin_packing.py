@@ -0,0 +1,157 @@
+"""Utilization and makespan of bin-packing placement against FCFS, on a simulated cluster.
+
+`RESOURCES` resources get `TASKS` tasks with CPU and memory requirements (a mix of
+CPU-heavy, memory-heavy and small ones) and random durations, in batches every
+`BATCH_INTERVAL` seconds. FCFS places the tasks in order of arrival, each on the first
+resource it fits on, and waits for room when the next one doesn't fit. Best-fit
+decreasing (`BinPackingAllocation`) packs every pending task it can. Neither oversubscribes
+a resource.
+
+Run from the repository root with `python -m benchmarks.bench_bin_packing`.
+"""
+import heapq
+import random
+import time
+from typing import Any, Callable, Dict, List, Tuple
+
+from serpytor.components.utils.algorithms.allocation import BinPackingAllocation
+
+RESOURCES: int = 20
+TASKS: int = 5000
+BATCH: int = 50
+BATCH_INTERVAL: float = 1.0
+MEAN_DURATION: float = 4.0
+SHAPES: List[Tuple[float, Tuple[float, float], Tuple[float, float]]] = [
+    # (probability, cpu range, memory range)
+    (0.35, (30.0, 70.0), (5.0, 20.0)),
+    (0.35, (5.0, 20.0), (30.0, 70.0)),
+    (0.30, (5.0, 25.0), (5.0, 25.0)),
+]
+
+Task = Tuple[int, float, Dict[str, float], float]
+
+
+def make_tasks() -> List[Task]:
+    """(index, arrival, demand, duration) of the tasks."""
+    rng: random.Random = random.Random(0)
+    tasks: List[Task] = []
+    for idx in range(TASKS):
+        draw: float = rng.random()
+        for probability, cpu, memory in SHAPES:
+            if draw < probability:
+                break
+            draw -= probability
+        demand: Dict[str, float] = {"cpu": rng.uniform(*cpu), "memory": rng.uniform(*memory)}
+        tasks.append((idx, idx // BATCH * BATCH_INTERVAL, demand, rng.expovariate(1 / MEAN_DURATION)))
+    return tasks
+
+
+def fcfs_placer(resources: List[str]) -> Tuple[Callable, Callable, Callable]:
+    free: Dict[str, Dict[str, float]] = {
+        resource: {"cpu": 100.0, "memory": 100.0} for resource in resources
+    }
+    pending: List[Task] = []
+
+    def submit(task: Task) -> None:
+        pending.append(task)
+
+    def place() -> List[Tuple[Task, str]]:
+        placements: List[Tuple[Task, str]] = []
+        while pending:
+            task: Task = pending[0]
+            resource: Any = next(
+                (
+                    resource
+                    for resource in resources
+                    if all(free[resource][key] >= task[2][key] for key in task[2])
+                ),
+                None,
+            )
+            if resource is None:
+                break
+            for key in task[2]:
+                free[resource][key] -= task[2][key]
+            placements.append((pending.pop(0), resource))
+        return placements
+
+    def release(resource: str, demand: Dict[str, float]) -> None:
+        for key in demand:
+            free[resource][key] += demand[key]
+
+    return submit, place, release
+
+
+def bin_packing_placer(resources: List[str]) -> Tuple[Callable, Callable, Callable]:
+    allocation: BinPackingAllocation = BinPackingAllocation()
+    allocation.put({resource: {"cpu": 0.0, "memory": 0.0} for resource in resources})
+
+    def submit(task: Task) -> None:
+        allocation.put(task, demand=task[2])
+
+    def place() -> List[Tuple[Task, str]]:
+        return [(task, resource) for task, resource, _ in allocation.place()]
+
+    return submit, place, allocation.release
+
+
+def simulate(tasks: List[Task], placer: Callable) -> Dict[str, float]:
+    resources: List[str] = [f"http://10.0.0.{idx}:8100/exec" for idx in range(RESOURCES)]
+    submit, place, release = placer(resources)
+    # (time, order, event, payload)
+    events: List[Tuple[float, int, str, Any]] = [
+        (task[1], task[0], "arrival", task) for task in tasks
+    ]
+    heapq.heapify(events)
+    order: int = len(tasks)
+    used: Dict[str, float] = {"cpu": 0.0, "memory": 0.0}
+    area: Dict[str, float] = {"cpu": 0.0, "memory": 0.0}
+    last: float = 0.0
+    waits: List[float] = []
+
+    while events:
+        now, _, event, payload = heapq.heappop(events)
+        for key in used:
+            area[key] += used[key] * (now - last)
+        last = now
+        if event == "arrival":
+            submit(payload)
+        else:
+            task, resource = payload
+            release(resource, task[2])
+            for key in used:
+                used[key] -= task[2][key]
+        for task, resource in place():
+            waits.append(now - task[1])
+            for key in used:
+                used[key] += task[2][key]
+            order += 1
+            heapq.heappush(events, (now + task[3], order, "done", (task, resource)))
+
+    capacity: float = 100.0 * RESOURCES * last
+    return {
+        "makespan": last,
+        "cpu": area["cpu"] / capacity,
+        "memory": area["memory"] / capacity,
+        "wait": sum(waits) / len(waits),
+    }
+
+
+def run() -> None:
+    tasks: List[Task] = make_tasks()
+    print(f"{RESOURCES} resources, {TASKS} tasks in batches of {BATCH}")
+    print(
+        f"{'placement':<22}{'makespan (s)':>14}{'cpu util':>10}{'mem util':>10}"
+        f"{'mean wait (s)':>15}{'wall (s)':>10}"
+    )
+    for name, placer in (("FCFS, first fit", fcfs_placer), ("best-fit decreasing", bin_packing_placer)):
+        start_time: float = time.perf_counter()
+        result: Dict[str, float] = simulate(tasks, placer)
+        elapsed: float = time.perf_counter() - start_time
+        print(
+            f"{name:<22}{result['makespan']:>14.1f}{result['cpu']:>10.1%}"
+            f"{result['memory']:>10.1%}{result['wait']:>15.2f}{elapsed:>10.2f}"
+        )
+
+
+if __name__ == "__main__":
+    run()
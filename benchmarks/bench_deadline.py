@@ -0,0 +1,143 @@
+"""Deadline misses of latency-critical jobs sharing workers with batch jobs.
+
+A simulated cluster of `WORKERS` workers gets a Poisson stream of jobs: most are short
+interactive queries due within `QUERY_TIMEOUT`, the rest long batch jobs with no
+deadline, at `LOAD` of the capacity of the cluster. Runtimes vary around the mean of
+each kind, which `DeadlineAllocation` learns as jobs complete. FCFS is compared with EDF,
+SEPT, and EDF with admission control (rejected queries would go to another cluster).
+
+Run from the repository root with `python -m benchmarks.bench_deadline`.
+"""
+import heapq
+import random
+import time
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+from serpytor.components.connection.monitor.metrics import percentile
+from serpytor.components.utils.algorithms.allocation import (
+    AdmissionError, DeadlineAllocation)
+
+WORKERS: int = 8
+JOBS: int = 20000
+LOAD: float = 0.9
+QUERY_SHARE: float = 0.8
+QUERY_RUNTIME: float = 0.02
+BATCH_RUNTIME: float = 0.5
+QUERY_TIMEOUT: float = 0.2
+
+
+def make_jobs() -> List[Tuple[float, str, float]]:
+    """(arrival, kind, runtime) of the jobs."""
+    rng: random.Random = random.Random(0)
+    mean_runtime: float = QUERY_SHARE * QUERY_RUNTIME + (1 - QUERY_SHARE) * BATCH_RUNTIME
+    rate: float = LOAD * WORKERS / mean_runtime
+    jobs: List[Tuple[float, str, float]] = []
+    now: float = 0.0
+    for _ in range(JOBS):
+        now += rng.expovariate(rate)
+        kind: str = "query" if rng.random() < QUERY_SHARE else "batch"
+        mean: float = QUERY_RUNTIME if kind == "query" else BATCH_RUNTIME
+        jobs.append((now, kind, mean * rng.lognormvariate(0, 0.5) / 1.133))
+    return jobs
+
+
+def simulate(
+    jobs: List[Tuple[float, str, float]], policy: Optional[str], headroom: Optional[float]
+) -> Dict[str, Any]:
+    clock: List[float] = [0.0]
+    allocation: Optional[DeadlineAllocation] = (
+        DeadlineAllocation(
+            policy=policy,
+            workers=WORKERS,
+            admission=headroom is not None,
+            headroom=headroom or 1.0,
+            clock=lambda: clock[0],
+        )
+        if policy
+        else None
+    )
+    fifo: Deque[Tuple[int, Any]] = deque()
+    # (time, order, event, payload)
+    events: List[Tuple[float, int, str, Any]] = [
+        (arrival, idx, "arrival", idx) for idx, (arrival, _, _) in enumerate(jobs)
+    ]
+    heapq.heapify(events)
+    order: int = len(jobs)
+    idle: int = WORKERS
+    latencies: Dict[str, List[float]] = {"query": [], "batch": []}
+    missed: int = 0
+    rejected: int = 0
+
+    def next_job() -> Optional[Tuple[int, int]]:
+        if allocation is None:
+            return fifo.popleft() if fifo else None
+        return allocation.queue()
+
+    while events:
+        now, _, event, payload = heapq.heappop(events)
+        clock[0] = now
+        if event == "arrival":
+            arrival, kind, runtime = jobs[payload]
+            if allocation is None:
+                fifo.append((payload, payload))
+            else:
+                try:
+                    allocation.put(
+                        payload,
+                        digest=kind,
+                        timeout=QUERY_TIMEOUT if kind == "query" else None,
+                    )
+                except AdmissionError:
+                    rejected += 1
+        else:
+            ticket, idx = payload
+            arrival, kind, runtime = jobs[idx]
+            latencies[kind].append(now - arrival)
+            missed += kind == "query" and now - arrival > QUERY_TIMEOUT
+            if allocation is not None:
+                allocation.complete(ticket)
+            idle += 1
+        while idle:
+            started: Optional[Tuple[int, int]] = next_job()
+            if started is None:
+                break
+            idle -= 1
+            order += 1
+            heapq.heappush(events, (now + jobs[started[1]][2], order, "done", started))
+
+    return {
+        "missed": missed,
+        "rejected": rejected,
+        "queries": len(latencies["query"]) + rejected,
+        "query_p99": percentile(latencies["query"], 99),
+        "batch_mean": sum(latencies["batch"]) / len(latencies["batch"]),
+    }
+
+
+def run() -> None:
+    jobs: List[Tuple[float, str, float]] = make_jobs()
+    print(f"{WORKERS} workers at {LOAD:.0%} load, {JOBS} jobs, queries due in {QUERY_TIMEOUT}s")
+    print(
+        f"{'scheduling':<22}{'missed':>9}{'rejected':>10}{'query p99 (s)':>15}"
+        f"{'batch mean (s)':>16}{'wall (s)':>10}"
+    )
+    for name, policy, headroom in (
+        ("FCFS", None, None),
+        ("EDF", "edf", None),
+        ("SEPT", "sept", None),
+        ("EDF + admission", "edf", 1.0),
+        ("EDF + admission x1.5", "edf", 1.5),
+    ):
+        start_time: float = time.perf_counter()
+        result: Dict[str, Any] = simulate(jobs, policy, headroom)
+        elapsed: float = time.perf_counter() - start_time
+        print(
+            f"{name:<22}{result['missed'] / result['queries']:>9.2%}"
+            f"{result['rejected'] / result['queries']:>10.2%}"
+            f"{result['query_p99']:>15.3f}{result['batch_mean']:>16.3f}{elapsed:>10.2f}"
+        )
+
+
+if __name__ == "__main__":
+    run()
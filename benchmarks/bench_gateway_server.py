@@ -0,0 +1,123 @@
+"""Throughput of a `GatewayServer` dispatching small tasks to local stand-in workers.
+
+The load generator, the gateway server and the workers share one event loop, so the
+numbers are a floor: on a multi-core host, run the load generator in its own process.
+Each scenario sends `REQUESTS` small tasks, `CONCURRENCY` at a time:
+
+- forwarding: every task is sent to a worker on its own (no batching, no coalescing),
+- batching: the tasks are micro-batched,
+- batching + coalescing: same, with half of the requests being duplicates of others.
+
+Run from the repository root with `python -m benchmarks.bench_gateway_server`.
+"""
+import asyncio
+import contextlib
+import io
+import time
+from typing import Any, Dict, List, Tuple
+
+import aiohttp
+from aiohttp import web
+
+from serpytor.components.connection.monitor.execution import (read_task,
+                                                              run_task,
+                                                              send_response)
+from serpytor.components.connection.monitor.gateway_server import GatewayServer
+from serpytor.components.connection.monitor.serialization import (
+    CONTENT_TYPE, dumps_bytes)
+
+GATEWAY_PORT: int = 8400
+WORKER_PORTS: List[int] = [8401, 8402, 8403, 8404]
+REQUESTS: int = 5000
+CONCURRENCY: int = 256
+
+worker_requests: int = 0
+
+
+def add_one(x: int) -> int:
+    return x + 1
+
+
+def create_worker() -> web.Application:
+    """Create a stand-in worker running the tasks right in its event loop."""
+
+    async def exec_handler(request: web.Request) -> web.StreamResponse:
+        global worker_requests
+        worker_requests += 1
+        code, args, kwargs = await read_task(request)
+        return await send_response(request, run_task(code, args, kwargs))
+
+    app: web.Application = web.Application()
+    app.add_routes([web.post("/exec", exec_handler)])
+    return app
+
+
+async def run_scenario(
+    duplicates: bool, **kwargs: Any
+) -> Tuple[float, int, GatewayServer]:
+    global worker_requests
+    worker_requests = 0
+    gateway_server: GatewayServer = GatewayServer(
+        resource_addresses=[f"http://127.0.0.1:{port}/exec" for port in WORKER_PORTS],
+        heartbeat_addresses=[f"http://127.0.0.1:{port}/heartbeat" for port in WORKER_PORTS],
+        gateway_kwargs={"vitals_ttl": float("inf")},
+        **kwargs,
+    )
+    app: web.Application = web.Application()
+    app.add_routes(gateway_server.routes())
+    app.on_cleanup.append(gateway_server.close)
+    runner: web.AppRunner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, "127.0.0.1", GATEWAY_PORT).start()
+
+    bodies: List[bytes] = [
+        dumps_bytes((add_one, [idx // 2 if duplicates else idx], {}))
+        for idx in range(REQUESTS)
+    ]
+    semaphore: asyncio.Semaphore = asyncio.Semaphore(CONCURRENCY)
+    headers: Dict[str, str] = {"Content-Type": CONTENT_TYPE, "Accept": CONTENT_TYPE}
+
+    async with aiohttp.ClientSession(
+        connector=aiohttp.TCPConnector(limit=CONCURRENCY)
+    ) as session:
+
+        async def send(body: bytes) -> None:
+            async with semaphore:
+                async with session.post(
+                    f"http://127.0.0.1:{GATEWAY_PORT}/submit", data=body, headers=headers
+                ) as resp:
+                    resp.raise_for_status()
+                    await resp.read()
+
+        start_time: float = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            await asyncio.gather(*[send(body) for body in bodies])
+        elapsed: float = time.perf_counter() - start_time
+
+    await runner.cleanup()
+    return REQUESTS / elapsed, worker_requests, gateway_server
+
+
+async def run() -> None:
+    runners: List[web.AppRunner] = []
+    for port in WORKER_PORTS:
+        runner: web.AppRunner = web.AppRunner(create_worker(), access_log=None)
+        await runner.setup()
+        await web.TCPSite(runner, "127.0.0.1", port).start()
+        runners.append(runner)
+
+    print(f"{'scenario':<26}{'req/s':>10}{'worker requests':>18}{'coalesced':>12}")
+    for name, duplicates, kwargs in (
+        ("forwarding", False, {"max_batch_size": 1, "coalesce": False}),
+        ("batching", False, {"coalesce": False}),
+        ("batching + coalescing", True, {}),
+    ):
+        throughput, requests, gateway_server = await run_scenario(duplicates, **kwargs)
+        print(f"{name:<26}{throughput:>10.0f}{requests:>18}{gateway_server.coalesced:>12}")
+
+    for runner in runners:
+        await runner.cleanup()
+
+
+if __name__ == "__main__":
+    asyncio.run(run())
@@ -0,0 +1,78 @@
+"""Overhead of the quotas, and what a flooding tenant does to the others.
+
+First, `REQUESTS` requests go through `QuotaManager.slot` one after the other, with room
+to spare: the cost of the quotas on the path of every request. Then a tenant floods a
+shared pool of `CONCURRENCY` slots with `FLOOD` requests while another one sends a
+request every `LIGHT_INTERVAL` seconds, each holding its slot `SERVICE_TIME` seconds:
+the light tenant's wait is compared with a single FIFO queue in front of the pool.
+
+Run from the repository root with `python -m benchmarks.bench_quotas`.
+"""
+import asyncio
+import time
+from typing import List
+
+from serpytor.components.connection.monitor.metrics import percentile
+from serpytor.components.connection.monitor.quotas import Quota, QuotaManager
+
+REQUESTS: int = 200000
+CONCURRENCY: int = 4
+FLOOD: int = 2000
+LIGHT: int = 50
+LIGHT_INTERVAL: float = 0.01
+SERVICE_TIME: float = 0.001
+
+
+async def overhead() -> float:
+    quotas: QuotaManager = QuotaManager(
+        default_tenant=Quota(rate=1e9, max_concurrency=64),
+        default_task_type=Quota(max_concurrency=64),
+    )
+    start_time: float = time.perf_counter()
+    for idx in range(REQUESTS):
+        async with quotas.slot(f"tenant-{idx % 16}", "task"):
+            pass
+    return (time.perf_counter() - start_time) / REQUESTS
+
+
+async def light_waits(fair: bool) -> List[float]:
+    quotas: QuotaManager = QuotaManager(
+        task_types={"task": Quota(max_concurrency=CONCURRENCY)}, max_queued=2 * FLOOD
+    )
+    waits: List[float] = []
+
+    async def request(tenant: str) -> None:
+        queued_at: float = time.perf_counter()
+        async with quotas.slot(tenant if fair else "everyone"):
+            if tenant == "light":
+                waits.append(time.perf_counter() - queued_at)
+            await asyncio.sleep(SERVICE_TIME)
+
+    async def light() -> None:
+        requests: List[asyncio.Future] = []
+        for _ in range(LIGHT):
+            requests.append(asyncio.ensure_future(request("light")))
+            await asyncio.sleep(LIGHT_INTERVAL)
+        await asyncio.gather(*requests)
+
+    await asyncio.gather(*[request("flood") for _ in range(FLOOD)], light())
+    return waits
+
+
+def run() -> None:
+    per_request: float = asyncio.run(overhead())
+    print(f"slot acquire + release with room to spare: {per_request * 1e6:.2f} us")
+    print(
+        f"{CONCURRENCY} slots, {FLOOD} flood requests, a light request every {LIGHT_INTERVAL}s"
+    )
+    print(f"{'queueing':<20}{'light p50 (ms)':>16}{'light p99 (ms)':>16}")
+    for name, fair in (("single FIFO", False), ("per-tenant turns", True)):
+        waits: List[float] = asyncio.run(light_waits(fair))
+        print(
+            f"{name:<20}{percentile(waits, 50) * 1e3:>16.2f}"
+            f"{percentile(waits, 99) * 1e3:>16.2f}"
+        )
+
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,124 @@
+"""Tail latency of Gateway.execute with a few bad nodes, with and without retries and hedging.
+
+Every local stand-in worker stalls now and then, one of them much more often, and one
+answers 503 to a fraction of them. Retries route around the failing one, hedged requests
+route around the stalls.
+
+Run from the repository root with `python -m benchmarks.bench_resilience`.
+"""
+import asyncio
+import contextlib
+import io
+import random
+import statistics
+import time
+from typing import Any, Dict, List, Tuple
+
+from aiohttp import web
+
+from serpytor.components.connection.monitor.execution import (read_task,
+                                                              send_response)
+from serpytor.components.connection.monitor.gateway import Gateway
+from serpytor.components.utils.algorithms.allocation import FCFSAllocation
+
+BASE_PORT: int = 8400
+WORKERS: int = 6
+REQUESTS: int = 600
+CONCURRENCY: int = 8
+SERVICE_TIME: float = 0.003
+STALL_TIME: float = 0.25
+STALL_RATE: float = 0.2
+BACKGROUND_STALL_RATE: float = 0.02
+ERROR_RATE: float = 0.3
+
+
+def create_worker(stall_rate: float, error_rate: float) -> web.Application:
+    async def exec_handler(request: web.Request) -> web.StreamResponse:
+        code, args, kwargs = await read_task(request)
+        if random.random() < error_rate:
+            raise web.HTTPServiceUnavailable()
+        await asyncio.sleep(
+            STALL_TIME if random.random() < stall_rate else SERVICE_TIME
+        )
+        return await send_response(
+            request,
+            {"message": "Sanity check passed.", "output": code(*args, **kwargs)},
+        )
+
+    async def heartbeat_handler(request: web.Request) -> web.Response:
+        return web.json_response({"cpu": 0.0, "memory": 0.0})
+
+    app: web.Application = web.Application()
+    app.add_routes(
+        [web.post("/exec", exec_handler), web.get("/heartbeat", heartbeat_handler)]
+    )
+    return app
+
+
+async def run_scenario(**gateway_kwargs: Any) -> Tuple[List[float], int]:
+    gateway: Gateway = Gateway(
+        task=lambda x: x,
+        allocation_algorithm=FCFSAllocation(),
+        resource_addresses=[
+            f"http://127.0.0.1:{BASE_PORT + idx}/exec" for idx in range(WORKERS)
+        ],
+        heartbeat_addresses=[
+            f"http://127.0.0.1:{BASE_PORT + idx}/heartbeat" for idx in range(WORKERS)
+        ],
+        routing_policy="p2c",
+        **gateway_kwargs,
+    )
+    latencies: List[float] = []
+    failures: List[BaseException] = []
+    semaphore: asyncio.Semaphore = asyncio.Semaphore(CONCURRENCY)
+
+    async def send(idx: int) -> None:
+        async with semaphore:
+            start_time: float = time.perf_counter()
+            try:
+                await gateway.execute(task_args=[idx])
+            except Exception as e:
+                failures.append(e)
+                return
+            latencies.append(time.perf_counter() - start_time)
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        await asyncio.gather(*[send(idx) for idx in range(REQUESTS)])
+    await gateway.close()
+    return latencies, len(failures)
+
+
+async def run() -> None:
+    runners: List[web.AppRunner] = []
+    for idx in range(WORKERS):
+        runner: web.AppRunner = web.AppRunner(
+            create_worker(
+                stall_rate=STALL_RATE if idx == 0 else BACKGROUND_STALL_RATE,
+                error_rate=ERROR_RATE if idx == 1 else 0.0,
+            )
+        )
+        await runner.setup()
+        await web.TCPSite(runner, "127.0.0.1", BASE_PORT + idx).start()
+        runners.append(runner)
+
+    results: Dict[str, Tuple[List[float], int]] = {
+        "no retries": await run_scenario(),
+        "retries + breakers": await run_scenario(retries=2, failure_threshold=3),
+        "retries + breakers + hedging": await run_scenario(
+            retries=2, failure_threshold=3, hedge_percentile=95
+        ),
+    }
+
+    for runner in runners:
+        await runner.cleanup()
+
+    print(f"{'configuration':<32}{'p50 ms':>10}{'p99 ms':>10}{'failed':>10}")
+    for name, (latencies, failures) in results.items():
+        percentiles: List[float] = statistics.quantiles(latencies, n=100)
+        print(
+            f"{name:<32}{percentiles[49] * 1e3:>10.1f}{percentiles[98] * 1e3:>10.1f}{failures:>10}"
+        )
+
+
+if __name__ == "__main__":
+    asyncio.run(run())
@@ -0,0 +1,112 @@
+"""Latency of the Gateway resource selection under skewed load, against local stand-in workers.
+
+Every stand-in worker serves one request at a time (like a single busy core) and one of
+them is several times slower than the others. The FCFS allocation path sends everything
+to the same worker, while the load-aware router spreads requests by in-flight count and
+observed latency.
+
+Run from the repository root with `python -m benchmarks.bench_routing`.
+"""
+import asyncio
+import contextlib
+import io
+import statistics
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from aiohttp import web
+
+from serpytor.components.connection.monitor.execution import (read_task,
+                                                              send_response)
+from serpytor.components.connection.monitor.gateway import Gateway
+from serpytor.components.utils.algorithms.allocation import FCFSAllocation
+
+BASE_PORT: int = 8300
+SERVICE_TIMES: List[float] = [0.002, 0.002, 0.002, 0.002, 0.012]
+REQUESTS: int = 400
+CONCURRENCY: int = 16
+
+
+def create_worker(service_time: float) -> web.Application:
+    """Create a stand-in worker that takes `service_time` seconds per request, one request at a time."""
+    core: asyncio.Semaphore = asyncio.Semaphore(1)
+
+    async def exec_handler(request: web.Request) -> web.StreamResponse:
+        code, args, kwargs = await read_task(request)
+        async with core:
+            await asyncio.sleep(service_time)
+            output: Any = code(*args, **kwargs)
+        return await send_response(
+            request, {"message": "Sanity check passed.", "output": output}
+        )
+
+    async def heartbeat_handler(request: web.Request) -> web.Response:
+        return web.json_response({"cpu": 0.0, "memory": 0.0})
+
+    app: web.Application = web.Application()
+    app.add_routes(
+        [web.post("/exec", exec_handler), web.get("/heartbeat", heartbeat_handler)]
+    )
+    return app
+
+
+async def run_scenario(routing_policy: Optional[str]) -> Tuple[List[float], float]:
+    gateway: Gateway = Gateway(
+        task=lambda x: x,
+        allocation_algorithm=FCFSAllocation(),
+        resource_addresses=[
+            f"http://127.0.0.1:{BASE_PORT + idx}/exec"
+            for idx in range(len(SERVICE_TIMES))
+        ],
+        heartbeat_addresses=[
+            f"http://127.0.0.1:{BASE_PORT + idx}/heartbeat"
+            for idx in range(len(SERVICE_TIMES))
+        ],
+        routing_policy=routing_policy,
+    )
+    latencies: List[float] = []
+    semaphore: asyncio.Semaphore = asyncio.Semaphore(CONCURRENCY)
+
+    async def send(idx: int) -> None:
+        async with semaphore:
+            start_time: float = time.perf_counter()
+            await gateway.execute(task_args=[idx])
+            latencies.append(time.perf_counter() - start_time)
+
+    start_time: float = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        await asyncio.gather(*[send(idx) for idx in range(REQUESTS)])
+    elapsed: float = time.perf_counter() - start_time
+    await gateway.close()
+    return latencies, elapsed
+
+
+async def run() -> None:
+    runners: List[web.AppRunner] = []
+    for idx, service_time in enumerate(SERVICE_TIMES):
+        runner: web.AppRunner = web.AppRunner(create_worker(service_time))
+        await runner.setup()
+        await web.TCPSite(runner, "127.0.0.1", BASE_PORT + idx).start()
+        runners.append(runner)
+
+    results: Dict[str, Tuple[List[float], float]] = {}
+    for name, routing_policy in (
+        ("FCFS allocation", None),
+        ("p2c router", "p2c"),
+        ("least outstanding router", "least_outstanding"),
+    ):
+        results[name] = await run_scenario(routing_policy)
+
+    for runner in runners:
+        await runner.cleanup()
+
+    print(f"{'selection':<28}{'p50 ms':>10}{'p99 ms':>10}{'req/s':>10}")
+    for name, (latencies, elapsed) in results.items():
+        percentiles: List[float] = statistics.quantiles(latencies, n=100)
+        print(
+            f"{name:<28}{percentiles[49] * 1e3:>10.1f}{percentiles[98] * 1e3:>10.1f}{REQUESTS / elapsed:>10.0f}"
+        )
+
+
+if __name__ == "__main__":
+    asyncio.run(run())
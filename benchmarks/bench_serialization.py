@@ -0,0 +1,96 @@
+"""Serialization throughput of the Gateway wire format against the old JSON path.
+
+Run from the repository root with `python -m benchmarks.bench_serialization`.
+"""
+import json
+import time
+from typing import Any, Callable, Dict, List, Tuple
+
+import numpy as np
+
+from serpytor.components.connection.monitor.serialization import (
+    available_codecs, dumps, dumps_bytes, loads)
+
+
+def measure(function: Callable[[], Any], repeat: int = 5) -> float:
+    """Return the best wall time out of `repeat` runs."""
+    best: float = float("inf")
+    for _ in range(repeat):
+        start_time: float = time.perf_counter()
+        function()
+        best = min(best, time.perf_counter() - start_time)
+    return best
+
+
+def get_payloads() -> Dict[str, Tuple[Any, int]]:
+    array = np.random.rand(2000, 2000)
+    payloads: Dict[str, Tuple[Any, int]] = {"numpy float64 2000x2000": (array, array.nbytes)}
+
+    try:
+        import pandas as pd
+
+        frame = pd.DataFrame(array[:, :50])
+        payloads["pandas DataFrame 2000x50"] = (frame, frame.memory_usage().sum())
+    except ImportError:
+        pass
+
+    try:
+        import polars as pl
+
+        frame = pl.DataFrame({str(i): array[:, i] for i in range(50)})
+        payloads["polars DataFrame 2000x50"] = (frame, frame.estimated_size())
+    except ImportError:
+        pass
+
+    return payloads
+
+
+def run() -> None:
+    rows: List[Tuple[str, str, float, float]] = []
+    for name, (payload, size) in get_payloads().items():
+        megabytes: float = size / 1e6
+        framed: bytes = dumps_bytes(payload)
+        rows.append(
+            (
+                name,
+                "pickle5 frames (zero-copy)",
+                megabytes / measure(lambda: dumps(payload)),
+                megabytes / measure(lambda: loads(framed)),
+            )
+        )
+        rows.append(
+            (
+                name,
+                "pickle5 joined bytes",
+                megabytes / measure(lambda: dumps_bytes(payload)),
+                megabytes / measure(lambda: loads(framed)),
+            )
+        )
+        for codec in available_codecs():
+            compressed: bytes = dumps_bytes(payload, compression=codec)
+            rows.append(
+                (
+                    name,
+                    f"pickle5 + {codec} ({len(compressed) / size:.0%} size)",
+                    megabytes / measure(lambda: dumps_bytes(payload, compression=codec)),
+                    megabytes / measure(lambda: loads(compressed)),
+                )
+            )
+        if isinstance(payload, np.ndarray):
+            encoded: str = json.dumps(payload.tolist())
+            rows.append(
+                (
+                    name,
+                    "json + tolist()",
+                    megabytes / measure(lambda: json.dumps(payload.tolist()), repeat=1),
+                    megabytes / measure(lambda: np.array(json.loads(encoded)), repeat=1),
+                )
+            )
+
+    print(f"{'payload':<28}{'format':<34}{'encode MB/s':>14}{'decode MB/s':>14}")
+    for name, wire_format, encode, decode in rows:
+        print(f"{name:<28}{wire_format:<34}{encode:>14.1f}{decode:>14.1f}")
+
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,82 @@
+"""Throughput of moving items from one process to another.
+
+A child process puts `ITEMS` byte strings of each size in a queue, and the parent takes
+them out. `multiprocessing.Queue` (pickled, through a pipe and a feeder thread) is
+compared with `SharedMemoryQueue` one item at a time, and in batches of `BATCH`.
+
+Run from the repository root with `python -m benchmarks.bench_shared_queue`.
+"""
+import multiprocessing as mp
+import time
+from typing import Any, Callable, List, Tuple
+
+from serpytor.components.utils.structs.queues import SharedMemoryQueue
+
+ITEMS: int = 20000
+SIZES: Tuple[int, ...] = (64, 4096)
+BATCH: int = 64
+CAPACITY: int = 8 << 20
+
+
+def produce_single(queue: Any, size: int) -> None:
+    payload: bytes = b"x" * size
+    for _ in range(ITEMS):
+        queue.put(payload)
+
+
+def produce_batched(queue: SharedMemoryQueue, size: int) -> None:
+    payload: bytes = b"x" * size
+    for _ in range(ITEMS // BATCH):
+        queue.put_many([payload] * BATCH)
+
+
+def consume_single(queue: Any) -> None:
+    for _ in range(ITEMS):
+        queue.get()
+
+
+def consume_batched(queue: SharedMemoryQueue) -> None:
+    received: int = 0
+    while received < ITEMS // BATCH * BATCH:
+        received += len(queue.get_many(BATCH))
+
+
+def transfer(
+    queue: Any, produce: Callable[[Any, int], None], consume: Callable[[Any], None], size: int
+) -> float:
+    """Items moved per second."""
+    producer: mp.Process = mp.Process(target=produce, args=(queue, size))
+    start_time: float = time.perf_counter()
+    producer.start()
+    consume(queue)
+    elapsed: float = time.perf_counter() - start_time
+    producer.join()
+    return ITEMS / elapsed
+
+
+def run() -> None:
+    print(f"{'queue':<28}{'size':>8}{'items/s':>12}{'MB/s':>10}")
+    for size in SIZES:
+        scenarios: List[Tuple[str, Any, Callable, Callable]] = [
+            ("multiprocessing.Queue", mp.Queue(), produce_single, consume_single),
+            ("SharedMemoryQueue", SharedMemoryQueue(CAPACITY), produce_single, consume_single),
+            (
+                f"SharedMemoryQueue, {BATCH}/batch",
+                SharedMemoryQueue(CAPACITY),
+                produce_batched,
+                consume_batched,
+            ),
+        ]
+        for name, queue, produce, consume in scenarios:
+            throughput: float = transfer(queue, produce, consume, size)
+            print(
+                f"{name:<28}{size:>8}{throughput:>12.0f}"
+                f"{throughput * size / (1 << 20):>10.1f}"
+            )
+            if isinstance(queue, SharedMemoryQueue):
+                queue.close()
+                queue.unlink()
+
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,61 @@
+"""Write throughput and range query latency of the heartbeat time-series store.
+
+Writes three days of CPU readings, one every 30 seconds, for a few hundred nodes, then
+times range queries of one node and of every node over an hour, a day and the three
+days, at the resolution picked by the store.
+
+Run from the repository root with `python -m benchmarks.bench_tsdb`.
+"""
+import statistics
+import tempfile
+import time
+from typing import List
+
+from serpytor.components.database.tsdb import TimeSeriesDB
+
+NODES: int = 200
+DAYS: int = 3
+STEP: float = 30.0
+START: float = 1_699_999_200.0
+REPEATS: int = 20
+
+
+def time_query(db: TimeSeriesDB, nodes: List[str], start: float, end: float) -> float:
+    """Median duration of a query over `nodes`, in milliseconds."""
+    durations: List[float] = []
+    for _ in range(REPEATS):
+        start_time: float = time.perf_counter()
+        db.query_nodes("cpu", nodes, start, end)
+        durations.append(time.perf_counter() - start_time)
+    return statistics.median(durations) * 1e3
+
+
+def run() -> None:
+    nodes: List[str] = [f"http://10.0.{idx // 250}.{idx % 250}:5000/heartbeat" for idx in range(NODES)]
+    steps: int = int(DAYS * 86400 / STEP)
+    end: float = START + DAYS * 86400
+
+    with tempfile.TemporaryDirectory() as path:
+        db: TimeSeriesDB = TimeSeriesDB(path, max_open_segments=4 * NODES)
+        start_time: float = time.perf_counter()
+        for step in range(steps):
+            timestamp: float = START + step * STEP
+            for idx, node in enumerate(nodes):
+                db.append("cpu", node, float((idx + step) % 100), timestamp)
+        db.flush()
+        elapsed: float = time.perf_counter() - start_time
+        print(f"appended {steps * NODES} points in {elapsed:.1f}s ({steps * NODES / elapsed:.0f} points/s)")
+
+        print(f"{'range':<10}{'resolution':>12}{'1 node ms':>12}{f'{NODES} nodes ms':>16}")
+        for name, seconds in (("1 hour", 3600), ("1 day", 86400), (f"{DAYS} days", DAYS * 86400)):
+            resolution: str = db.query("cpu", nodes[0], end - seconds, end)["resolution"]
+            print(
+                f"{name:<10}{resolution:>12}"
+                f"{time_query(db, nodes[:1], end - seconds, end):>12.2f}"
+                f"{time_query(db, nodes, end - seconds, end):>16.2f}"
+            )
+        db.close()
+
+
+if __name__ == "__main__":
+    run()
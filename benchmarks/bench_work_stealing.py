@@ -0,0 +1,102 @@
+"""Makespan of irregular tasks over worker threads, with and without work stealing.
+
+`TASKS` tasks with long-tailed durations (they sleep, as a task waiting on I/O or on a
+remote resource would) are dealt to `WORKERS` threads in contiguous blocks, so that a
+few workers end up with most of the work. Without stealing, every worker only runs its
+own block; with `WorkStealingAllocation`, idle workers take over the tail of the others.
+A single shared `queue.Queue` is the baseline for the synchronization overhead.
+
+Run from the repository root with `python -m benchmarks.bench_work_stealing`.
+"""
+import random
+import threading
+import time
+from queue import Empty, Queue
+from typing import Callable, List
+
+from serpytor.components.utils.algorithms.allocation import WorkStealingAllocation
+
+WORKERS: int = 8
+TASKS: int = 2000
+MEAN_DURATION: float = 0.0005
+OPS: int = 200000
+
+
+def make_durations() -> List[float]:
+    rng: random.Random = random.Random(0)
+    durations: List[float] = [rng.paretovariate(1.5) for _ in range(TASKS)]
+    scale: float = MEAN_DURATION * TASKS / sum(durations)
+    # Sorted, so that the first blocks hold the longest tasks.
+    return sorted((duration * scale for duration in durations), reverse=True)
+
+
+def run_workers(work: Callable[[int], None]) -> float:
+    threads: List[threading.Thread] = [
+        threading.Thread(target=work, args=(worker,)) for worker in range(WORKERS)
+    ]
+    start_time: float = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return time.perf_counter() - start_time
+
+
+def makespan(steal: bool, durations: List[float]) -> float:
+    allocation: WorkStealingAllocation = WorkStealingAllocation(num_workers=WORKERS)
+    block: int = TASKS // WORKERS
+    for worker in range(WORKERS):
+        allocation.put(durations[worker * block:(worker + 1) * block], index=worker)
+
+    def work(worker: int) -> None:
+        while True:
+            if steal:
+                try:
+                    duration: float = allocation.queue(worker=worker)
+                except Empty:
+                    return
+            else:
+                try:
+                    duration = allocation.worker_deque(worker).pop()
+                except IndexError:
+                    return
+            time.sleep(duration)
+
+    return run_workers(work)
+
+
+def overhead() -> None:
+    """Tasks scheduled per second, with tasks that take no time."""
+    shared: Queue = Queue()
+    allocation: WorkStealingAllocation = WorkStealingAllocation(num_workers=WORKERS)
+    per_worker: int = OPS // WORKERS
+
+    def shared_work(worker: int) -> None:
+        for idx in range(per_worker):
+            shared.put(idx)
+            shared.get()
+
+    def stealing_work(worker: int) -> None:
+        for idx in range(per_worker):
+            allocation.put(idx, index=worker)
+            allocation.queue(worker=worker)
+
+    print(f"{'scheduling':<28}{'tasks/s':>12}")
+    print(f"{'shared queue.Queue':<28}{OPS / run_workers(shared_work):>12.0f}")
+    print(f"{'WorkStealingAllocation':<28}{OPS / run_workers(stealing_work):>12.0f}")
+
+
+def run() -> None:
+    durations: List[float] = make_durations()
+    ideal: float = sum(durations) / WORKERS
+    print(f"{WORKERS} workers, {TASKS} tasks, {sum(durations):.2f}s of work")
+    print(f"{'scheduling':<28}{'makespan (s)':>14}{'vs ideal':>10}")
+    for name, steal in (("static blocks", False), ("work stealing", True)):
+        elapsed: float = makespan(steal, durations)
+        print(f"{name:<28}{elapsed:>14.3f}{elapsed / ideal:>10.2f}")
+    print()
+    overhead()
+
+
+if __name__ == "__main__":
+    run()
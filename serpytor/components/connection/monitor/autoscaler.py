@@ -0,0 +1,327 @@
+import asyncio
+import math
+import time
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+import aiohttp
+from rich import print as rich_print
+
+from serpytor.components.connection.monitor.gateway import Gateway
+from serpytor.components.connection.monitor.server import Server
+
+
+class ScalingPolicy:
+    """How many servers a pool needs, from its load and latency.
+
+    The load is the number of tasks in flight and queued on the pool. It should stay
+    around `target_load` per server: the pool grows to `ceil(load / target_load)` servers,
+    by at most `max_step` at a time, and also by one whenever the latency percentile goes
+    over `target_latency` (seconds, None to ignore it).
+
+    Scaling up happens at most every `scale_up_cooldown` seconds. The pool only shrinks,
+    one server at a time, after needing fewer servers for `scale_down_delay` seconds in a
+    row, and never while the latency is over `target_latency`, so a short lull doesn't
+    retire servers that are needed again right after.
+    """
+
+    def __init__(
+        self,
+        min_servers: int = 1,
+        max_servers: int = 4,
+        target_load: float = 4.0,
+        target_latency: Optional[float] = None,
+        max_step: int = 2,
+        scale_up_cooldown: float = 5.0,
+        scale_down_delay: float = 30.0,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.min_servers: int = min_servers
+        self.max_servers: int = max_servers
+        self.target_load: float = target_load
+        self.target_latency: Optional[float] = target_latency
+        self.max_step: int = max_step
+        self.scale_up_cooldown: float = scale_up_cooldown
+        self.scale_down_delay: float = scale_down_delay
+        self.clock: Callable[[], float] = clock
+        self.scaled_up_at: float = float("-inf")
+        self.low_since: Optional[float] = None
+
+    def __str__(self) -> str:
+        return f"{self.__class__.__name__}({self.min_servers}..{self.max_servers} servers, {self.target_load} tasks each)"
+
+    def desired(self, servers: int, load: float, latency: Optional[float] = None) -> int:
+        """The number of servers to run, given the current `servers`, `load` and `latency`."""
+        now: float = self.clock()
+        slow: bool = (
+            self.target_latency is not None
+            and latency is not None
+            and latency > self.target_latency
+        )
+        needed: int = math.ceil(load / self.target_load) if self.target_load > 0 else servers
+        if slow:
+            needed = max(needed, servers + 1)
+        needed = min(max(needed, self.min_servers), self.max_servers)
+
+        if needed > servers:
+            self.low_since = None
+            if servers < self.min_servers:
+                return max(min(needed, servers + self.max_step), self.min_servers)
+            if now - self.scaled_up_at >= self.scale_up_cooldown:
+                self.scaled_up_at = now
+                return min(needed, servers + self.max_step)
+            return servers
+        if needed < servers and not slow:
+            if servers > self.max_servers:
+                return self.max_servers
+            if self.low_since is None:
+                self.low_since = now
+            if now - self.low_since >= self.scale_down_delay:
+                # Wait as long again before retiring the next one.
+                self.low_since = now
+                return servers - 1
+            return servers
+        self.low_since = None
+        return servers
+
+
+class ManagedServer:
+    """A `Server` started by a `LocalAutoscaler`, and what its heartbeats last said."""
+
+    def __init__(self, server: Server, resource: str, heartbeat: str) -> None:
+        self.server: Server = server
+        self.resource: str = resource
+        self.heartbeat: str = heartbeat
+        self.started_at: float = time.monotonic()
+        self.ready: bool = False
+        self.vitals: Dict[str, Any] = {}
+
+    def __str__(self) -> str:
+        return f"{self.__class__.__name__}({self.resource}, {'ready' if self.ready else 'starting'})"
+
+    @property
+    def port(self) -> int:
+        return self.server.server_port
+
+    def load(self) -> float:
+        """Tasks in flight and queued, averaged over the last 10 seconds if known."""
+        window: Dict[str, Any] = self.vitals.get("windows", {}).get("10s", {})
+        in_flight: Optional[float] = window.get("in_flight")
+        queue_depth: Optional[float] = window.get("queue_depth")
+        if in_flight is None:
+            in_flight = self.vitals.get("in_flight", 0)
+            queue_depth = self.vitals.get("queue_depth", 0)
+        # The in-flight count includes the queued tasks.
+        return float(max(in_flight or 0.0, queue_depth or 0.0))
+
+    def latency(self, percentile: int = 90) -> Optional[float]:
+        return self.vitals.get("windows", {}).get("10s", {}).get(f"latency_p{percentile}")
+
+
+class LocalAutoscaler:
+    """Spawn and retire `Server` processes on this host, following the load.
+
+    Every `interval` seconds, the heartbeats of the servers of the pool are read, and the
+    `policy` (a `ScalingPolicy`) turns their load (the tasks in flight and queued) and
+    their latency percentile into a number of servers. The missing ones are started on
+    the free ports of `ports`, each with its heartbeat server on `port + heartbeat_offset`,
+    and the extra ones are retired, newest first. Retired servers get `SIGTERM`, so they
+    finish the requests in flight. The pool doesn't grow again until the servers started
+    last answer their heartbeats, and the ones that don't within `startup_timeout`
+    seconds are replaced.
+
+    Servers are built by `make_server(port, heartbeat_port)`, which defaults to a `Server`
+    with its `/exec` endpoint and `server_kwargs` (e.g. `exec_pool`, `exec_workers`).
+
+    Given a `gateway`, its resources are kept in sync with the servers of the pool that
+    are up, and the requests waiting for its quotas count in the load.
+
+    Example usage:
+
+    ```python
+    gateway = Gateway(task=..., allocation_algorithm=FCFSAllocation(), routing_policy="p2c")
+    autoscaler = LocalAutoscaler(
+        range(8100, 8116),
+        ScalingPolicy(min_servers=2, max_servers=16, target_latency=0.5),
+        gateway=gateway,
+        server_kwargs={"exec_workers": 2},
+    )
+    await autoscaler.start()
+    ...
+    await autoscaler.stop()
+    ```
+    """
+
+    def __init__(
+        self,
+        ports: Iterable[int],
+        policy: Optional[ScalingPolicy] = None,
+        gateway: Optional[Gateway] = None,
+        host: str = "127.0.0.1",
+        heartbeat_offset: int = 1000,
+        interval: float = 1.0,
+        make_server: Optional[Callable[[int, int], Server]] = None,
+        latency_percentile: int = 90,
+        stop_timeout: float = 30.0,
+        startup_timeout: float = 30.0,
+        server_kwargs: Optional[Dict[str, Any]] = None,
+    ) -> None:
+        self.ports: List[int] = list(ports)
+        self.policy: ScalingPolicy = policy or ScalingPolicy()
+        self.gateway: Optional[Gateway] = gateway
+        self.host: str = host
+        self.heartbeat_offset: int = heartbeat_offset
+        self.interval: float = interval
+        self.make_server: Callable[[int, int], Server] = make_server or self.default_server
+        self.latency_percentile: int = latency_percentile
+        self.stop_timeout: float = stop_timeout
+        self.startup_timeout: float = startup_timeout
+        self.server_kwargs: Dict[str, Any] = server_kwargs or {}
+        self.servers: List[ManagedServer] = []
+        self.scaled_up: int = 0
+        self.scaled_down: int = 0
+        self._task: Optional[asyncio.Task] = None
+        self._session: Optional[aiohttp.ClientSession] = None
+
+    def __str__(self) -> str:
+        return f"{self.__class__.__name__}({len(self.servers)} servers on {self.host})"
+
+    def default_server(self, port: int, heartbeat_port: int) -> Server:
+        return Server(
+            mappings={},
+            server_port=port,
+            server_host=self.host,
+            heartbeat_port=heartbeat_port,
+            heartbeat_host=self.host,
+            **self.server_kwargs,
+        )
+
+    def spawn(self) -> Optional[ManagedServer]:
+        """Start a server on the first free port of the range, if any is left."""
+        used: List[int] = [managed.port for managed in self.servers]
+        port: Optional[int] = next((port for port in self.ports if port not in used), None)
+        if port is None:
+            return None
+        heartbeat_port: int = port + self.heartbeat_offset
+        server: Server = self.make_server(port, heartbeat_port)
+        server.start_heartbeats()
+        server.start_service()
+        managed: ManagedServer = ManagedServer(
+            server,
+            f"http://{self.host}:{port}{server.exec_endpoint or ''}",
+            f"http://{self.host}:{heartbeat_port}/heartbeat",
+        )
+        self.servers.append(managed)
+        self.scaled_up += 1
+        rich_print(f"[green][+] Autoscaler started a server at {self.host}:{port}.[/green]")
+        return managed
+
+    async def retire(self, managed: ManagedServer) -> None:
+        """Take a server out of the pool, and stop it once it has finished its requests."""
+        self.servers.remove(managed)
+        self.sync_gateway()
+        self.scaled_down += 1
+        rich_print(f"[yellow][-] Autoscaler retiring the server at {self.host}:{managed.port}.[/yellow]")
+        await asyncio.get_running_loop().run_in_executor(
+            None, managed.server.stop, self.stop_timeout
+        )
+
+    def sync_gateway(self) -> None:
+        if self.gateway is None:
+            return
+        ready: List[ManagedServer] = [managed for managed in self.servers if managed.ready]
+        self.gateway.set_resources(
+            [managed.resource for managed in ready], [managed.heartbeat for managed in ready]
+        )
+
+    async def poll(self) -> None:
+        """Read the heartbeats of the servers, and mark the ones that answer as ready."""
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession()
+        session: aiohttp.ClientSession = self._session
+
+        async def read(managed: ManagedServer) -> bool:
+            try:
+                async with session.get(
+                    managed.heartbeat, timeout=aiohttp.ClientTimeout(total=self.interval)
+                ) as resp:
+                    resp.raise_for_status()
+                    managed.vitals = await resp.json()
+            except (aiohttp.ClientError, asyncio.TimeoutError, ConnectionError, ValueError):
+                return False
+            newly_ready: bool = not managed.ready
+            managed.ready = True
+            return newly_ready
+
+        if any(await asyncio.gather(*[read(managed) for managed in self.servers])):
+            self.sync_gateway()
+
+    def load(self) -> float:
+        load: float = sum(managed.load() for managed in self.servers)
+        if self.gateway is not None and self.gateway.quotas is not None:
+            load += sum(map(len, self.gateway.quotas.waiting.values()))
+        return load
+
+    def latency(self) -> Optional[float]:
+        latencies: List[float] = [
+            latency
+            for latency in (
+                managed.latency(self.latency_percentile) for managed in self.servers
+            )
+            if latency is not None
+        ]
+        return max(latencies) if latencies else None
+
+    async def scale_to(self, count: int) -> None:
+        """Start or retire servers until the pool has `count` of them."""
+        while len(self.servers) < count:
+            if self.spawn() is None:
+                break
+        retiring: List[ManagedServer] = []
+        while len(self.servers) - len(retiring) > count:
+            # The newest servers go first: the older ones are warm.
+            retiring.append(self.servers[-1 - len(retiring)])
+        await asyncio.gather(*[self.retire(managed) for managed in retiring])
+
+    async def step(self) -> int:
+        """Poll the servers once, and scale the pool. Returns its new size."""
+        await self.poll()
+        now: float = time.monotonic()
+        for managed in list(self.servers):
+            if not managed.ready and now - managed.started_at > self.startup_timeout:
+                rich_print(
+                    f"[yellow][!] The server at {self.host}:{managed.port} did not come up in time.[/yellow]"
+                )
+                await self.retire(managed)
+        if any(not managed.ready for managed in self.servers):
+            return len(self.servers)
+        await self.scale_to(
+            self.policy.desired(len(self.servers), self.load(), self.latency())
+        )
+        return len(self.servers)
+
+    async def run(self) -> None:
+        while True:
+            try:
+                await self.step()
+            except Exception as e:
+                rich_print(f"[red][!] Autoscaler step failed: {e!r}[/red]")
+            await asyncio.sleep(self.interval)
+
+    async def start(self) -> None:
+        """Start the minimum number of servers, and scale the pool in the background."""
+        await self.scale_to(self.policy.min_servers)
+        self._task = asyncio.create_task(self.run())
+
+    async def stop(self) -> None:
+        """Stop scaling, and stop every server of the pool."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.scale_to(0)
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
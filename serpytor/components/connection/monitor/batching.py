@@ -0,0 +1,89 @@
+import asyncio
+from typing import Any, Awaitable, Callable, List, Optional
+
+
+class MicroBatcher:
+    """Group the items submitted within a short delay into batches.
+
+    Items are handed to `flush` together once `max_batch_size` of them are waiting, or
+    `max_delay` seconds after the first one, whichever comes first. `flush` returns one
+    result per item, in order, and every caller of `submit` gets its own result back. If
+    `flush` fails, every item of the batch fails with the same exception.
+
+    Example usage:
+
+    ```python
+    async def square_all(items):
+        return [item * item for item in items]
+
+    batcher = MicroBatcher(square_all, max_batch_size=32, max_delay=0.002)
+    results = await asyncio.gather(*[batcher.submit(idx) for idx in range(100)])
+    ```
+    """
+
+    def __init__(
+        self,
+        flush: Callable[[List[Any]], Awaitable[List[Any]]],
+        max_batch_size: int = 64,
+        max_delay: float = 0.002,
+    ) -> None:
+        self.flush: Callable[[List[Any]], Awaitable[List[Any]]] = flush
+        self.max_batch_size: int = max_batch_size
+        self.max_delay: float = max_delay
+        self.batches: int = 0
+        self.items: int = 0
+        self._pending: List[Any] = []
+        self._futures: List[asyncio.Future] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._tasks: set = set()
+
+    def __str__(self) -> str:
+        return f"{self.__class__.__name__}({len(self._pending)} pending, {self.batches} batches sent)"
+
+    def submit(self, item: Any) -> "asyncio.Future[Any]":
+        """Add an item to the next batch, and return the future of its result."""
+        loop: asyncio.AbstractEventLoop = asyncio.get_running_loop()
+        future: asyncio.Future = loop.create_future()
+        self._pending.append(item)
+        self._futures.append(future)
+        if len(self._pending) >= self.max_batch_size:
+            self.send()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.max_delay, self.send)
+        return future
+
+    def send(self) -> None:
+        """Flush the waiting items now."""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if not self._pending:
+            return
+        items, futures = self._pending, self._futures
+        self._pending, self._futures = [], []
+        self.batches += 1
+        self.items += len(items)
+        task: asyncio.Task = asyncio.ensure_future(self._run(items, futures))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, items: List[Any], futures: List[asyncio.Future]) -> None:
+        try:
+            results: List[Any] = await self.flush(items)
+            if len(results) != len(items):
+                raise ValueError(
+                    f"Got {len(results)} results for a batch of {len(items)} items."
+                )
+        except Exception as e:
+            for future in futures:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for future, result in zip(futures, results):
+            if not future.done():
+                future.set_result(result)
+
+    async def close(self) -> None:
+        """Flush the waiting items and wait for the batches in flight."""
+        self.send()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
@@ -1,10 +1,16 @@
 import asyncio
+import random
+import time
 from datetime import datetime
 from multiprocessing import Process
 from typing import Any, Callable, Dict, List, Optional, Tuple, Union
 
 import aiohttp
 
+from serpytor.components.connection.monitor.failure_detector import \
+    PhiAccrualFailureDetector
+from serpytor.components.database.tsdb import TimeSeriesDB
+
 
 class HeartbeatClient:
     """The HeartbeatClient component provides the necessary structure and functions to:
@@ -17,6 +23,24 @@ class HeartbeatClient:
 
     Use HeartbeatClient to derive classes with appropriate heartbeat mechanisms.
 
+    All the destinations are polled from a single event loop, over one pooled client
+    session. Every destination has its own schedule: `interval` seconds by default, or
+    the value given for it in `intervals`. The first request to each destination is
+    spread over its interval, and every wait is jittered by up to `jitter` (a fraction of
+    the interval), so that thousands of destinations don't get polled in bursts. Requests
+    taking more than `timeout` seconds are abandoned, and at most `max_connections` are
+    open at a time. A failing destination never holds up the others: its errors go to
+    `log_action`, and its responses to `handle_response`.
+
+    Every response counts as a heartbeat of its destination for `failure_detector` (by
+    default, a `PhiAccrualFailureDetector` allowing for requests taking up to `timeout`),
+    which is checked after each request. Use
+    `failure_detector.subscribe` to be told when a destination becomes suspect or dead,
+    and alive again.
+
+    If a `tsdb` (a `TimeSeriesDB`) is given, the vitals of every heartbeat response are
+    recorded in it, under the destination.
+
     Example usage:
 
     ```python
@@ -44,6 +68,7 @@ class HeartbeatClient:
         ],
         entrypoint=test_method,
         interval=5,
+        intervals={"http://localhost:5000": 1},
     )
     client.orchestrate_tasks()
 
@@ -63,6 +88,20 @@ class HeartbeatClient:
         self.destinations: Union[Tuple[str], List[str]] = destinations
         self.node_name: str = kwargs.get("node_name", "Untitled Node")
         self.interval: float = kwargs.get("interval", 2.0)
+        self.intervals: Dict[str, float] = kwargs.get("intervals", {})
+        self.timeout: float = kwargs.get("timeout", self.interval)
+        self.jitter: float = kwargs.get("jitter", 0.1)
+        self.max_connections: int = kwargs.get("max_connections", 100)
+        self.failure_detector: PhiAccrualFailureDetector = kwargs.get(
+            "failure_detector"
+        ) or PhiAccrualFailureDetector(
+            expected_interval=self.interval, acceptable_pause=self.timeout
+        )
+        self.tsdb: Optional[TimeSeriesDB] = kwargs.get("tsdb")
+        for destination in self.destinations:
+            self.failure_detector.add_node(
+                destination, expected_interval=self.get_interval(destination)
+            )
         self.args: Union[Tuple[Any], List[Any]] = args
         self.location: str = __file__
         self.heartbeat_process: Process = None
@@ -73,6 +112,7 @@ class HeartbeatClient:
         self.entrypoint_kwargs: Dict[str, Any] = kwargs.get(
             "entrypoint_kwargs", {})
         self.async_session = None
+        self._session_loop: Optional[asyncio.AbstractEventLoop] = None
 
     def generate_heartbeat(self) -> Dict[str, Any]:
         return {
@@ -84,30 +124,75 @@ class HeartbeatClient:
     # def link_heartbeat(self, ):
     #     ...
 
+    def get_interval(self, destination: str) -> float:
+        return self.intervals.get(destination, self.interval)
+
+    def get_session(self) -> aiohttp.ClientSession:
+        """Return the pooled client session, creating one for the running event loop if needed."""
+        loop: asyncio.AbstractEventLoop = asyncio.get_running_loop()
+        if (
+            self.async_session is None
+            or self.async_session.closed
+            or self._session_loop is not loop
+        ):
+            self.async_session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=self.max_connections),
+                timeout=aiohttp.ClientTimeout(total=self.timeout),
+            )
+            self._session_loop = loop
+        return self.async_session
+
     async def send_heartbeat(self, session, destination: str) -> Any:
 
         async with session.get(destination) as resp:
             return await resp.json(content_type="application/json")
 
+    def handle_response(self, destination: str, response: Any) -> Any:
+        print("Task=", response)
+
+    async def poll(self, destination: str) -> None:
+        """Send one heartbeat request, reporting its outcome."""
+        try:
+            response: Any = await self.send_heartbeat(self.get_session(), destination)
+        except (aiohttp.ClientError, asyncio.TimeoutError, ConnectionError, ValueError) as e:
+            self.log_action(e)
+        else:
+            self.failure_detector.heartbeat(destination)
+            if self.tsdb is not None and isinstance(response, dict):
+                self.tsdb.append_vitals(destination, response)
+            self.handle_response(destination, response)
+        self.failure_detector.check([destination])
+
+    async def follow(self, destination: str) -> None:
+        """Poll a destination forever, at a fixed rate."""
+        interval: float = self.get_interval(destination)
+        await asyncio.sleep(random.uniform(0, interval))
+        while True:
+            start_time: float = time.monotonic()
+            await self.poll(destination)
+            delay: float = interval * (1 + random.uniform(-self.jitter, self.jitter))
+            await asyncio.sleep(max(delay - (time.monotonic() - start_time), 0))
+
     async def orchestrate_requests(self):
-        # print("Orchestrating requests...")
-        self.async_session = aiohttp.ClientSession()
-        async with self.async_session as session:
-            tasks = [
-                asyncio.ensure_future(
-                    self.send_heartbeat(session, destination))
-                for destination in self.destinations
-            ]
-            completed_tasks = await asyncio.gather(*tasks)
-            for task in completed_tasks:
-                print("Task=", task)
-        # print("Orchestrating complete...")
+        """Send one round of heartbeats to every destination."""
+        await asyncio.gather(
+            *[self.poll(destination) for destination in self.destinations]
+        )
+
+    async def run_heartbeats(self) -> None:
+        """Poll every destination on its own schedule, until cancelled."""
+        try:
+            await asyncio.gather(
+                *[self.follow(destination) for destination in self.destinations]
+            )
+        finally:
+            if self.async_session is not None:
+                await self.async_session.close()
+            if self.tsdb is not None:
+                self.tsdb.flush()
 
     def schedule_heartbeat(self):
-        while True:
-            # print("Starting one round of heartbeat scheduling...")
-            asyncio.run(self.orchestrate_requests())
-            asyncio.run(asyncio.sleep(self.interval))
+        asyncio.run(self.run_heartbeats())
 
     def wrap_entrypoint(self, entrypoint: Callable):
         self.entrypoint = entrypoint
@@ -0,0 +1,31 @@
+class RemoteExecutionError(Exception):
+    def __init__(self, message: str = "The task failed on the remote resource.") -> None:
+        super().__init__(message)
+        self.message: str = message
+
+    def __str__(self) -> str:
+        return f"The task failed on the remote resource: {self.message}"
+
+
+class CircuitOpenError(Exception):
+    def __init__(self, resource: str = "") -> None:
+        super().__init__(resource)
+        self.resource: str = resource
+
+    def __str__(self) -> str:
+        return f"The circuit breaker of {self.resource} is open."
+
+
+class NoAvailableResourceError(Exception):
+    def __str__(self) -> str:
+        return "No resource is available to execute the task."
+
+
+class QuotaExceededError(Exception):
+    def __init__(self, tenant: str = "", task_type: str = "") -> None:
+        super().__init__(tenant, task_type)
+        self.tenant: str = tenant
+        self.task_type: str = task_type
+
+    def __str__(self) -> str:
+        return f"Too many requests of {self.tenant} ({self.task_type}) are waiting for their quota."
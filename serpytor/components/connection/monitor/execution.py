@@ -0,0 +1,463 @@
+import asyncio
+import inspect
+import json
+import math
+import os
+import time
+from concurrent.futures import (BrokenExecutor, Executor, ProcessPoolExecutor,
+                                ThreadPoolExecutor)
+from typing import (Any, AsyncIterator, Callable, Dict, List, Literal,
+                    Optional, Tuple, Union)
+
+from aiohttp import web
+from rich import print as rich_print
+
+from serpytor.components.connection.monitor.metrics import TaskMetrics
+from serpytor.components.connection.monitor.serialization import (
+    COMPRESSION_HEADER, CONTENT_TYPE, DEFAULT_CHUNK_SIZE, RETURN_TYPE_HEADER,
+    Compression, FrameDecoder, available_codecs, dumps_bytes, iter_dumps,
+    join_small, loads)
+
+_EXHAUSTED: object = object()
+
+
+def sanity_check(code, args, kwargs):
+    """Checks if the code is safe to execute.
+    This is done by checking if the code is a function, and if the args and kwargs are of the correct type.
+    """
+    # return (
+    #     isinstance(code, types.FunctionType)
+    #     and isinstance(args, tuple)
+    #     and isinstance(kwargs, dict)
+    # )
+
+    return True
+
+
+async def read_task(
+    request: web.Request,
+) -> Tuple[Callable[..., Any], List[Any], Dict[str, Any]]:
+    """Read the task, its args and its kwargs from the request.
+
+    Bodies in the binary wire format are decoded chunk by chunk while they are being
+    received. Multipart bodies with `code`, `args` and `kwargs` fields are still accepted.
+    """
+    if request.content_type == CONTENT_TYPE:
+        decoder: FrameDecoder = FrameDecoder()
+        async for chunk in request.content.iter_chunked(DEFAULT_CHUNK_SIZE):
+            completed: List[Any] = decoder.feed(chunk)
+            if completed:
+                return completed[0]
+        raise web.HTTPBadRequest(text="Truncated task payload.")
+
+    reader = await request.multipart()
+    code_field = await reader.next()
+    code = loads(await code_field.read())
+    args_field = await reader.next()
+    args = loads(await args_field.read())
+    kwargs_field = await reader.next()
+    kwargs = loads(await kwargs_field.read())
+    return code, args, kwargs
+
+
+def get_compression(request: web.Request) -> Compression:
+    """Return the codec asked for in the `X-Serpytor-Compression` header, if it is available here."""
+    compression: Union[str, None] = request.headers.get(COMPRESSION_HEADER)
+    return compression if compression in available_codecs() else None
+
+
+async def iterate_output(
+    output: Any, executor: Optional[Executor] = None
+) -> AsyncIterator[Any]:
+    """Iterate over the partial results of a task.
+
+    Generators are advanced in `executor` (the loop's default one if `None`), so a slow
+    step doesn't block the event loop. Any other output is a single, final result.
+    """
+    if inspect.isasyncgen(output):
+        async for item in output:
+            yield item
+    elif inspect.isgenerator(output):
+        loop: asyncio.AbstractEventLoop = asyncio.get_running_loop()
+        while True:
+            item: Any = await loop.run_in_executor(executor, next, output, _EXHAUSTED)
+            if item is _EXHAUSTED:
+                break
+            yield item
+    else:
+        yield output
+
+
+async def collect_output(output: Any) -> Any:
+    """Gather the partial results of a generator task into a list, for batch responses."""
+    if inspect.isasyncgen(output) or inspect.isgenerator(output):
+        return [item async for item in iterate_output(output)]
+    return output
+
+
+async def send_response(request: web.Request, payload: Any) -> web.StreamResponse:
+    """Send the payload in the binary wire format if the caller accepts it, and as JSON otherwise.
+
+    Binary responses are streamed one chunk at a time, compressed with the codec named in
+    the `X-Serpytor-Compression` request header when it is available here. Responses of
+    at most one chunk are sent in one go.
+    """
+    if CONTENT_TYPE not in request.headers.get("Accept", ""):
+        return web.Response(text=json.dumps(payload), content_type="application/json")
+
+    message: Any = join_small(
+        iter_dumps(payload, compression=get_compression(request))
+    )
+    if isinstance(message, bytes):
+        return web.Response(body=message, headers={"Content-Type": CONTENT_TYPE})
+
+    response: web.StreamResponse = web.StreamResponse(
+        headers={"Content-Type": CONTENT_TYPE}
+    )
+    response.enable_chunked_encoding()
+    try:
+        await response.prepare(request)
+        for frame in message:
+            await response.write(frame)
+        await response.write_eof()
+    except ConnectionResetError:
+        # The caller went away, e.g. a hedged request that lost the race.
+        pass
+    return response
+
+
+async def send_stream(
+    request: web.Request, output: Any, executor: Optional[Executor] = None
+) -> web.StreamResponse:
+    """Stream the partial results of a task, one message per result.
+
+    Each message is a `{"output": ...}` dict. If the task fails halfway through, a final
+    `{"error": ...}` message is sent instead, since the status line is already gone.
+    Generators are advanced in `executor`, as in `iterate_output`.
+    """
+    response: web.StreamResponse = web.StreamResponse(
+        headers={"Content-Type": CONTENT_TYPE, RETURN_TYPE_HEADER: "stream"}
+    )
+    response.enable_chunked_encoding()
+    compression: Compression = get_compression(request)
+
+    try:
+        await response.prepare(request)
+        try:
+            async for item in iterate_output(output, executor):
+                message: Any = join_small(
+                    iter_dumps({"output": item}, compression=compression)
+                )
+                for frame in [message] if isinstance(message, bytes) else message:
+                    await response.write(frame)
+        except ConnectionResetError:
+            raise
+        except Exception as e:
+            for frame in iter_dumps({"error": f"{e.__class__.__name__}: {e}"}):
+                await response.write(frame)
+        await response.write_eof()
+    except ConnectionResetError:
+        # The caller stopped listening.
+        pass
+    return response
+
+
+def wants_stream(request: web.Request) -> bool:
+    """Check whether the caller asked for partial results, and can decode them."""
+    return request.headers.get(
+        RETURN_TYPE_HEADER
+    ) == "stream" and CONTENT_TYPE in request.headers.get("Accept", "")
+
+
+async def exec_func(
+    request: web.Request, sanity_checking: Callable[..., bool] = sanity_check
+) -> web.StreamResponse:
+    """Receives a chunk of code (complete with imports, etc), executes it, and returns an output.
+
+    The arguments can be sent either as plain pickles or in the binary wire format of
+    `serpytor.components.connection.monitor.serialization`, so NumPy/pandas payloads
+    reach the task without being converted to Python lists.
+
+    When the caller sends `X-Serpytor-Return-Type: stream`, every value yielded by a
+    generator task is sent back as soon as it is produced. Otherwise the values are
+    collected into a list.
+    """
+    code, args, kwargs = await read_task(request)
+
+    check_complete: bool = sanity_checking(code, args, kwargs)
+
+    message: str = "Sanity check not passed."
+    output: Union[Any, None] = None
+    if check_complete:
+        if wants_stream(request):
+            return await send_stream(request, code(*args, **kwargs))
+
+        start_time = time.time()
+        output = await collect_output(code(*args, **kwargs))
+        stop_time = time.time()
+        message = "Sanity check passed."
+        rich_print(
+            f"[green][+]Computation from {request.remote} completed in {(stop_time - start_time):.5f} second(s).[/green]"
+        )
+
+    return await send_response(request, {"message": message, "output": output})
+
+
+def task_error(exception: BaseException) -> Dict[str, Any]:
+    """The payload sent back for a task that raised, instead of an error status."""
+    return {
+        "message": "Task failed.",
+        "output": None,
+        "error": f"{exception.__class__.__name__}: {exception}",
+    }
+
+
+def run_task(
+    code: Callable[..., Any],
+    args: List[Any],
+    kwargs: Dict[str, Any],
+    sanity_checking: Callable[..., bool] = sanity_check,
+) -> Dict[str, Any]:
+    """Run a task to completion, collecting the values of generator tasks into a list.
+
+    An exception raised by the task is returned as an `{"error": ...}` payload.
+    """
+    if not sanity_checking(code, args, kwargs):
+        return {"message": "Sanity check not passed.", "output": None}
+
+    try:
+        output: Any = code(*args, **kwargs)
+        if inspect.isgenerator(output):
+            output = list(output)
+    except Exception as e:
+        return task_error(e)
+    return {"message": "Sanity check passed.", "output": output}
+
+
+def run_encoded_task(
+    data: bytes, sanity_checking: Callable[..., bool] = sanity_check
+) -> bytes:
+    """Decode a task, run it and encode its result. This is what process pool workers run.
+
+    A task that can't be decoded, or whose result can't be encoded, fails like a task that
+    raises.
+    """
+    try:
+        code, args, kwargs = loads(data)
+        return dumps_bytes(run_task(code, args, kwargs, sanity_checking))
+    except Exception as e:
+        return dumps_bytes(task_error(e))
+
+
+def run_batch(
+    encoded_tasks: List[bytes], sanity_checking: Callable[..., bool] = sanity_check
+) -> List[Dict[str, Any]]:
+    """Run a batch of encoded tasks, sent together by a `GatewayServer`.
+
+    A failing task doesn't fail the others: its result is an `{"error": ...}` dict.
+    """
+    results: List[Dict[str, Any]] = []
+    for data in encoded_tasks:
+        try:
+            results.append(run_task(*loads(data), sanity_checking))
+        except Exception as e:
+            results.append(task_error(e))
+    return results
+
+
+def warm_up() -> int:
+    return os.getpid()
+
+
+class ExecutionPool:
+    """Warm pool of workers behind the `/exec` endpoint of a `Server`.
+
+    Tasks run in a pool of `workers` processes (or threads) started along with the
+    service, so a CPU-heavy task neither blocks the event loop nor the other requests and
+    heartbeats, and N tasks run concurrently on N cores.
+
+    At most `workers + queue_size` tasks are admitted at a time. Beyond that, requests are
+    rejected right away with `429 Too Many Requests` and a `Retry-After` header estimated
+    from the recent task durations, so that a `Gateway` can try another resource.
+
+    In process mode, the task is handed to the worker in its encoded form and decoded
+    there. Stream requests always run on threads, since generators can't be iterated
+    across processes.
+
+    A task that raises gets a `200` response with an `{"error": ...}` payload, so that
+    callers can tell it apart from a failure of the resource itself. A task that kills its
+    worker process breaks the pool: it is replaced, and the requests that were running
+    there get a `503`.
+
+    Given a `TaskMetrics`, the pool counts its workers, the tasks in flight and their
+    durations there, for the heartbeats to report.
+
+    Example usage:
+
+    ```python
+    pool = ExecutionPool(mode="process", workers=4, queue_size=8)
+    app = web.Application()
+    app.on_startup.append(pool.start)
+    app.on_cleanup.append(pool.stop)
+    app.add_routes([web.post("/exec", pool.handle)])
+    ```
+    """
+
+    def __init__(
+        self,
+        mode: Literal["process", "thread"] = "process",
+        workers: Optional[int] = None,
+        queue_size: Optional[int] = None,
+        sanity_checking: Callable[..., bool] = sanity_check,
+        metrics: Optional[TaskMetrics] = None,
+        *args: List[Any],
+        **kwargs: Dict[str, Any],
+    ) -> None:
+        if mode not in ("process", "thread"):
+            raise ValueError(f"Unknown execution pool mode: {mode}")
+
+        self.mode: Literal["process", "thread"] = mode
+        self.workers: int = workers or os.cpu_count() or 1
+        self.queue_size: int = queue_size if queue_size is not None else self.workers * 2
+        self.sanity_checking: Callable[..., bool] = sanity_checking
+        self.metrics: Optional[TaskMetrics] = metrics
+        self.in_flight: int = 0
+        self.task_time_ewma: float = 1.0
+        self._executor: Optional[Executor] = None
+        self._stream_executor: Optional[ThreadPoolExecutor] = None
+
+    def __str__(self) -> str:
+        return f"{self.__class__.__name__}({self.mode}, {self.workers} workers, {self.in_flight} tasks in flight)"
+
+    @property
+    def capacity(self) -> int:
+        return self.workers + self.queue_size
+
+    @property
+    def queued(self) -> int:
+        return max(self.in_flight - self.workers, 0)
+
+    def new_executor(self) -> Executor:
+        if self.mode == "process":
+            return ProcessPoolExecutor(max_workers=self.workers)
+        return ThreadPoolExecutor(max_workers=self.workers)
+
+    def replace_executor(self, broken: Executor) -> None:
+        """Replace a broken pool with a new one, unless another request already did."""
+        if self._executor is not broken:
+            return
+        rich_print("[yellow][!] A worker of the execution pool died, restarting the pool.[/yellow]")
+        broken.shutdown(wait=False, cancel_futures=True)
+        self._executor = self.new_executor()
+
+    async def start(self, app: Optional[web.Application] = None) -> None:
+        """Start the workers and wait until every one of them is up."""
+        self._executor = self.new_executor()
+        self._stream_executor = ThreadPoolExecutor(max_workers=self.workers)
+
+        loop: asyncio.AbstractEventLoop = asyncio.get_running_loop()
+        await asyncio.gather(
+            *[loop.run_in_executor(self._executor, warm_up) for _ in range(self.workers)]
+        )
+        if self.metrics is not None:
+            self.metrics.add_workers(self.workers)
+
+    async def stop(self, app: Optional[web.Application] = None) -> None:
+        if self.metrics is not None and self._executor is not None:
+            self.metrics.add_workers(-self.workers)
+        for executor in (self._executor, self._stream_executor):
+            if executor is not None:
+                executor.shutdown(wait=False, cancel_futures=True)
+        self._executor = self._stream_executor = None
+
+    def retry_after(self) -> int:
+        """Seconds until a slot is likely to free up."""
+        return max(1, math.ceil(self.task_time_ewma * (self.queued + 1) / self.workers))
+
+    def reject(self) -> web.Response:
+        return web.Response(
+            status=429,
+            text=json.dumps({"message": "Server saturated.", "output": None}),
+            content_type="application/json",
+            headers={"Retry-After": str(self.retry_after())},
+        )
+
+    async def run(self, request: web.Request) -> Dict[str, Any]:
+        """Run the task of the request in the pool.
+
+        Raises `concurrent.futures.BrokenExecutor` if the pool broke, after replacing it.
+        """
+        loop: asyncio.AbstractEventLoop = asyncio.get_running_loop()
+        if self.mode == "process":
+            if request.content_type == CONTENT_TYPE:
+                data: bytes = await request.content.read()
+            else:
+                data = dumps_bytes(await read_task(request))
+            executor: Executor = self._executor
+            try:
+                return loads(
+                    await loop.run_in_executor(
+                        executor, run_encoded_task, data, self.sanity_checking
+                    )
+                )
+            except BrokenExecutor:
+                self.replace_executor(executor)
+                raise
+
+        code, args, kwargs = await read_task(request)
+        executor = self._executor
+        try:
+            return await loop.run_in_executor(
+                executor, run_task, code, args, kwargs, self.sanity_checking
+            )
+        except BrokenExecutor:
+            self.replace_executor(executor)
+            raise
+
+    async def handle(self, request: web.Request) -> web.StreamResponse:
+        """The `/exec` endpoint."""
+        if self._executor is None:
+            raise web.HTTPServiceUnavailable(text="Execution pool not started.")
+        if self.in_flight >= self.capacity:
+            return self.reject()
+
+        self.in_flight += 1
+        if self.metrics is not None:
+            self.metrics.task_started()
+        start_time: float = time.time()
+        try:
+            if wants_stream(request):
+                code, args, kwargs = await read_task(request)
+                if not self.sanity_checking(code, args, kwargs):
+                    return await send_response(
+                        request, {"message": "Sanity check not passed.", "output": None}
+                    )
+                loop: asyncio.AbstractEventLoop = asyncio.get_running_loop()
+                try:
+                    output: Any = await loop.run_in_executor(
+                        self._stream_executor, lambda: code(*args, **kwargs)
+                    )
+                except Exception as e:
+                    return await send_response(request, task_error(e))
+                return await send_stream(request, output, self._stream_executor)
+
+            try:
+                payload: Dict[str, Any] = await self.run(request)
+            except BrokenExecutor as e:
+                # The resource failed, not (necessarily) this task: let it be retried.
+                return web.Response(
+                    status=503,
+                    text=json.dumps({"message": f"Execution pool broken: {e!r}", "output": None}),
+                    content_type="application/json",
+                )
+        finally:
+            task_time: float = time.time() - start_time
+            self.in_flight -= 1
+            self.task_time_ewma = 0.8 * self.task_time_ewma + 0.2 * task_time
+            if self.metrics is not None:
+                self.metrics.task_finished(task_time)
+
+        rich_print(
+            f"[green][+]Computation from {request.remote} completed in {(time.time() - start_time):.5f} second(s).[/green]"
+        )
+        return await send_response(request, payload)
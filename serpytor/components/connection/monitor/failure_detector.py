@@ -0,0 +1,171 @@
+import math
+import time
+from collections import deque
+from typing import Callable, Dict, Iterable, List, Literal, Optional
+
+NodeState = Literal["alive", "suspect", "dead"]
+StateCallback = Callable[[str, NodeState, NodeState], None]
+
+
+class ArrivalWindow:
+    """Inter-arrival times of the last `window_size` heartbeats of a node."""
+
+    def __init__(self, expected_interval: float, window_size: int = 100) -> None:
+        self.intervals: deque = deque(maxlen=window_size)
+        self.last_arrival: Optional[float] = None
+        # Start from the expected interval, with some spread, until real samples come in.
+        self.intervals.extend((expected_interval * 0.75, expected_interval * 1.25))
+
+    def __repr__(self) -> str:
+        return f"ArrivalWindow(mean={self.mean:.3f}, std={self.std_deviation:.3f})"
+
+    def add(self, now: float) -> None:
+        if self.last_arrival is not None:
+            self.intervals.append(now - self.last_arrival)
+        self.last_arrival = now
+
+    @property
+    def mean(self) -> float:
+        return sum(self.intervals) / len(self.intervals)
+
+    @property
+    def std_deviation(self) -> float:
+        mean: float = self.mean
+        return math.sqrt(
+            sum((interval - mean) ** 2 for interval in self.intervals)
+            / len(self.intervals)
+        )
+
+
+class PhiAccrualFailureDetector:
+    """Phi-accrual failure detector (Hayashibara et al.), as used by Cassandra and Akka.
+
+    Instead of a fixed timeout, the detector learns the distribution of the time between
+    the heartbeats of each node, and turns the time since the last one into a suspicion
+    level `phi`: `phi = 1` means a 10% chance that the node is still up and the heartbeat
+    is merely late, `phi = 2` a 1% chance, and so on. A node that is usually slow to answer
+    therefore gets more slack than a node that is usually fast.
+
+    A node is `alive` below `suspect_threshold`, `suspect` up to `dead_threshold`, and
+    `dead` beyond. Only a heartbeat brings a dead node back, so a node doesn't flap
+    between states while its suspicion hovers around a threshold. `acceptable_pause`
+    seconds are added to the expected interval, to ride out pauses such as GCs, and the
+    standard deviation is at least `min_std_ratio` times the mean interval, so that a
+    perfectly regular node isn't suspected as soon as it is a little late.
+
+    Subscribers are called with `(node, old_state, new_state)` on every transition.
+
+    Example usage:
+
+    ```python
+    detector = PhiAccrualFailureDetector()
+    detector.subscribe(lambda node, old, new: print(f"{node}: {old} -> {new}"))
+    detector.heartbeat("http://127.0.0.1:5000/heartbeat")
+    ...
+    detector.check()
+    ```
+    """
+
+    def __init__(
+        self,
+        suspect_threshold: float = 3.0,
+        dead_threshold: float = 8.0,
+        window_size: int = 100,
+        min_std_ratio: float = 0.25,
+        acceptable_pause: float = 0.0,
+        expected_interval: float = 1.0,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        if suspect_threshold > dead_threshold:
+            raise ValueError("suspect_threshold can't be above dead_threshold.")
+
+        self.suspect_threshold: float = suspect_threshold
+        self.dead_threshold: float = dead_threshold
+        self.window_size: int = window_size
+        self.min_std_ratio: float = min_std_ratio
+        self.acceptable_pause: float = acceptable_pause
+        self.expected_interval: float = expected_interval
+        self.clock: Callable[[], float] = clock
+        self._windows: Dict[str, ArrivalWindow] = {}
+        self._states: Dict[str, NodeState] = {}
+        self._subscribers: List[StateCallback] = []
+
+    def __str__(self) -> str:
+        return f"{self.__class__.__name__}({len(self._windows)} nodes)"
+
+    @property
+    def nodes(self) -> List[str]:
+        return list(self._windows)
+
+    def add_node(self, node: str, expected_interval: Optional[float] = None) -> None:
+        """Start monitoring a node, expected to send a heartbeat every `expected_interval` seconds."""
+        if node not in self._windows:
+            self._windows[node] = ArrivalWindow(
+                expected_interval or self.expected_interval, self.window_size
+            )
+            self._windows[node].last_arrival = self.clock()
+            self._states[node] = "alive"
+
+    def remove_node(self, node: str) -> None:
+        self._windows.pop(node, None)
+        self._states.pop(node, None)
+
+    def subscribe(self, callback: StateCallback) -> None:
+        self._subscribers.append(callback)
+
+    def heartbeat(self, node: str, now: Optional[float] = None) -> None:
+        """Record a heartbeat from the node."""
+        now = now if now is not None else self.clock()
+        if node not in self._windows:
+            self.add_node(node)
+            self._windows[node].last_arrival = None
+        self._windows[node].add(now)
+        self._transition(node, "alive")
+
+    def phi(self, node: str, now: Optional[float] = None) -> float:
+        window: ArrivalWindow = self._windows[node]
+        if window.last_arrival is None:
+            return 0.0
+        now = now if now is not None else self.clock()
+        elapsed: float = now - window.last_arrival
+        mean: float = window.mean + self.acceptable_pause
+        std_deviation: float = max(
+            window.std_deviation, self.min_std_ratio * window.mean, 1e-6
+        )
+
+        # Logistic approximation of the normal CDF, as in Akka.
+        y: float = (elapsed - mean) / std_deviation
+        try:
+            e: float = math.exp(-y * (1.5976 + 0.070566 * y * y))
+        except OverflowError:
+            return 0.0
+        if elapsed > mean:
+            return -math.log10(e / (1.0 + e)) if e > 0.0 else float("inf")
+        return -math.log10(1.0 - 1.0 / (1.0 + e))
+
+    def state(self, node: str) -> NodeState:
+        return self._states[node]
+
+    def check(
+        self, nodes: Optional[Iterable[str]] = None, now: Optional[float] = None
+    ) -> Dict[str, NodeState]:
+        """Re-evaluate the state of the nodes (all of them by default), notifying the transitions."""
+        now = now if now is not None else self.clock()
+        for node in list(nodes if nodes is not None else self._windows):
+            if node not in self._windows:
+                continue
+            phi: float = self.phi(node, now)
+            if self._states[node] == "dead" or phi >= self.dead_threshold:
+                self._transition(node, "dead")
+            elif phi >= self.suspect_threshold:
+                self._transition(node, "suspect")
+            else:
+                self._transition(node, "alive")
+        return dict(self._states)
+
+    def _transition(self, node: str, state: NodeState) -> None:
+        old_state: NodeState = self._states.get(node, "alive")
+        self._states[node] = state
+        if state != old_state:
+            for callback in self._subscribers:
+                callback(node, old_state, state)
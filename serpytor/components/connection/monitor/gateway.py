@@ -1,10 +1,26 @@
 import asyncio
-from typing import Any, Callable, Dict, List, Literal, Optional, Tuple
+import random
+import time
+from contextlib import nullcontext
+from typing import (Any, AsyncIterator, Callable, Dict, Iterable, List,
+                    Literal, Optional, Set, Tuple, Union)
 
 import aiohttp
-import cloudpickle
-import requests
 
+from serpytor.components.connection.monitor.exceptions import (
+    CircuitOpenError, NoAvailableResourceError, RemoteExecutionError)
+from serpytor.components.connection.monitor.failure_detector import (
+    NodeState, PhiAccrualFailureDetector)
+from serpytor.components.connection.monitor.quotas import QuotaManager
+from serpytor.components.connection.monitor.resilience import (CircuitBreaker,
+                                                               RetryPolicy)
+from serpytor.components.connection.monitor.routing import (LoadAwareRouter,
+                                                            RoutingPolicy)
+from serpytor.components.connection.monitor.serialization import (
+    COMPRESSION_HEADER, CONTENT_TYPE, DEFAULT_CHUNK_SIZE,
+    DEFAULT_COMPRESSION_THRESHOLD, RETURN_TYPE_HEADER, Compression,
+    FrameDecoder, iter_dumps, join_small)
+from serpytor.components.connection.monitor.vitals import VitalsSubscriber
 from serpytor.components.utils.algorithms.allocation.base_allocation import \
     BaseAllocation
 
@@ -17,6 +33,40 @@ class Gateway:
     Each Gateway executes a specific task specified by its entrypoint during initialization.
     Gateway objects can be superposed on other Gateway objects for handling complex use cases.
 
+    Task payloads are streamed to the resources in chunks of `chunk_size` bytes. Pass
+    `compression="zstd"` or `compression="lz4"` to compress the chunks that are at least
+    `compression_threshold` bytes long, in both directions.
+
+    By default, the resource is picked by the allocation algorithm. Pass
+    `routing_policy="p2c"` or `routing_policy="least_outstanding"` to pick it with a
+    `LoadAwareRouter` instead, which balances on the requests in flight, the latency of
+    past requests and the heartbeat vitals (refreshed at most every `vitals_ttl` seconds).
+
+    Every resource sits behind a `CircuitBreaker`: after `failure_threshold` consecutive
+    failures, it gets no requests for `reset_timeout` seconds. Failed requests are retried
+    up to `retries` times on another resource, after a jittered exponential backoff. With
+    `hedge_percentile` set (e.g. 95), a duplicate request goes to a second resource when
+    the first one takes longer than that percentile of the recent latencies, and the first
+    response wins. `request_timeout` bounds the duration of a batch request, in seconds.
+
+    With `heartbeat_push=True`, the vitals are not polled: a `VitalsSubscriber` keeps a
+    websocket open to every heartbeat server, which pushes the vitals as they change.
+    Servers that can't be subscribed to are still polled.
+
+    Given a `failure_detector` (e.g. the `PhiAccrualFailureDetector` of a
+    `HeartbeatClient` following the heartbeat addresses), dead resources get no requests
+    and are not polled, and suspect ones only get requests when nothing else is left.
+
+    Instead of static address lists, `discovery_seeds` (heartbeat server addresses, e.g.
+    `http://127.0.0.1:5000`) makes the gateway read the gossiped cluster membership (see
+    `GossipMembership`) from any reachable member, at most every `vitals_ttl` seconds,
+    and use the resources of the live members.
+
+    Given `quotas` (a `QuotaManager`), every request counts against the rate limit and the
+    concurrency quota of its tenant and of its task type, passed to `execute` as `tenant`
+    and `task_type` (the name of the task by default), and waits for its turn if they are
+    spent. Streams hold their slot until they are exhausted or closed.
+
     The diagram below represents how the gateways behave:
 
     <img alt='Gateway behavior' src='https://imgur.com/qxcZ3ep.png' />
@@ -37,6 +87,40 @@ class Gateway:
         self._task: Callable[..., Any] = task
         self._task_setup_input: Tuple[List[Any], Dict[str, Any]] = task_setup_data
         self._allocation_algorithm: BaseAllocation = allocation_algorithm
+        self._compression: Compression = kwargs.get("compression")
+        self._compression_threshold: int = kwargs.get(
+            "compression_threshold", DEFAULT_COMPRESSION_THRESHOLD
+        )
+        self._chunk_size: int = kwargs.get("chunk_size", DEFAULT_CHUNK_SIZE)
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._session_loop: Optional[asyncio.AbstractEventLoop] = None
+        self._routing_policy: Optional[RoutingPolicy] = kwargs.get("routing_policy")
+        self._vitals_ttl: float = kwargs.get("vitals_ttl", 1.0)
+        self._router: LoadAwareRouter = LoadAwareRouter(
+            self._resource_addr, policy=self._routing_policy or "p2c"
+        )
+        self._failure_threshold: int = kwargs.get("failure_threshold", 5)
+        self._reset_timeout: float = kwargs.get("reset_timeout", 30.0)
+        self._breakers: Dict[str, CircuitBreaker] = {}
+        self._retry_policy: RetryPolicy = RetryPolicy(
+            retries=kwargs.get("retries", 0),
+            base_delay=kwargs.get("retry_base_delay", 0.05),
+            max_delay=kwargs.get("retry_max_delay", 2.0),
+        )
+        self._hedge_percentile: Optional[float] = kwargs.get("hedge_percentile")
+        self._request_timeout: Optional[float] = kwargs.get("request_timeout")
+        self._heartbeat_cache: Dict[str, Tuple[str, Dict[str, Any]]] = {}
+        self._heartbeat_push: bool = kwargs.get("heartbeat_push", False)
+        self._subscriber: Optional[VitalsSubscriber] = None
+        self._subscriber_loop: Optional[asyncio.AbstractEventLoop] = None
+        self._node_states: Dict[str, NodeState] = {}
+        self._discovery_seeds: List[str] = kwargs.get("discovery_seeds", [])
+        self._known_members: List[str] = []
+        self._discovered_at: float = float("-inf")
+        self._discovery_timeout: float = kwargs.get("discovery_timeout", 2.0)
+        self._quotas: Optional[QuotaManager] = kwargs.get("quotas")
+        if kwargs.get("failure_detector") is not None:
+            self.watch(kwargs["failure_detector"])
 
     def __str__(self) -> str:
         return f"Gateway({self._task.__name__}) with {len(self._resource_addr)} resources at {self._resource_addr} using {self._allocation_algorithm.__class__.__name__} algorithm"
@@ -47,23 +131,170 @@ class Gateway:
     def set_task(self, task: Callable[..., Any]) -> None:
         self._task = task
 
+    @property
+    def quotas(self) -> Optional[QuotaManager]:
+        return self._quotas
+
+    def quota_slot(self, tenant: Optional[str] = None, task_type: str = "task") -> Any:
+        """Async context manager holding a request slot of the tenant and task type, if any quotas are set."""
+        if self._quotas is None:
+            return nullcontext()
+        return self._quotas.slot(tenant, task_type)
+
+    def watch(self, failure_detector: PhiAccrualFailureDetector) -> None:
+        """Follow the state of the resources, as seen by a failure detector of their heartbeats."""
+        failure_detector.subscribe(self.on_node_state)
+        for node in failure_detector.nodes:
+            self.on_node_state(node, "alive", failure_detector.state(node))
+
+    def on_node_state(self, node: str, old_state: NodeState, new_state: NodeState) -> None:
+        """Failure detector callback. `node` is either a heartbeat or a resource address."""
+        resources: Dict[str, str] = dict(zip(self._heartbeat_addr, self._resource_addr))
+        resource: str = resources.get(node, node)
+        if resource in self._resource_addr:
+            self._node_states[resource] = new_state
+
+    def get_session(self) -> aiohttp.ClientSession:
+        """Return the pooled client session, creating one for the running event loop if needed."""
+        loop: asyncio.AbstractEventLoop = asyncio.get_running_loop()
+        if (
+            self._session is None
+            or self._session.closed
+            or self._session_loop is not loop
+        ):
+            self._session = aiohttp.ClientSession()
+            self._session_loop = loop
+        return self._session
+
+    async def get_subscriber(self) -> VitalsSubscriber:
+        """Return the heartbeat subscriber, starting one on the running event loop if needed."""
+        loop: asyncio.AbstractEventLoop = asyncio.get_running_loop()
+        if self._subscriber is None or self._subscriber_loop is not loop:
+            self._subscriber = VitalsSubscriber(
+                self._heartbeat_addr, session=self.get_session()
+            )
+            self._subscriber_loop = loop
+            await self._subscriber.start()
+            await self._subscriber.wait_ready()
+        elif self._subscriber.addresses != self._heartbeat_addr:
+            await self._subscriber.set_addresses(self._heartbeat_addr)
+            await self._subscriber.wait_ready()
+        return self._subscriber
+
+    async def close(self) -> None:
+        """Close the heartbeat subscriptions and the pooled client session."""
+        if self._subscriber is not None:
+            await self._subscriber.stop()
+            self._subscriber = None
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+
+    def set_resources(
+        self, resource_addresses: List[str], heartbeat_addresses: List[str]
+    ) -> None:
+        """Replace the resources, e.g. when servers are added to or retired from the pool."""
+        self._resource_addr = list(resource_addresses)
+        self._heartbeat_addr = list(heartbeat_addresses)
+        for resource in self._router.resources:
+            if resource not in self._resource_addr:
+                self._router.remove_resource(resource)
+                self._node_states.pop(resource, None)
+        for resource in self._resource_addr:
+            self._router.add_resource(resource)
+
+    def set_members(self, members: List[Dict[str, Any]]) -> None:
+        """Use the resources of the live members of the cluster."""
+        live: List[Dict[str, Any]] = [
+            member
+            for member in members
+            if member.get("resource") and member["state"] in ("alive", "suspect")
+        ]
+        self._known_members = [member["address"] for member in live]
+        self.set_resources(
+            [member["resource"] for member in live],
+            [f"{member['address']}/heartbeat" for member in live],
+        )
+        for member in live:
+            if self._node_states.get(member["resource"]) != "dead":
+                self._node_states[member["resource"]] = member["state"]
+
+    async def discover_resources(self) -> List[str]:
+        """Refresh the resources from the membership gossiped by the heartbeat servers."""
+        session: aiohttp.ClientSession = self.get_session()
+        candidates: List[str] = random.sample(
+            self._known_members, len(self._known_members)
+        ) + [seed for seed in self._discovery_seeds if seed not in self._known_members]
+        for address in candidates:
+            try:
+                async with session.get(
+                    f"{address}/gossip/members",
+                    timeout=aiohttp.ClientTimeout(total=self._discovery_timeout),
+                ) as resp:
+                    resp.raise_for_status()
+                    self.set_members((await resp.json())["members"])
+                    break
+            except (aiohttp.ClientError, asyncio.TimeoutError, ConnectionError, ValueError):
+                continue
+        self._discovered_at = time.monotonic()
+        return self._resource_addr
+
     async def get_available_resources(
         self, *args: Optional[List[Any]], **kwargs: Optional[Dict[str, Any]]
     ) -> Any:
         """Get vitals report from webservers at any given time"""
         print("Getting available resources...")
+        if (
+            self._discovery_seeds
+            and time.monotonic() - self._discovered_at > self._vitals_ttl
+        ):
+            await self.discover_resources()
         report: Dict[str, Dict[str, Any]] = {addr: {} for addr in self._resource_addr}
-        async with aiohttp.ClientSession(
-            # timeout=kwargs.get("timeout", 10.0)
-        ) as session:
-            print(f"Sending request to {len(self._resource_addr)} resources")
-            for idx, zipped_tuple in enumerate(
-                zip(self._resource_addr, self._heartbeat_addr)
-            ):
-                resource_addr, heartbeat_addr = zipped_tuple
-                print(f"Sending request {idx+1}...")
-                async with session.get(heartbeat_addr) as resp:
+        session: aiohttp.ClientSession = self.get_session()
+        print(f"Sending request to {len(self._resource_addr)} resources")
+
+        async def get_vitals(idx: int, resource_addr: str, heartbeat_addr: str) -> None:
+            print(f"Sending request {idx+1}...")
+            cached: Optional[Tuple[str, Dict[str, Any]]] = self._heartbeat_cache.get(
+                heartbeat_addr
+            )
+            headers: Dict[str, str] = {"If-None-Match": cached[0]} if cached else {}
+            try:
+                async with session.get(heartbeat_addr, headers=headers) as resp:
+                    if resp.status == 304 and cached:
+                        report[resource_addr] = cached[1]
+                        return
                     report[resource_addr] = await resp.json()
+                    if "ETag" in resp.headers:
+                        self._heartbeat_cache[heartbeat_addr] = (
+                            resp.headers["ETag"],
+                            report[resource_addr],
+                        )
+            except (aiohttp.ClientError, asyncio.TimeoutError, ConnectionError) as e:
+                # An unreachable resource has no vitals, and counts against its breaker.
+                print(f"Heartbeat of {resource_addr} failed ({e!r}).")
+                self.get_breaker(resource_addr).record_failure()
+
+        pushed: Set[str] = set()
+        if self._heartbeat_push:
+            subscriber: VitalsSubscriber = await self.get_subscriber()
+            for resource_addr, heartbeat_addr in zip(
+                self._resource_addr, self._heartbeat_addr
+            ):
+                if heartbeat_addr in subscriber.connected:
+                    report[resource_addr] = subscriber.vitals[heartbeat_addr]
+                    pushed.add(heartbeat_addr)
+
+        await asyncio.gather(
+            *[
+                get_vitals(idx, resource_addr, heartbeat_addr)
+                for idx, (resource_addr, heartbeat_addr) in enumerate(
+                    zip(self._resource_addr, self._heartbeat_addr)
+                )
+                if heartbeat_addr not in pushed
+                and self._node_states.get(resource_addr) != "dead"
+            ]
+        )
+        self._router.update_vitals(report)
 
         return report
 
@@ -71,15 +302,283 @@ class Gateway:
         self, *args: Optional[List[Any]], **kwargs: Optional[Dict[str, Any]]
     ) -> Any:
         """Get vital reports from webservers at any given time."""
+        exclude: Iterable[str] = kwargs.get("exclude", ())
+        if self._routing_policy is not None or exclude:
+            if self._router.vitals_age() > self._vitals_ttl:
+                await self.get_available_resources()
+            return self._router.select(exclude=exclude)
+
         report: Any = await self.get_available_resources()
         print("Received resource reports. Forwarding to allocation algorithm...")
         self._allocation_algorithm.put(report)
-        optimal_resource: Any = self._allocation_algorithm.queue(
-            selection_criteria=kwargs.get("selection_criteria", "cpu")
+        # Without criteria, the allocation picks on its own (e.g. its `sortable_fields`).
+        criteria: Dict[str, Any] = (
+            {"selection_criteria": kwargs["selection_criteria"]}
+            if kwargs.get("selection_criteria") is not None
+            else {}
         )
+        optimal_resource: Any = self._allocation_algorithm.queue(**criteria)
         print(optimal_resource)
         return optimal_resource
 
+    def build_request(
+        self, payload: Any, task_return_type: Literal["batch", "stream"] = "batch"
+    ) -> Tuple[
+        Union[bytes, bytearray, memoryview, AsyncIterator[Union[bytes, memoryview]]],
+        Dict[str, str],
+    ]:
+        """Build the body and the headers of an execution request.
+
+        The payload is either a `(task, args, kwargs)` tuple, or such a tuple already in
+        the binary wire format (e.g. the body of a request forwarded by a `GatewayServer`).
+        Payloads of more than one chunk are streamed.
+        """
+        message: Any = (
+            payload
+            if isinstance(payload, (bytes, bytearray, memoryview))
+            else join_small(
+                iter_dumps(
+                    payload,
+                    compression=self._compression,
+                    compression_threshold=self._compression_threshold,
+                    chunk_size=self._chunk_size,
+                ),
+                limit=self._chunk_size,
+            )
+        )
+
+        async def stream_payload():
+            for frame in message:
+                yield frame
+
+        headers: Dict[str, str] = {
+            "Content-Type": CONTENT_TYPE,
+            "Accept": f"{CONTENT_TYPE}, application/json",
+            RETURN_TYPE_HEADER: task_return_type,
+        }
+        if self._compression is not None:
+            headers[COMPRESSION_HEADER] = self._compression
+
+        if isinstance(message, (bytes, bytearray, memoryview)):
+            return message, headers
+        return stream_payload(), headers
+
+    async def read_messages(
+        self, resp: aiohttp.ClientResponse
+    ) -> AsyncIterator[Any]:
+        """Decode the messages of a response as its chunks arrive."""
+        if resp.content_type != CONTENT_TYPE:
+            yield await resp.json()
+            return
+
+        decoder: FrameDecoder = FrameDecoder()
+        async for chunk in resp.content.iter_chunked(self._chunk_size):
+            for message in decoder.feed(chunk):
+                yield message
+
+    async def raise_for_status(self, resp: aiohttp.ClientResponse) -> None:
+        """Raise `RemoteExecutionError` if the response says that the task failed, and
+        `aiohttp.ClientResponseError` if the resource did."""
+        if resp.status >= 400 and resp.content_type == "application/json":
+            try:
+                body: Any = await resp.json()
+            except ValueError:
+                body = None
+            if isinstance(body, dict) and body.get("error"):
+                raise RemoteExecutionError(body["error"])
+        resp.raise_for_status()
+
+    def get_breaker(self, resource: str) -> CircuitBreaker:
+        if resource not in self._breakers:
+            self._breakers[resource] = CircuitBreaker(
+                failure_threshold=self._failure_threshold,
+                reset_timeout=self._reset_timeout,
+            )
+        return self._breakers[resource]
+
+    def record_outcome(
+        self, resource: str, exception: Optional[BaseException] = None
+    ) -> None:
+        """Report the outcome of a request to the circuit breaker of the resource.
+
+        Only failures that point at the resource count: overload rejections (429) and
+        errors in the task itself leave the breaker as it is.
+        """
+        breaker: CircuitBreaker = self.get_breaker(resource)
+        if exception is None:
+            breaker.record_success()
+        elif (
+            self._retry_policy.should_retry(exception)
+            and not isinstance(exception, CircuitOpenError)
+            and getattr(exception, "status", None) != 429
+        ):
+            breaker.record_failure()
+        else:
+            breaker.release_trial()
+
+    async def pick_resource(self, exclude: Iterable[str] = ()) -> str:
+        """Pick a resource whose circuit breaker lets requests through, and that isn't dead.
+
+        The suspect and the `exclude`d resources (typically the ones already tried) are
+        skipped, unless nothing else is left.
+        """
+        unavailable: Set[str] = {
+            resource
+            for resource in self._resource_addr
+            if not self.get_breaker(resource).is_available()
+            or self._node_states.get(resource) == "dead"
+        }
+        suspect: Set[str] = {
+            resource
+            for resource, state in self._node_states.items()
+            if state == "suspect"
+        }
+        for excluded in (
+            unavailable | suspect | set(exclude),
+            unavailable | set(exclude),
+            unavailable,
+        ):
+            try:
+                return f"{await self.allocate_resource(exclude=excluded)}"
+            except LookupError:
+                continue
+        raise NoAvailableResourceError()
+
+    async def send_request(self, resource: str, payload: Any) -> Any:
+        """Send a batch execution request to the resource and return the decoded response.
+
+        A task that raised on the resource raises `RemoteExecutionError`, which is neither
+        retried nor counted against the resource.
+        """
+        if not self.get_breaker(resource).allow_request():
+            raise CircuitOpenError(resource)
+
+        print("Executing at", resource)
+        data, headers = self.build_request(payload)
+        timeout: Dict[str, aiohttp.ClientTimeout] = (
+            {"timeout": aiohttp.ClientTimeout(total=self._request_timeout)}
+            if self._request_timeout is not None
+            else {}
+        )
+        try:
+            with self._router.track(resource):
+                async with self.get_session().post(
+                    resource, data=data, headers=headers, **timeout
+                ) as resp:
+                    await self.raise_for_status(resp)
+                    async for message in self.read_messages(resp):
+                        if isinstance(message, dict) and "error" in message:
+                            raise RemoteExecutionError(message["error"])
+                        self.record_outcome(resource)
+                        return message
+                    raise aiohttp.ClientPayloadError(
+                        f"Truncated response from {resource}."
+                    )
+        except asyncio.CancelledError:
+            self.get_breaker(resource).release_trial()
+            raise
+        except Exception as e:
+            self.record_outcome(resource, e)
+            raise
+
+    async def hedged_request(self, payload: Any, tried: List[str]) -> Any:
+        """Send the request, and a duplicate to another resource if the first one is slow.
+
+        The resources used are appended to `tried`. The first successful response wins and
+        the other request is cancelled.
+        """
+        primary: str = await self.pick_resource(exclude=tried)
+        tried.append(primary)
+        tasks: Set[asyncio.Future] = {
+            asyncio.ensure_future(self.send_request(primary, payload))
+        }
+
+        try:
+            hedge_delay: Optional[float] = (
+                self._router.latency_percentile(self._hedge_percentile)
+                if self._hedge_percentile is not None
+                else None
+            )
+            if hedge_delay is not None:
+                done, _ = await asyncio.wait(tasks, timeout=hedge_delay)
+                if not done:
+                    try:
+                        secondary: str = await self.pick_resource(exclude=tried)
+                    except NoAvailableResourceError:
+                        secondary = primary
+                    if secondary != primary:
+                        tried.append(secondary)
+                        tasks.add(
+                            asyncio.ensure_future(self.send_request(secondary, payload))
+                        )
+
+            errors: List[BaseException] = []
+            pending: Set[asyncio.Future] = tasks
+            while pending:
+                done, pending = await asyncio.wait(
+                    pending, return_when=asyncio.FIRST_COMPLETED
+                )
+                for task in done:
+                    if task.exception() is None:
+                        return task.result()
+                    errors.append(task.exception())
+            raise errors[0]
+        finally:
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+
+    async def dispatch(self, payload: Any) -> Any:
+        """Execute a batch request, retrying failed attempts on other resources."""
+        tried: List[str] = []
+        for attempt in range(self._retry_policy.retries + 1):
+            try:
+                return await self.hedged_request(payload, tried)
+            except Exception as e:
+                if (
+                    attempt == self._retry_policy.retries
+                    or not self._retry_policy.should_retry(e)
+                ):
+                    raise
+                print(f"Attempt {attempt + 1} failed ({e!r}). Retrying...")
+                await asyncio.sleep(self._retry_policy.backoff(attempt))
+
+    async def stream_results(self, execution_loc: str, payload: Any) -> AsyncIterator[Any]:
+        """Yield the partial results of the task as the resource produces them.
+
+        The request is only sent, and the circuit breaker of the resource only asked, once
+        the iteration starts: a stream that is never iterated over holds nothing.
+        """
+        if not self.get_breaker(execution_loc).allow_request():
+            raise CircuitOpenError(execution_loc)
+        data, headers = self.build_request(payload, task_return_type="stream")
+        finished: bool = False
+        error: Optional[Exception] = None
+        try:
+            with self._router.track(execution_loc):
+                async with self.get_session().post(
+                    execution_loc, data=data, headers=headers
+                ) as resp:
+                    await self.raise_for_status(resp)
+                    streamed: bool = resp.headers.get(RETURN_TYPE_HEADER) == "stream"
+                    async for message in self.read_messages(resp):
+                        if "error" in message:
+                            raise RemoteExecutionError(message["error"])
+                        yield message["output"]
+                        if not streamed:
+                            # The resource answered with a single batch result.
+                            break
+            finished = True
+        except Exception as e:
+            error = e
+            raise
+        finally:
+            if finished or error is not None:
+                self.record_outcome(execution_loc, error)
+            else:
+                # Abandoned by the caller (or cancelled): nothing is known of the resource.
+                self.get_breaker(execution_loc).release_trial()
+
     async def execute(
         self,
         task_return_type: Literal["batch", "stream"] = "batch",
@@ -89,45 +588,79 @@ class Gateway:
         **kwargs: Optional[Dict[str, Any]],
     ) -> Any:
         """Execute the task on the allocated resource.
-        We use sync requests here due to some problems with AIOHttp requests.
-        Moreover, for a single request, sync requests are faster than async requests.
+
+        The task and its arguments are sent in the binary wire format of
+        `serpytor.components.connection.monitor.serialization`, so NumPy/pandas/polars
+        payloads don't need to be converted to Python lists. Both the request and the
+        response bodies are streamed chunk by chunk, so large inputs and outputs are never
+        copied into a single buffer on either side.
+
+        With `task_return_type="stream"`, an async iterator is returned instead of the
+        result. It yields every value produced by a generator task as soon as the resource
+        sends it:
+
+        ```python
+        async for partial_result in await gateway.execute(task_return_type="stream"):
+            ...
+        ```
+
+        Streams are neither retried nor hedged, since partial results may already have
+        been consumed when a failure happens.
+
+        With quotas set, pass `tenant` and `task_type` to say whose request it is. A stream
+        takes its quota slot when the iteration starts, and gives it back when it ends.
         """
         # while True:
         print("Task Kwargs received = ", task_kwargs)
-        resource_details = await self.allocate_resource()
-        task_pickle = cloudpickle.dumps(self._task)
         task_setup_args, task_setup_kwargs = self._task_setup_input
-        args_pickle = cloudpickle.dumps(task_setup_args + task_args)
         print("Kwargs received at gateway = ", task_kwargs)
-        kwargs_pickle = cloudpickle.dumps(task_setup_kwargs | task_kwargs)
+        payload: Tuple[Callable[..., Any], List[Any], Dict[str, Any]] = (
+            self._task,
+            task_setup_args + task_args,
+            task_setup_kwargs | task_kwargs,
+        )
+        return await self.execute_payload(
+            payload,
+            task_return_type,
+            tenant=kwargs.get("tenant"),
+            task_type=kwargs.get("task_type") or getattr(self._task, "__name__", "task"),
+        )
+
+    async def execute_payload(
+        self,
+        payload: Any,
+        task_return_type: Literal["batch", "stream"] = "batch",
+        tenant: Optional[str] = None,
+        task_type: str = "task",
+    ) -> Any:
+        """Execute a `(task, args, kwargs)` payload, possibly already encoded (see `build_request`)."""
+        if task_return_type == "stream":
+            results: AsyncIterator[Any] = await self.open_stream(payload)
+            if self._quotas is None:
+                return results
+            return self.hold_quota_slot(results, tenant, task_type)
 
-        execution_loc: str = f"{resource_details}"
+        async with self.quota_slot(tenant, task_type):
+            return await self.dispatch(payload)
 
+    async def open_stream(self, payload: Any) -> AsyncIterator[Any]:
+        execution_loc: str = await self.pick_resource()
         print("Executing at", execution_loc)
-        # Execute the task
-
-        # async with aiohttp.ClientSession(execution_loc) as session:
-        #     async with session.post(
-        #         execution_loc,
-        #         files={
-        #             "code": task_pickle,
-        #             "args": args_pickle,
-        #             "kwargs": kwargs_pickle,
-        #         },
-        #     ) as resp:
-        #         text = await resp.text()
-        #         print(text)
-        #         return text
-
-        res = requests.post(
-            execution_loc,
-            files={
-                "code": task_pickle,
-                "args": args_pickle,
-                "kwargs": kwargs_pickle,
-            },
-        )
-        return res.json()
+        return self.stream_results(execution_loc, payload)
+
+    async def hold_quota_slot(
+        self, results: AsyncIterator[Any], tenant: Optional[str], task_type: str
+    ) -> AsyncIterator[Any]:
+        """Relay a stream, holding a quota slot from its first step until it is over.
+
+        A stream that is never iterated over takes no slot, so it has none to give back.
+        """
+        try:
+            async with self._quotas.slot(tenant, task_type):
+                async for result in results:
+                    yield result
+        finally:
+            await results.aclose()
 
 
 if __name__ == "__main__":
@@ -140,7 +673,7 @@ if __name__ == "__main__":
     # )
     # Create a gateway object
     gateway = Gateway(
-        task=lambda x: np.square(x).tolist(),
+        task=lambda x: np.square(x),
         task_setup_data=([], {}),
         allocation_algorithm=FCFSAllocation(),
         resource_addresses=[
@@ -159,5 +692,5 @@ if __name__ == "__main__":
 
     # Execute the gateway
     asyncio.run(
-        gateway.execute(task_args=[np.random.randint(10, size=(10000, 10000)).tolist()])
+        gateway.execute(task_args=[np.random.randint(10, size=(10000, 10000))])
     )
@@ -1,6 +1,24 @@
-from typing import Any, Callable, Dict, List, Tuple, Union
+import asyncio
+import hashlib
+import json
+from typing import Any, Callable, Dict, List, Optional, Tuple, Union
 
+import aiohttp
+from aiohttp import web
+
+from serpytor.components.connection.monitor.batching import MicroBatcher
+from serpytor.components.connection.monitor.exceptions import (
+    CircuitOpenError, NoAvailableResourceError, QuotaExceededError,
+    RemoteExecutionError)
+from serpytor.components.connection.monitor.execution import (read_task,
+                                                              run_batch,
+                                                              send_response,
+                                                              send_stream,
+                                                              wants_stream)
 from serpytor.components.connection.monitor.gateway import Gateway
+from serpytor.components.connection.monitor.quotas import (TASK_TYPE_HEADER,
+                                                           TENANT_HEADER)
+from serpytor.components.connection.monitor.serialization import CONTENT_TYPE
 from serpytor.components.connection.monitor.server import Server
 from serpytor.components.utils.algorithms.allocation.base_allocation import \
     BaseAllocation
@@ -9,40 +27,244 @@ from serpytor.components.utils.algorithms.allocation.fcfs_allocation import \
 
 
 class GatewayServer:
+    """A `Server` dispatching the tasks submitted over HTTP to the resources of a `Gateway`.
+
+    Tasks are posted to `submit_endpoint` (`/submit` by default) exactly as they would be
+    to the `/exec` endpoint of a resource, so a `Gateway` can use a `GatewayServer` as one
+    of its resources. They are forwarded to the resources without being decoded:
+
+    - Identical requests (same task, same arguments) in flight at the same time are
+      coalesced: the task runs once, and every caller gets its result.
+    - Tasks of at most `batch_max_bytes` bytes are grouped into batches of up to
+      `max_batch_size` tasks, flushed after `batch_delay` seconds at most, and each batch
+      is sent to a single resource as one request. Set `max_batch_size=1` to disable it.
+    - Stream requests (`X-Serpytor-Return-Type: stream`) are relayed, the partial results
+      being sent back as they arrive.
+
+    The tasks of at most `coalesce_max_bytes` bytes are read whole to be coalesced, the
+    larger ones are decoded as they are received and forwarded one by one.
+
+    With `quotas` in the `gateway_kwargs`, the tenant and the task type of a request are
+    read from its `X-Serpytor-Tenant` and `X-Serpytor-Task-Type` headers. Requests get a
+    429 when their tenant already has too many waiting for its quota.
+
+    `gateway_kwargs` go to the `Gateway` (e.g. `retries`, `compression`). Its resources are
+    picked by a `LoadAwareRouter` (`routing_policy="p2c"` unless given), so that the vitals
+    are not polled for every request. `server_kwargs` go to the `Server`.
+
+    Example usage:
+
+    ```python
+    gateway_server = GatewayServer(
+        heartbeat_addresses=["http://127.0.0.1:5000/heartbeat"],
+        resource_addresses=["http://127.0.0.1:8100/exec"],
+        port=9000,
+        server_kwargs={"heartbeat_port": 5999},
+    )
+    gateway_server.start()
+    ```
+    """
+
     def __init__(
         self,
         mappings: Dict[str, Dict[str, Union[str, Callable]]] = {},
         heartbeat_addresses: List[str] = [],
         resource_addresses: List[str] = [],
-        gateway_allocation_mechanism: BaseAllocation = FCFSAllocation(),
+        gateway_allocation_mechanism: Optional[BaseAllocation] = None,
         task_setup_data: Tuple[List[Any], Dict[str, Any]] = ([], {}),
         *args: List[Any],
         **kwargs: Dict[str, Any]
     ) -> None:
-        self._gateway_allocation_mechanism = gateway_allocation_mechanism
+        self._gateway_allocation_mechanism: BaseAllocation = (
+            gateway_allocation_mechanism or FCFSAllocation()
+        )
         self._heartbeat_addresses = heartbeat_addresses
         self._resource_addresses = resource_addresses
         self._task_setup_data = task_setup_data
-        self._server_mappings = mappings
+        self._server_mappings = dict(mappings)
+        self.submit_endpoint: str = kwargs.get("submit_endpoint", "/submit")
+        self.coalesce: bool = kwargs.get("coalesce", True)
+        self.coalesce_max_bytes: int = kwargs.get("coalesce_max_bytes", 1 << 20)
+        self.batch_max_bytes: int = kwargs.get("batch_max_bytes", 16 * 1024)
+        self.requests: int = 0
+        self.coalesced: int = 0
+        self._in_flight: Dict[bytes, asyncio.Task] = {}
+
         self._gateway = Gateway(
             task=lambda x: x,
-            allocation_algorithm=FCFSAllocation,
+            allocation_algorithm=self._gateway_allocation_mechanism,
             heartbeat_addresses=self._heartbeat_addresses,
             resource_addresses=self._resource_addresses,
-            gateway_allocation_mechanism=self._gateway_allocation_mechanism,
             task_setup_data=self._task_setup_data,
+            **{"routing_policy": "p2c", **kwargs.get("gateway_kwargs", {})},
+        )
+        self.batcher: MicroBatcher = MicroBatcher(
+            self.send_batch,
+            max_batch_size=kwargs.get("max_batch_size", 64),
+            max_delay=kwargs.get("batch_delay", 0.002),
         )
+
+        self._server_mappings[self.submit_endpoint] = {
+            "type": "post",
+            "mapped_method": self.handle,
+        }
         self._server = Server(
             mappings=self._server_mappings,
             server_port=kwargs.get("port", 9000),
             server_host=kwargs.get("server_host", "localhost"),
+            **{"exec_endpoint": None, **kwargs.get("server_kwargs", {})},
+        )
+        self._server.service_web_server.on_cleanup.append(self.close)
+
+    def __str__(self) -> str:
+        return f"{self.__class__.__name__}({self.requests} requests, {self.coalesced} coalesced, {self.batcher.batches} batches)"
+
+    @property
+    def gateway(self) -> Gateway:
+        return self._gateway
+
+    def routes(self) -> List[web.RouteDef]:
+        return [web.post(self.submit_endpoint, self.handle)]
+
+    async def close(self, app: Optional[web.Application] = None) -> None:
+        await self.batcher.close()
+        await self._gateway.close()
+
+    async def send_batch(self, encoded_tasks: List[bytes]) -> List[Dict[str, Any]]:
+        """Run a batch of tasks on a single resource."""
+        if len(encoded_tasks) == 1:
+            return [await self._gateway.dispatch(encoded_tasks[0])]
+        response: Dict[str, Any] = await self._gateway.dispatch(
+            (run_batch, [encoded_tasks], {})
+        )
+        return response["output"]
+
+    async def run(self, body: bytes) -> Dict[str, Any]:
+        """Run an encoded task, batched with others if it is small enough."""
+        if len(body) <= self.batch_max_bytes and self.batcher.max_batch_size > 1:
+            return await self.batcher.submit(body)
+        return await self._gateway.dispatch(body)
+
+    async def run_coalesced(self, body: bytes) -> Dict[str, Any]:
+        """Run an encoded task, or wait for the result of an identical one already running."""
+        key: bytes = hashlib.blake2b(body, digest_size=16).digest()
+        task: Optional[asyncio.Task] = self._in_flight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self.run(body))
+            self._in_flight[key] = task
+
+            def done(task: asyncio.Task) -> None:
+                self._in_flight.pop(key, None)
+                if not task.cancelled():
+                    # Retrieved here, in case every caller went away.
+                    task.exception()
+
+            task.add_done_callback(done)
+        else:
+            self.coalesced += 1
+        # The task goes on for the other callers if this one goes away.
+        return await asyncio.shield(task)
+
+    def error_response(self, status: int, message: str, **headers: str) -> web.Response:
+        return web.Response(
+            status=status,
+            text=json.dumps({"message": message, "output": None}),
+            content_type="application/json",
+            headers=headers,
         )
 
+    def task_error_response(self, error: str) -> web.Response:
+        """A 500 whose `error` field tells a `Gateway` that the task failed, not the resource."""
+        return web.Response(
+            status=500,
+            text=json.dumps(
+                {"message": f"The task failed: {error}", "output": None, "error": error}
+            ),
+            content_type="application/json",
+        )
+
+    def quota_exceeded_response(self, error: QuotaExceededError) -> web.Response:
+        return self.error_response(429, str(error), **{"Retry-After": "1"})
+
+    async def relay_stream(self, request: web.Request, payload: Any) -> web.StreamResponse:
+        # The slot is taken here rather than by the stream, to answer a 429 while we still can.
+        try:
+            async with self._gateway.quota_slot(
+                request.headers.get(TENANT_HEADER),
+                request.headers.get(TASK_TYPE_HEADER, "task"),
+            ):
+                try:
+                    results: Any = await self._gateway.open_stream(payload)
+                except (NoAvailableResourceError, CircuitOpenError) as e:
+                    return self.error_response(503, str(e))
+                return await send_stream(request, results)
+        except QuotaExceededError as e:
+            return self.quota_exceeded_response(e)
+
+    async def handle(self, request: web.Request) -> web.StreamResponse:
+        """The `submit_endpoint`: run the task on a resource and send its result back."""
+        self.requests += 1
+        body: Optional[bytes] = None
+        if (
+            request.content_type == CONTENT_TYPE
+            and request.content_length is not None
+            and request.content_length <= self.coalesce_max_bytes
+        ):
+            body = await request.read()
+            payload: Any = body
+        else:
+            payload = await read_task(request)
+
+        if wants_stream(request):
+            return await self.relay_stream(request, payload)
+
+        try:
+            async with self._gateway.quota_slot(
+                request.headers.get(TENANT_HEADER),
+                request.headers.get(TASK_TYPE_HEADER, "task"),
+            ):
+                if body is None:
+                    result: Dict[str, Any] = await self._gateway.dispatch(payload)
+                elif self.coalesce:
+                    result = await self.run_coalesced(body)
+                else:
+                    result = await self.run(body)
+        except (NoAvailableResourceError, CircuitOpenError) as e:
+            return self.error_response(503, str(e))
+        except QuotaExceededError as e:
+            return self.quota_exceeded_response(e)
+        except RemoteExecutionError as e:
+            return self.task_error_response(e.message)
+        except aiohttp.ClientResponseError as e:
+            if e.status == 429:
+                return self.error_response(
+                    429, "Every resource is saturated.", **{"Retry-After": "1"}
+                )
+            return self.error_response(
+                500 if e.status == 500 else 502, f"The resource failed: {e.message}"
+            )
+        except (aiohttp.ClientError, asyncio.TimeoutError, ConnectionError) as e:
+            return self.error_response(502, f"The resource is unreachable: {e!r}")
+
+        if "error" in result:
+            return self.task_error_response(result["error"])
+        return await send_response(request, result)
+
     def start(self) -> None:
         self._server.execute()
 
 
 if __name__ == "__main__":
-    gateway_server = GatewayServer()
+    gateway_server = GatewayServer(
+        heartbeat_addresses=[
+            "http://127.0.0.1:5000/heartbeat",
+            "http://127.0.0.1:5001/heartbeat",
+        ],
+        resource_addresses=[
+            "http://127.0.0.1:8100/exec",
+            "http://127.0.0.1:8101/exec",
+        ],
+        server_kwargs={"heartbeat_port": 5999},
+    )
 
     gateway_server.start()
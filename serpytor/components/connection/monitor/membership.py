@@ -0,0 +1,277 @@
+import asyncio
+import random
+import time
+from typing import Any, Callable, Dict, Iterable, List, Literal, Optional
+
+import aiohttp
+from aiohttp import web
+
+MemberState = Literal["alive", "suspect", "dead", "left"]
+MemberCallback = Callable[[str, Optional[MemberState], MemberState], None]
+
+# When two updates about a member have the same incarnation, the "worst" one wins.
+PRECEDENCE: Dict[str, int] = {"alive": 0, "suspect": 1, "dead": 2, "left": 2}
+
+
+class GossipMembership:
+    """SWIM-style cluster membership, gossiped between the heartbeat servers.
+
+    Every node knows every other node, with a state (`alive`, `suspect`, `dead` or
+    `left`) and an incarnation number. Every `interval` seconds, a node exchanges its
+    whole member list with `fanout` random peers (push-pull), so news reach every node in
+    O(log N) rounds, without any central poller.
+
+    A peer that can't be reached is probed indirectly through `indirect_probes` other
+    peers before being suspected, so that a single bad link doesn't get it suspected. A
+    suspect that doesn't refute the suspicion (by gossiping a higher incarnation of
+    itself) within `suspect_timeout` seconds is declared dead. Dead and departed members
+    are forgotten after `tombstone_ttl` seconds.
+
+    Nodes join by gossiping with any of the `seeds`, and leave gracefully with `leave`.
+    Gateways discover the resources by reading the member list of any node (see
+    `Gateway`'s `discovery_seeds`).
+
+    Subscribers are called with `(address, old_state, new_state)` on every change, with
+    `old_state=None` for new members.
+
+    Example usage:
+
+    ```python
+    membership = GossipMembership(
+        "http://127.0.0.1:5001",
+        resource="http://127.0.0.1:8101/exec",
+        seeds=["http://127.0.0.1:5000"],
+    )
+    app = web.Application()
+    app.on_startup.append(membership.start)
+    app.on_cleanup.append(membership.stop)
+    app.add_routes(membership.routes())
+    ```
+    """
+
+    def __init__(
+        self,
+        address: str,
+        resource: Optional[str] = None,
+        seeds: Iterable[str] = (),
+        interval: float = 1.0,
+        fanout: int = 3,
+        indirect_probes: int = 2,
+        suspect_timeout: Optional[float] = None,
+        tombstone_ttl: float = 60.0,
+        timeout: Optional[float] = None,
+    ) -> None:
+        self.address: str = address
+        self.resource: Optional[str] = resource
+        self.seeds: List[str] = [seed for seed in seeds if seed != address]
+        self.interval: float = interval
+        self.fanout: int = fanout
+        self.indirect_probes: int = indirect_probes
+        self.suspect_timeout: float = (
+            suspect_timeout if suspect_timeout is not None else 5 * interval
+        )
+        self.tombstone_ttl: float = tombstone_ttl
+        self.timeout: float = timeout if timeout is not None else interval
+        self.incarnation: int = 0
+        self.state: MemberState = "alive"
+        self.members: Dict[str, Dict[str, Any]] = {}
+        self.rounds: int = 0
+        self._changed_at: Dict[str, float] = {}
+        self._subscribers: List[MemberCallback] = []
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def __str__(self) -> str:
+        return f"{self.__class__.__name__}({self.address}, {len(self.alive_members())} alive members)"
+
+    def subscribe(self, callback: MemberCallback) -> None:
+        self._subscribers.append(callback)
+
+    def routes(self) -> List[web.RouteDef]:
+        return [
+            web.post("/gossip", self.handle),
+            web.get("/gossip/members", self.handle_members),
+            web.post("/gossip/probe", self.handle_probe),
+        ]
+
+    def own_record(self) -> Dict[str, Any]:
+        return {
+            "address": self.address,
+            "resource": self.resource,
+            "state": self.state,
+            "incarnation": self.incarnation,
+        }
+
+    def digest(self) -> List[Dict[str, Any]]:
+        """Every member known to this node, itself included."""
+        return [self.own_record()] + list(self.members.values())
+
+    def alive_members(self) -> List[Dict[str, Any]]:
+        return [
+            member for member in self.members.values() if member["state"] == "alive"
+        ]
+
+    def merge(self, updates: Iterable[Dict[str, Any]]) -> None:
+        for update in updates:
+            self.merge_member(update)
+
+    def merge_member(self, update: Dict[str, Any]) -> None:
+        address: str = update["address"]
+        if address == self.address:
+            # Someone thinks we are gone: refute it with a newer incarnation.
+            if (
+                self.state == "alive"
+                and update["state"] != "alive"
+                and update["incarnation"] >= self.incarnation
+            ):
+                self.incarnation = update["incarnation"] + 1
+            return
+
+        current: Optional[Dict[str, Any]] = self.members.get(address)
+        if current is not None and not (
+            update["incarnation"] > current["incarnation"]
+            or (
+                update["incarnation"] == current["incarnation"]
+                and PRECEDENCE[update["state"]] > PRECEDENCE[current["state"]]
+            )
+        ):
+            return
+        self._set_member(dict(update))
+
+    def _set_member(self, member: Dict[str, Any]) -> None:
+        address: str = member["address"]
+        old_state: Optional[MemberState] = self.members.get(address, {}).get("state")
+        self.members[address] = member
+        self._changed_at[address] = time.monotonic()
+        if member["state"] != old_state:
+            for callback in self._subscribers:
+                callback(address, old_state, member["state"])
+
+    def mark(self, address: str, state: MemberState) -> None:
+        """Change the state of a member, keeping its incarnation."""
+        member: Optional[Dict[str, Any]] = self.members.get(address)
+        if member is not None and member["state"] != state:
+            self._set_member({**member, "state": state})
+
+    def expire(self) -> None:
+        """Declare the suspects that timed out dead, and forget the old tombstones."""
+        now: float = time.monotonic()
+        for address, member in list(self.members.items()):
+            age: float = now - self._changed_at[address]
+            if member["state"] == "suspect" and age > self.suspect_timeout:
+                self.mark(address, "dead")
+            elif member["state"] in ("dead", "left") and age > self.tombstone_ttl:
+                del self.members[address]
+                del self._changed_at[address]
+
+    async def exchange(self, peer: str) -> bool:
+        """Push our member list to a peer, and merge the one it sends back."""
+        try:
+            async with self._session.post(
+                f"{peer}/gossip",
+                json={"members": self.digest()},
+                timeout=aiohttp.ClientTimeout(total=self.timeout),
+            ) as resp:
+                resp.raise_for_status()
+                self.merge((await resp.json())["members"])
+                return True
+        except (aiohttp.ClientError, asyncio.TimeoutError, ConnectionError, ValueError):
+            return False
+
+    async def probe(self, peer: str) -> bool:
+        """Reach a peer directly, then through `indirect_probes` other members."""
+        if await self.exchange(peer):
+            return True
+        helpers: List[str] = [
+            member["address"]
+            for member in self.alive_members()
+            if member["address"] != peer
+        ]
+        helpers = random.sample(helpers, min(self.indirect_probes, len(helpers)))
+
+        async def probe_through(helper: str) -> bool:
+            try:
+                async with self._session.post(
+                    f"{helper}/gossip/probe",
+                    json={"target": peer},
+                    timeout=aiohttp.ClientTimeout(total=2 * self.timeout),
+                ) as resp:
+                    return bool((await resp.json()).get("ack"))
+            except (aiohttp.ClientError, asyncio.TimeoutError, ConnectionError, ValueError):
+                return False
+
+        return any(await asyncio.gather(*[probe_through(helper) for helper in helpers]))
+
+    async def gossip_round(self) -> None:
+        self.expire()
+        peers: List[str] = [
+            address
+            for address, member in self.members.items()
+            if member["state"] in ("alive", "suspect")
+        ]
+        if not peers:
+            peers = list(self.seeds)
+        peers = random.sample(peers, min(self.fanout, len(peers)))
+
+        async def gossip_with(peer: str) -> None:
+            if await self.probe(peer):
+                return
+            if self.members.get(peer, {}).get("state") == "alive":
+                self.mark(peer, "suspect")
+
+        await asyncio.gather(*[gossip_with(peer) for peer in peers])
+        self.rounds += 1
+
+    async def join(self) -> bool:
+        """Gossip with the seeds until one of them answers."""
+        for seed in random.sample(self.seeds, len(self.seeds)):
+            if await self.exchange(seed):
+                return True
+        return not self.seeds
+
+    async def leave(self) -> None:
+        """Tell a few peers that this node is leaving."""
+        self.state = "left"
+        self.incarnation += 1
+        peers: List[str] = [member["address"] for member in self.alive_members()]
+        await asyncio.gather(
+            *[
+                self.exchange(peer)
+                for peer in random.sample(peers, min(self.fanout, len(peers)))
+            ]
+        )
+
+    async def run(self) -> None:
+        await self.join()
+        while True:
+            await asyncio.sleep(self.interval * random.uniform(0.5, 1.5))
+            await self.gossip_round()
+
+    async def start(self, app: Optional[web.Application] = None) -> None:
+        self.state = "alive"
+        self._session = aiohttp.ClientSession()
+        self._task = asyncio.create_task(self.run())
+
+    async def stop(self, app: Optional[web.Application] = None) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        if self._session is not None:
+            await self.leave()
+            await self._session.close()
+            self._session = None
+
+    async def handle(self, request: web.Request) -> web.Response:
+        """The `/gossip` endpoint: merge the member list of the caller, and send ours back."""
+        self.merge((await request.json())["members"])
+        return web.json_response({"members": self.digest()})
+
+    async def handle_members(self, request: web.Request) -> web.Response:
+        """The `/gossip/members` endpoint, for the gateways."""
+        return web.json_response({"members": self.digest()})
+
+    async def handle_probe(self, request: web.Request) -> web.Response:
+        """The `/gossip/probe` endpoint: check a member on behalf of the caller."""
+        target: str = (await request.json())["target"]
+        return web.json_response({"ack": await self.exchange(target)})
@@ -0,0 +1,140 @@
+import array
+import math
+import multiprocessing as mp
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+WINDOWS: Dict[str, float] = {"1s": 1.0, "10s": 10.0, "60s": 60.0}
+LATENCY_PERCENTILES: Tuple[int, ...] = (50, 90, 99)
+
+
+def percentile(values: List[float], p: float) -> Optional[float]:
+    """Nearest-rank percentile of `values`, or None if there are none."""
+    if not values:
+        return None
+    ordered: List[float] = sorted(values)
+    return ordered[min(int(round(p / 100.0 * (len(ordered) - 1))), len(ordered) - 1)]
+
+
+class TaskMetrics:
+    """Task counters shared by the processes of a `Server`.
+
+    The execution pools of the service count the tasks they run here, and the heartbeat
+    server reads the counts back. Everything lives in shared memory, so the object must
+    be created before the service and heartbeat processes are started.
+
+    The durations of the last `latency_capacity` tasks are kept, along with the time
+    they finished at, in a ring buffer.
+    """
+
+    def __init__(self, latency_capacity: int = 1024) -> None:
+        self.latency_capacity: int = latency_capacity
+        self._in_flight = mp.Value("i", 0)
+        self._workers = mp.Value("i", 0)
+        # (finished at, duration) pairs. `_latency_count` is guarded by the array's lock.
+        self._latencies = mp.Array("d", 2 * latency_capacity)
+        self._latency_count = mp.Value("L", 0, lock=False)
+
+    def __str__(self) -> str:
+        return f"{self.__class__.__name__}({self.in_flight} tasks in flight, {self.queue_depth} queued)"
+
+    @property
+    def in_flight(self) -> int:
+        return self._in_flight.value
+
+    @property
+    def queue_depth(self) -> int:
+        return max(self._in_flight.value - self._workers.value, 0)
+
+    def add_workers(self, count: int) -> None:
+        with self._workers.get_lock():
+            self._workers.value += count
+
+    def task_started(self) -> None:
+        with self._in_flight.get_lock():
+            self._in_flight.value += 1
+
+    def task_finished(self, latency: Optional[float] = None) -> None:
+        with self._in_flight.get_lock():
+            self._in_flight.value = max(self._in_flight.value - 1, 0)
+        if latency is None:
+            return
+        with self._latencies.get_lock():
+            slot: int = self._latency_count.value % self.latency_capacity
+            self._latencies[2 * slot] = time.time()
+            self._latencies[2 * slot + 1] = latency
+            self._latency_count.value += 1
+
+    def latencies_since(self, timestamp: float) -> List[float]:
+        """Durations of the tasks that finished after `timestamp`."""
+        with self._latencies.get_lock():
+            count: int = min(self._latency_count.value, self.latency_capacity)
+            pairs: List[float] = self._latencies[: 2 * count]
+        return [
+            pairs[2 * i + 1] for i in range(count) if pairs[2 * i] > timestamp
+        ]
+
+
+class RollingMetrics:
+    """Rolling windows over the vitals of a host.
+
+    Samples are written into a fixed-size ring buffer of doubles, large enough to cover
+    `horizon` seconds at one sample every `interval` seconds. `windows` then summarizes
+    the samples of the last 1, 10 and 60 seconds, so that schedulers can look at the
+    average load over a while instead of a single, possibly spiking, reading.
+    """
+
+    FIELDS: Tuple[str, ...] = ("cpu", "memory", "load", "in_flight", "queue_depth")
+
+    def __init__(
+        self,
+        horizon: float = max(WINDOWS.values()),
+        interval: float = 1.0,
+        task_metrics: Optional[TaskMetrics] = None,
+    ) -> None:
+        self.slots: int = max(int(math.ceil(horizon / interval)), 1) + 1
+        self.task_metrics: Optional[TaskMetrics] = task_metrics
+        self._stride: int = len(self.FIELDS) + 1
+        self._samples: array.array = array.array("d", [0.0]) * (
+            self.slots * self._stride
+        )
+        self._count: int = 0
+
+    def __str__(self) -> str:
+        return f"{self.__class__.__name__}({min(self._count, self.slots)} samples)"
+
+    def record(self, vitals: Dict[str, Any], timestamp: Optional[float] = None) -> None:
+        offset: int = (self._count % self.slots) * self._stride
+        self._samples[offset] = timestamp if timestamp is not None else time.time()
+        for idx, field in enumerate(self.FIELDS, start=1):
+            self._samples[offset + idx] = float(vitals.get(field) or 0.0)
+        self._count += 1
+
+    def window(self, seconds: float, now: Optional[float] = None) -> Dict[str, Any]:
+        """Average of every field over the samples taken in the last `seconds` seconds."""
+        now = now if now is not None else time.time()
+        since: float = now - seconds
+        totals: List[float] = [0.0] * len(self.FIELDS)
+        samples: int = 0
+        for slot in range(min(self._count, self.slots)):
+            offset: int = slot * self._stride
+            if self._samples[offset] <= since:
+                continue
+            samples += 1
+            for idx in range(len(self.FIELDS)):
+                totals[idx] += self._samples[offset + 1 + idx]
+
+        summary: Dict[str, Any] = {
+            field: (total / samples if samples else None)
+            for field, total in zip(self.FIELDS, totals)
+        }
+        if self.task_metrics is not None:
+            latencies: List[float] = self.task_metrics.latencies_since(since)
+            summary["tasks"] = len(latencies)
+            for p in LATENCY_PERCENTILES:
+                summary[f"latency_p{p}"] = percentile(latencies, p)
+        return summary
+
+    def windows(self, now: Optional[float] = None) -> Dict[str, Dict[str, Any]]:
+        now = now if now is not None else time.time()
+        return {name: self.window(seconds, now) for name, seconds in WINDOWS.items()}
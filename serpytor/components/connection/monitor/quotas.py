@@ -0,0 +1,257 @@
+import asyncio
+import math
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Callable, Deque, Dict, Optional, Tuple
+
+from serpytor.components.connection.monitor.exceptions import \
+    QuotaExceededError
+
+TENANT_HEADER: str = "X-Serpytor-Tenant"
+TASK_TYPE_HEADER: str = "X-Serpytor-Task-Type"
+DEFAULT_TENANT: str = "default"
+
+
+class TokenBucket:
+    """`rate` tokens per second, of which up to `burst` can be spent at once."""
+
+    def __init__(
+        self,
+        rate: float,
+        burst: Optional[float] = None,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.rate: float = rate
+        self.burst: float = burst if burst is not None else max(rate, 1.0)
+        self.clock: Callable[[], float] = clock
+        self.tokens: float = self.burst
+        self.updated_at: float = clock()
+
+    def __str__(self) -> str:
+        return f"{self.__class__.__name__}({self.rate}/s, {self.tokens:.1f}/{self.burst} tokens)"
+
+    def refill(self) -> None:
+        now: float = self.clock()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    def delay(self, tokens: float = 1.0) -> float:
+        """How long until `tokens` tokens are available, 0 if they are now."""
+        self.refill()
+        if self.tokens >= tokens:
+            return 0.0
+        return (tokens - self.tokens) / self.rate if self.rate > 0 else math.inf
+
+    def try_acquire(self, tokens: float = 1.0) -> bool:
+        if self.delay(tokens) > 0:
+            return False
+        self.tokens -= tokens
+        return True
+
+
+class Quota:
+    """The limits of a tenant or a task type: `rate` requests per second (with bursts of up
+    to `burst`), and `max_concurrency` requests in flight. None means unlimited."""
+
+    def __init__(
+        self,
+        rate: Optional[float] = None,
+        burst: Optional[float] = None,
+        max_concurrency: Optional[int] = None,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.rate: Optional[float] = rate
+        self.burst: Optional[float] = burst
+        self.max_concurrency: Optional[int] = max_concurrency
+        self.clock: Callable[[], float] = clock
+        self.bucket: Optional[TokenBucket] = (
+            TokenBucket(rate, burst, clock=clock) if rate is not None else None
+        )
+        self.in_flight: int = 0
+
+    def __str__(self) -> str:
+        return f"{self.__class__.__name__}(rate={self.rate}, max_concurrency={self.max_concurrency}, {self.in_flight} in flight)"
+
+    def copy(self) -> "Quota":
+        """A quota with the same limits, and nothing spent."""
+        return Quota(self.rate, self.burst, self.max_concurrency, clock=self.clock)
+
+    def wait_time(self) -> float:
+        """0 if a request may start now, how long until it may if it is only rate limited,
+        and infinity if it has to wait for another one to finish."""
+        if self.max_concurrency is not None and self.in_flight >= self.max_concurrency:
+            return math.inf
+        return self.bucket.delay() if self.bucket is not None else 0.0
+
+    def take(self) -> None:
+        if self.bucket is not None:
+            self.bucket.try_acquire()
+        self.in_flight += 1
+
+    def release(self) -> None:
+        self.in_flight -= 1
+
+
+class QuotaManager:
+    """Rate limits and concurrency quotas per tenant and per task type, shared by the
+    requests of a `Gateway`.
+
+    `tenants` and `task_types` map names to their `Quota`, and `default_tenant` and
+    `default_task_type` are copied for the ones that are not listed (unlimited if None).
+    A request needs room in both the quota of its tenant and the one of its task type.
+
+    Requests that can start right away cost a few dictionary lookups. The others wait in
+    a queue per tenant (of up to `max_queued` requests, beyond which `QuotaExceededError`
+    is raised), and the tenants with waiting requests take turns: each time room is made,
+    one request of every tenant in turn is let through. A tenant flooding the gateway only
+    ever delays its own requests.
+
+    Example usage:
+
+    ```python
+    quotas = QuotaManager(
+        tenants={"batch-team": Quota(rate=50, max_concurrency=8)},
+        task_types={"train": Quota(max_concurrency=2)},
+        default_tenant=Quota(rate=20, burst=40),
+    )
+    gateway = Gateway(..., quotas=quotas)
+    await gateway.execute(task_args=[...], tenant="search-team", task_type="embed")
+    ```
+    """
+
+    def __init__(
+        self,
+        tenants: Optional[Dict[str, Quota]] = None,
+        task_types: Optional[Dict[str, Quota]] = None,
+        default_tenant: Optional[Quota] = None,
+        default_task_type: Optional[Quota] = None,
+        max_queued: int = 1000,
+    ) -> None:
+        self.tenants: Dict[str, Quota] = dict(tenants or {})
+        self.task_types: Dict[str, Quota] = dict(task_types or {})
+        self.default_tenant: Quota = default_tenant or Quota()
+        self.default_task_type: Quota = default_task_type or Quota()
+        self.max_queued: int = max_queued
+        # Tenant -> (task type, future) of its waiting requests, in order of arrival.
+        self.waiting: Dict[str, Deque[Tuple[str, asyncio.Future]]] = {}
+        # The tenants with waiting requests, the next one to be let through first.
+        self.turns: Deque[str] = deque()
+        self.queued_types: Dict[str, int] = {}
+        self.admitted: int = 0
+        self.queued: int = 0
+        self.rejected: int = 0
+        self._timer: Optional[asyncio.TimerHandle] = None
+
+    def __str__(self) -> str:
+        return f"{self.__class__.__name__}({len(self.tenants)} tenants, {sum(map(len, self.waiting.values()))} waiting)"
+
+    def tenant_quota(self, tenant: str) -> Quota:
+        if tenant not in self.tenants:
+            self.tenants[tenant] = self.default_tenant.copy()
+        return self.tenants[tenant]
+
+    def task_type_quota(self, task_type: str) -> Quota:
+        if task_type not in self.task_types:
+            self.task_types[task_type] = self.default_task_type.copy()
+        return self.task_types[task_type]
+
+    def wait_time(self, tenant: str, task_type: str) -> float:
+        return max(
+            self.tenant_quota(tenant).wait_time(), self.task_type_quota(task_type).wait_time()
+        )
+
+    def take(self, tenant: str, task_type: str) -> None:
+        self.tenant_quota(tenant).take()
+        self.task_type_quota(task_type).take()
+        self.admitted += 1
+
+    async def acquire(self, tenant: Optional[str] = None, task_type: str = "task") -> None:
+        """Wait until a request of `tenant` and `task_type` may start, and count it in."""
+        tenant = tenant or DEFAULT_TENANT
+        if (
+            tenant not in self.waiting
+            and not self.queued_types.get(task_type)
+            and self.wait_time(tenant, task_type) == 0
+        ):
+            self.take(tenant, task_type)
+            return
+
+        waiting: Deque[Tuple[str, asyncio.Future]] = self.waiting.setdefault(tenant, deque())
+        if len(waiting) >= self.max_queued:
+            if not waiting:
+                del self.waiting[tenant]
+            self.rejected += 1
+            raise QuotaExceededError(tenant, task_type)
+        if not waiting:
+            self.turns.append(tenant)
+        future: asyncio.Future = asyncio.get_running_loop().create_future()
+        waiting.append((task_type, future))
+        self.queued_types[task_type] = self.queued_types.get(task_type, 0) + 1
+        self.queued += 1
+        self.wake()
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # Let through, but the caller went away.
+                self.release(tenant, task_type)
+            raise
+        finally:
+            self.queued_types[task_type] -= 1
+
+    def release(self, tenant: Optional[str] = None, task_type: str = "task") -> None:
+        """Count out a finished request, and let the waiting ones through if there is room."""
+        self.tenant_quota(tenant or DEFAULT_TENANT).release()
+        self.task_type_quota(task_type).release()
+        if self.turns:
+            self.wake()
+
+    @asynccontextmanager
+    async def slot(self, tenant: Optional[str] = None, task_type: str = "task") -> AsyncIterator[None]:
+        await self.acquire(tenant, task_type)
+        try:
+            yield
+        finally:
+            self.release(tenant, task_type)
+
+    def wake(self) -> None:
+        """Let the waiting requests through, while there is room.
+
+        The tenants are scanned in turn: the first one whose next request can start gets it
+        through, and goes last. When the only thing in the way is a rate limit, this is
+        called again once tokens are back.
+        """
+        delay: float = math.inf
+        position: int = 0
+        while position < len(self.turns):
+            tenant: str = self.turns[position]
+            waiting: Deque[Tuple[str, asyncio.Future]] = self.waiting[tenant]
+            while waiting and waiting[0][1].done():
+                # Cancelled while waiting.
+                waiting.popleft()
+            if not waiting:
+                del self.turns[position]
+                del self.waiting[tenant]
+                continue
+            task_type, future = waiting[0]
+            wait: float = self.wait_time(tenant, task_type)
+            if wait > 0:
+                delay = min(delay, wait)
+                position += 1
+                continue
+            waiting.popleft()
+            self.take(tenant, task_type)
+            future.set_result(None)
+            del self.turns[position]
+            if waiting:
+                self.turns.append(tenant)
+            else:
+                del self.waiting[tenant]
+            position, delay = 0, math.inf
+
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if self.turns and delay < math.inf:
+            self._timer = asyncio.get_running_loop().call_later(delay, self.wake)
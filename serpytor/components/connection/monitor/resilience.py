@@ -0,0 +1,109 @@
+import asyncio
+import random
+import time
+from typing import Literal, Optional, Tuple, Type
+
+import aiohttp
+
+from serpytor.components.connection.monitor.exceptions import \
+    CircuitOpenError
+
+CircuitState = Literal["closed", "open", "half_open"]
+
+
+class CircuitBreaker:
+    """Per-resource circuit breaker.
+
+    The breaker opens after `failure_threshold` consecutive failures, and rejects requests
+    to the resource for `reset_timeout` seconds. It then lets a single trial request
+    through (half-open): a success closes the breaker, a failure opens it again.
+    """
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0) -> None:
+        self.failure_threshold: int = failure_threshold
+        self.reset_timeout: float = reset_timeout
+        self.failures: int = 0
+        self.opened_at: Optional[float] = None
+        self._trial_in_flight: bool = False
+
+    def __str__(self) -> str:
+        return f"{self.__class__.__name__}({self.state}, {self.failures} failures)"
+
+    @property
+    def state(self) -> CircuitState:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return "half_open"
+        return "open"
+
+    def allow_request(self) -> bool:
+        """Check whether a request may be sent now. Claims the trial slot when half-open."""
+        state: CircuitState = self.state
+        if state == "closed":
+            return True
+        if state == "half_open" and not self._trial_in_flight:
+            self._trial_in_flight = True
+            return True
+        return False
+
+    def is_available(self) -> bool:
+        """Same as `allow_request`, without claiming the trial slot."""
+        state: CircuitState = self.state
+        return state == "closed" or (state == "half_open" and not self._trial_in_flight)
+
+    def record_success(self) -> None:
+        self.failures = 0
+        self.opened_at = None
+        self._trial_in_flight = False
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        if self._trial_in_flight or self.failures >= self.failure_threshold:
+            self.opened_at = time.monotonic()
+        self._trial_in_flight = False
+
+    def release_trial(self) -> None:
+        """Give the trial slot back when the trial request was cancelled before it finished."""
+        self._trial_in_flight = False
+
+
+class RetryPolicy:
+    """How many times, and how long after, a failed request is sent again to another resource.
+
+    The backoff uses "full jitter": the delay before retry `n` is drawn uniformly between 0
+    and `min(max_delay, base_delay * 2 ** n)`, so that callers retrying at the same time
+    don't hit the cluster in lockstep.
+    """
+
+    RETRYABLE_EXCEPTIONS: Tuple[Type[BaseException], ...] = (
+        aiohttp.ClientError,
+        asyncio.TimeoutError,
+        ConnectionError,
+        CircuitOpenError,
+    )
+
+    def __init__(
+        self,
+        retries: int = 0,
+        base_delay: float = 0.05,
+        max_delay: float = 2.0,
+        seed: Optional[int] = None,
+    ) -> None:
+        self.retries: int = retries
+        self.base_delay: float = base_delay
+        self.max_delay: float = max_delay
+        self._random: random.Random = random.Random(seed)
+
+    def __str__(self) -> str:
+        return f"{self.__class__.__name__}({self.retries} retries)"
+
+    def backoff(self, attempt: int) -> float:
+        return self._random.uniform(
+            0, min(self.max_delay, self.base_delay * 2**attempt)
+        )
+
+    def should_retry(self, exception: BaseException) -> bool:
+        if isinstance(exception, aiohttp.ClientResponseError):
+            return exception.status == 429 or exception.status >= 500
+        return isinstance(exception, self.RETRYABLE_EXCEPTIONS)
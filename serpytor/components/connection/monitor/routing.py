@@ -0,0 +1,208 @@
+import random
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Any, Dict, Iterable, Iterator, List, Literal, Optional
+
+RoutingPolicy = Literal["p2c", "least_outstanding"]
+
+
+class ResourceLoad:
+    """Load statistics kept by the `LoadAwareRouter` for a single resource."""
+
+    def __init__(self, address: str) -> None:
+        self.address: str = address
+        self.in_flight: int = 0
+        self.latency_ewma: Optional[float] = None
+        self.cpu: float = 0.0
+        self.memory: float = 0.0
+        self.vitals_updated_at: float = 0.0
+
+    def __repr__(self) -> str:
+        return f"ResourceLoad({self.address}, in_flight={self.in_flight}, latency_ewma={self.latency_ewma}, cpu={self.cpu}, memory={self.memory})"
+
+
+class LoadAwareRouter:
+    """Client-side load balancer for the resources of a `Gateway`.
+
+    The router counts the requests in flight to every resource, keeps an exponentially
+    weighted moving average (EWMA) of their latency, and merges in the CPU and memory
+    usage reported by the heartbeats (averaged over `vitals_window`, one of the rolling
+    windows of the heartbeat, when it reports them). The cost of a resource is its expected latency
+    times the number of requests it would have in flight, inflated by how busy its host is.
+
+    Two policies are available:
+
+    - `p2c` (power of two choices): sample two resources at random and take the cheaper one.
+      It spreads the load almost as well as a full scan, without herding every caller on
+      the same "best" resource.
+    - `least_outstanding`: take the resource with the fewest requests in flight, breaking
+      ties by cost.
+
+    Example usage:
+
+    ```python
+    router = LoadAwareRouter(["http://127.0.0.1:8100/exec", "http://127.0.0.1:8101/exec"])
+    resource = router.select()
+    with router.track(resource):
+        ...  # Send the request
+    ```
+    """
+
+    def __init__(
+        self,
+        resources: Iterable[str] = (),
+        policy: RoutingPolicy = "p2c",
+        ewma_alpha: float = 0.3,
+        cpu_weight: float = 1.0,
+        memory_weight: float = 0.5,
+        seed: Optional[int] = None,
+        latency_window: int = 512,
+        vitals_window: Optional[str] = "10s",
+    ) -> None:
+        if policy not in ("p2c", "least_outstanding"):
+            raise ValueError(f"Unknown routing policy: {policy}")
+
+        self.policy: RoutingPolicy = policy
+        self.ewma_alpha: float = ewma_alpha
+        self.cpu_weight: float = cpu_weight
+        self.memory_weight: float = memory_weight
+        self.vitals_window: Optional[str] = vitals_window
+        self._random: random.Random = random.Random(seed)
+        self._loads: Dict[str, ResourceLoad] = {}
+        self._recent_latencies: deque = deque(maxlen=latency_window)
+        for resource in resources:
+            self.add_resource(resource)
+
+    def __str__(self) -> str:
+        return f"{self.__class__.__name__}({self.policy}, {len(self._loads)} resources)"
+
+    @property
+    def resources(self) -> List[str]:
+        return list(self._loads)
+
+    def add_resource(self, address: str) -> None:
+        self._loads.setdefault(address, ResourceLoad(address))
+
+    def remove_resource(self, address: str) -> None:
+        self._loads.pop(address, None)
+
+    def get_load(self, address: str) -> ResourceLoad:
+        return self._loads[address]
+
+    def update_vitals(self, report: Dict[str, Dict[str, Any]]) -> None:
+        """Merge a heartbeat report, as returned by `Gateway.get_available_resources`."""
+        now: float = time.monotonic()
+        for address, vitals in report.items():
+            if address not in self._loads or not vitals:
+                continue
+            load: ResourceLoad = self._loads[address]
+            window: Dict[str, Any] = vitals.get("windows", {}).get(
+                self.vitals_window, {}
+            )
+            cpu: Optional[float] = window.get("cpu")
+            memory: Optional[float] = window.get("memory")
+            load.cpu = float(cpu if cpu is not None else vitals.get("cpu", load.cpu))
+            load.memory = float(
+                memory if memory is not None else vitals.get("memory", load.memory)
+            )
+            load.vitals_updated_at = now
+
+    def vitals_age(self) -> float:
+        """Seconds since the stalest resource got its vitals updated."""
+        if not self._loads:
+            return float("inf")
+        return time.monotonic() - min(
+            load.vitals_updated_at for load in self._loads.values()
+        )
+
+    def _default_latency(self) -> float:
+        known: List[float] = [
+            load.latency_ewma
+            for load in self._loads.values()
+            if load.latency_ewma is not None
+        ]
+        return sum(known) / len(known) if known else 1.0
+
+    def cost(self, address: str) -> float:
+        """Expected cost of sending one more request to the resource. Lower is better."""
+        load: ResourceLoad = self._loads[address]
+        latency: float = (
+            load.latency_ewma
+            if load.latency_ewma is not None
+            else self._default_latency()
+        )
+        pressure: float = (
+            1.0
+            + self.cpu_weight * load.cpu / 100.0
+            + self.memory_weight * load.memory / 100.0
+        )
+        return latency * (load.in_flight + 1) * pressure
+
+    def select(self, exclude: Iterable[str] = ()) -> str:
+        """Pick the resource for the next request, skipping the `exclude`d ones."""
+        excluded = set(exclude)
+        candidates: List[str] = [
+            address for address in self._loads if address not in excluded
+        ]
+        if not candidates:
+            raise LookupError("No resources available.")
+
+        if self.policy == "least_outstanding":
+            return min(
+                candidates,
+                key=lambda address: (self._loads[address].in_flight, self.cost(address)),
+            )
+
+        if len(candidates) == 1:
+            return candidates[0]
+        first, second = self._random.sample(candidates, 2)
+        return first if self.cost(first) <= self.cost(second) else second
+
+    def acquire(self, address: str) -> None:
+        self._loads[address].in_flight += 1
+
+    def release(self, address: str, latency: Optional[float] = None) -> None:
+        """Mark a request to the resource as finished, recording its latency if it succeeded."""
+        load: Optional[ResourceLoad] = self._loads.get(address)
+        if load is None:
+            return
+        load.in_flight = max(load.in_flight - 1, 0)
+        if latency is not None:
+            self._recent_latencies.append(latency)
+            load.latency_ewma = (
+                latency
+                if load.latency_ewma is None
+                else self.ewma_alpha * latency
+                + (1 - self.ewma_alpha) * load.latency_ewma
+            )
+
+    def latency_percentile(
+        self, percentile: float, min_samples: int = 20
+    ) -> Optional[float]:
+        """Latency percentile of the recent successful requests, across all resources.
+
+        Returns None until at least `min_samples` requests have been timed.
+        """
+        if len(self._recent_latencies) < max(min_samples, 1):
+            return None
+        latencies: List[float] = sorted(self._recent_latencies)
+        index: int = min(
+            int(round(percentile / 100.0 * (len(latencies) - 1))), len(latencies) - 1
+        )
+        return latencies[index]
+
+    @contextmanager
+    def track(self, address: str) -> Iterator[None]:
+        """Count a request as in flight for the duration of the block, and time it.
+
+        Failed requests are not timed, so a resource failing fast doesn't look fast.
+        """
+        self.acquire(address)
+        start_time: float = time.perf_counter()
+        try:
+            yield
+        except BaseException:
+            self.release(address)
+            raise
+        self.release(address, time.perf_counter() - start_time)
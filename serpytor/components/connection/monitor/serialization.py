@@ -0,0 +1,283 @@
+"""Binary wire format for the payloads exchanged between a `Gateway` and its workers.
+
+Objects are pickled with protocol 5 and every buffer that supports out-of-band
+pickling (NumPy arrays, pandas blocks, `bytearray`s, `pickle.PickleBuffer`s...) is
+sent as a separate raw segment instead of being copied into the pickle stream.
+Nothing has to be converted to Python lists to cross the wire.
+
+A message is the magic bytes followed by a sequence of records:
+
+```
+| kind (u8) | codec (u8) | raw length (u64) | wire length (u64) | wire bytes |
+```
+
+- `SEGMENT` records announce a segment of `raw length` bytes. The first segment is the
+  pickle stream itself, the remaining ones are the out-of-band buffers.
+- `CHUNK` records carry the bytes of the current segment, at most `chunk_size` at a time,
+  each one optionally compressed with `codec`.
+- The `END` record closes the message.
+
+Since segments are cut into chunks, messages can be produced with `iter_dumps` and
+consumed with `FrameDecoder` while they are on the wire: neither side ever holds more
+than the decoded object plus one chunk.
+
+Compression is optional and needs the `zstandard` or `lz4` packages.
+"""
+import itertools
+import pickle
+import struct
+from typing import Any, Iterable, Iterator, List, Literal, Optional, Union
+
+import cloudpickle
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+try:
+    import lz4.frame as lz4_frame
+except ImportError:
+    lz4_frame = None
+
+MAGIC: bytes = b"SPT5"
+CONTENT_TYPE: str = "application/x-serpytor-pickle5"
+COMPRESSION_HEADER: str = "X-Serpytor-Compression"
+RETURN_TYPE_HEADER: str = "X-Serpytor-Return-Type"
+
+DEFAULT_CHUNK_SIZE: int = 1 << 20
+DEFAULT_COMPRESSION_THRESHOLD: int = 64 * 1024
+
+SEGMENT, CHUNK, END = 0, 1, 2
+CODECS = {None: 0, "zstd": 1, "lz4": 2}
+
+_RECORD: struct.Struct = struct.Struct("<BBQQ")
+
+Compression = Optional[Literal["zstd", "lz4"]]
+
+
+def available_codecs() -> List[str]:
+    """List the compression codecs that can be used in this environment."""
+    return [
+        name
+        for name, module in (("zstd", zstandard), ("lz4", lz4_frame))
+        if module is not None
+    ]
+
+
+def _compress(codec: int, data: memoryview) -> bytes:
+    if codec == CODECS["zstd"]:
+        return zstandard.ZstdCompressor().compress(data)
+    return lz4_frame.compress(data)
+
+
+def _decompress(codec: int, data: memoryview, raw_length: int) -> bytes:
+    if codec == CODECS["zstd"]:
+        if zstandard is None:
+            raise ImportError("zstandard is required to decode this message.")
+        return zstandard.ZstdDecompressor().decompress(data, max_output_size=raw_length)
+    if lz4_frame is None:
+        raise ImportError("lz4 is required to decode this message.")
+    return lz4_frame.decompress(data)
+
+
+def iter_dumps(
+    obj: Any,
+    compression: Compression = None,
+    compression_threshold: int = DEFAULT_COMPRESSION_THRESHOLD,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+) -> Iterator[Union[bytes, memoryview]]:
+    """Serialize `obj` lazily, one record at a time.
+
+    Uncompressed chunks are views over the buffers of `obj`, so nothing is copied until
+    the frames are written out. Chunks smaller than `compression_threshold`, or that
+    don't shrink when compressed, are sent as-is.
+    """
+    if compression not in CODECS:
+        raise ValueError(f"Unknown compression codec: {compression}")
+    if compression is not None and compression not in available_codecs():
+        raise ImportError(f"The {compression} codec is not installed.")
+
+    codec: int = CODECS[compression]
+    buffers: List[pickle.PickleBuffer] = []
+    main: bytes = cloudpickle.dumps(obj, protocol=5, buffer_callback=buffers.append)
+
+    yield MAGIC
+    for segment in [memoryview(main)] + [buffer.raw() for buffer in buffers]:
+        yield _RECORD.pack(SEGMENT, 0, segment.nbytes, 0)
+        for offset in range(0, segment.nbytes, chunk_size):
+            chunk: memoryview = segment[offset : offset + chunk_size]
+            if codec and chunk.nbytes >= compression_threshold:
+                compressed: bytes = _compress(codec, chunk)
+                if len(compressed) < chunk.nbytes:
+                    yield _RECORD.pack(CHUNK, codec, chunk.nbytes, len(compressed))
+                    yield compressed
+                    continue
+            yield _RECORD.pack(CHUNK, 0, chunk.nbytes, chunk.nbytes)
+            yield chunk
+    yield _RECORD.pack(END, 0, 0, 0)
+
+
+def dumps(obj: Any, **options: Any) -> List[Union[bytes, memoryview]]:
+    """Serialize `obj` into a list of frames. Accepts the same options as `iter_dumps`."""
+    return list(iter_dumps(obj, **options))
+
+
+def dumps_bytes(obj: Any, **options: Any) -> bytes:
+    """Serialize `obj` into a single `bytes` object."""
+    return b"".join(iter_dumps(obj, **options))
+
+
+def join_small(
+    frames: Iterator[Union[bytes, memoryview]], limit: int = DEFAULT_CHUNK_SIZE
+) -> Union[bytes, Iterator[Union[bytes, memoryview]]]:
+    """Join the frames of a message into a single `bytes` object if it is at most `limit` bytes long.
+
+    Small messages are then written out at once instead of frame by frame. Larger ones
+    are returned as an iterator over the same frames, to be streamed.
+    """
+    head: List[Union[bytes, memoryview]] = []
+    size: int = 0
+    for frame in frames:
+        head.append(frame)
+        size += len(frame)
+        if size > limit:
+            return itertools.chain(head, frames)
+    return b"".join(head)
+
+
+def is_framed(data: Union[bytes, bytearray, memoryview]) -> bool:
+    """Check whether `data` was produced by `dumps`."""
+    return bytes(memoryview(data)[: len(MAGIC)]) == MAGIC
+
+
+class FrameDecoder:
+    """Incremental decoder for messages produced by `iter_dumps`.
+
+    Feed it the bytes as they arrive, in pieces of any size; it returns every object
+    completed by each piece. Consecutive messages on the same stream are supported.
+
+    Segments are decoded straight into preallocated `bytearray`s, so the decoded arrays
+    are writable and don't share memory with the input.
+    """
+
+    def __init__(self) -> None:
+        self._pending: bytearray = bytearray()
+        self._segments: List[bytearray] = []
+        self._segment_offset: int = 0
+        self._started: bool = False
+
+    def feed(self, data: Union[bytes, bytearray, memoryview]) -> List[Any]:
+        # Parse straight from `data` when nothing is left over from the previous call,
+        # so that large pieces are copied once, into their segment.
+        if self._pending:
+            self._pending += data
+            data = self._pending
+        completed: List[Any] = []
+        position: int = 0
+
+        with memoryview(data) as view:
+            while True:
+                if not self._started:
+                    if view.nbytes - position < len(MAGIC):
+                        break
+                    if bytes(view[position : position + len(MAGIC)]) != MAGIC:
+                        raise ValueError("Not a serpytor message.")
+                    position += len(MAGIC)
+                    self._started = True
+
+                if view.nbytes - position < _RECORD.size:
+                    break
+                kind, codec, raw_length, wire_length = _RECORD.unpack_from(
+                    view, position
+                )
+                if view.nbytes - position - _RECORD.size < wire_length:
+                    break
+                position += _RECORD.size
+
+                if kind == SEGMENT:
+                    self._segments.append(bytearray(raw_length))
+                    self._segment_offset = 0
+                elif kind == CHUNK:
+                    with view[position : position + wire_length] as payload:
+                        self._segments[-1][
+                            self._segment_offset : self._segment_offset + raw_length
+                        ] = (
+                            _decompress(codec, payload, raw_length)
+                            if codec
+                            else payload
+                        )
+                    self._segment_offset += raw_length
+                elif kind == END:
+                    completed.append(
+                        pickle.loads(self._segments[0], buffers=self._segments[1:])
+                    )
+                    self._segments = []
+                    self._started = False
+                else:
+                    raise ValueError(f"Unknown record kind: {kind}")
+                position += wire_length
+
+            if data is not self._pending:
+                self._pending = bytearray(view[position:])
+                position = 0
+
+        del self._pending[:position]
+        return completed
+
+
+def iter_loads(chunks: Iterable[Union[bytes, bytearray, memoryview]]) -> Iterator[Any]:
+    """Decode every message found in a stream of byte chunks."""
+    decoder: FrameDecoder = FrameDecoder()
+    for chunk in chunks:
+        yield from decoder.feed(chunk)
+
+
+def _segment_views(view: memoryview) -> Optional[List[memoryview]]:
+    """The segments of a whole message as views over it, or None if some segment is
+    compressed or cut into several chunks, and has to be copied."""
+    position: int = len(MAGIC)
+    segments: List[memoryview] = []
+    lengths: List[int] = []
+    while view.nbytes - position >= _RECORD.size:
+        kind, codec, raw_length, wire_length = _RECORD.unpack_from(view, position)
+        position += _RECORD.size
+        if kind in (SEGMENT, END) and segments and segments[-1].nbytes != lengths[-1]:
+            return None
+        if kind == END:
+            return segments
+        if kind == SEGMENT:
+            segments.append(view[position:position])
+            lengths.append(raw_length)
+        elif kind == CHUNK:
+            if codec or segments[-1].nbytes or view.nbytes - position < wire_length:
+                return None
+            segments[-1] = view[position : position + wire_length]
+        else:
+            return None
+        position += wire_length
+    return None
+
+
+def loads(data: Union[bytes, bytearray, memoryview]) -> Any:
+    """Deserialize a single message produced by `dumps`.
+
+    Given a writable buffer (e.g. a `bytearray`), the out-of-band buffers sent in a single
+    uncompressed chunk are handed to pickle as views over `data`, so the decoded arrays
+    share memory with it. Otherwise they are copied, and writable.
+
+    Plain pickles are accepted as well, for peers that still send them.
+    """
+    if not is_framed(data):
+        return pickle.loads(data)
+
+    view: memoryview = memoryview(data)
+    if not view.readonly and view.contiguous:
+        segments: Optional[List[memoryview]] = _segment_views(view.cast("B"))
+        if segments is not None:
+            return pickle.loads(segments[0], buffers=segments[1:])
+
+    completed: List[Any] = FrameDecoder().feed(data)
+    if not completed:
+        raise ValueError("Truncated serpytor message.")
+    return completed[0]
@@ -1,15 +1,20 @@
 import json
 import multiprocessing as mp
-import pickle
-import time
+import os
+import signal
 from datetime import datetime
 from multiprocessing import Process
 from typing import Any, Callable, Dict, List, Optional, Tuple, Union
 
-import psutil
 from aiohttp import web
 from rich import print as rich_print
 
+from serpytor.components.connection.monitor.execution import ExecutionPool
+from serpytor.components.connection.monitor.membership import GossipMembership
+from serpytor.components.connection.monitor.metrics import TaskMetrics
+from serpytor.components.connection.monitor.vitals import VitalsSampler
+from serpytor.components.connection.monitor.workers import WorkerSupervisor
+
 
 class ForbiddenDeviceException(Exception):
     def __str__(self):
@@ -46,6 +51,14 @@ class HeartbeatServer:
         ```
 
         If an endpoint type is not specified, defaults to "get"
+
+        The `/heartbeat` endpoint serves the vitals sampled every
+        `heartbeat_sample_interval` seconds (1 by default) by a `VitalsSampler`, and
+        `/heartbeat/ws` pushes their changes to the subscribers.
+
+        With `gossip_seeds` (a list of heartbeat server addresses, possibly empty for the
+        first node), the server also joins the cluster membership gossiped between the
+        heartbeat servers every `gossip_interval` seconds (see `GossipMembership`).
         """
 
         self.heartbeat_web_server = web.Application()
@@ -55,23 +68,49 @@ class HeartbeatServer:
         self.heartbeat_server_kwargs: Dict[str, Any] = heartbeat_server_kwargs
         self.heartbeat_server_args: List[Any] = heartbeat_server_args
         self.resource_online: bool = False
+        self.heartbeat_process: Optional[Process] = None
+
+        self.vitals_sampler: VitalsSampler = VitalsSampler(
+            f"{self.heartbeat_protocol}://{self.heartbeat_host}:{self.heartbeat_port}",
+            interval=kwargs.get("heartbeat_sample_interval", 1.0),
+        )
+        self.heartbeat_web_server.on_startup.append(self.vitals_sampler.start)
+        self.heartbeat_web_server.on_cleanup.append(self.vitals_sampler.stop)
 
         self.heartbeat_handler: Dict[str, Dict[str, Union[str, Callable]]] = {
             "/heartbeat": {
                 "type": "get",
-                "mapped_method": lambda request: web.Response(
-                    text=json.dumps(
-                        {
-                            "location": f"{self.heartbeat_protocol}://{self.heartbeat_host}:{self.heartbeat_port}",
-                            "message": request.remote,
-                            "cpu": psutil.cpu_percent(),
-                            "memory": psutil.virtual_memory()[2],
-                        }
-                    )
-                ),
+                "mapped_method": self.vitals_sampler.handle,
+            },
+            "/heartbeat/ws": {
+                "type": "get",
+                "mapped_method": self.vitals_sampler.subscribe,
             },
         }
 
+        self.membership: Optional[GossipMembership] = None
+        if kwargs.get("gossip_seeds") is not None:
+            self.membership = GossipMembership(
+                f"{self.heartbeat_protocol}://{self.heartbeat_host}:{self.heartbeat_port}",
+                seeds=kwargs["gossip_seeds"],
+                interval=kwargs.get("gossip_interval", 1.0),
+            )
+            self.heartbeat_web_server.on_startup.append(self.membership.start)
+            self.heartbeat_web_server.on_cleanup.append(self.membership.stop)
+            self.heartbeat_handler.update(
+                {
+                    "/gossip": {"type": "post", "mapped_method": self.membership.handle},
+                    "/gossip/members": {
+                        "type": "get",
+                        "mapped_method": self.membership.handle_members,
+                    },
+                    "/gossip/probe": {
+                        "type": "post",
+                        "mapped_method": self.membership.handle_probe,
+                    },
+                }
+            )
+
         self.heartbeat_mappings: List[
             Tuple[str, Callable]
         ] = self.heartbeat_handler.items()
@@ -129,6 +168,7 @@ class HeartbeatServer:
         )
         self.resource_online = True
         heartbeat_process.start()
+        self.heartbeat_process = heartbeat_process
         # rich_print(
         #     f"Stopping heartbeat server at {self.heartbeat_host}:{self.heartbeat_port}"
         # )
@@ -140,6 +180,19 @@ class HeartbeatServer:
 
 
 class Server(HeartbeatServer):
+    """Server with a heartbeat server and a built-in task execution endpoint.
+
+    Unless `mappings` already maps it, `exec_endpoint` (`/exec` by default, None to
+    disable) runs the tasks sent by a `Gateway` in a warm `ExecutionPool`, configured with
+    `exec_pool` (`"process"` or `"thread"`), `exec_workers` (defaults to the number of
+    cores) and `exec_queue_size` (requests beyond the workers and the queue get a 429).
+
+    With `service_workers` greater than 1, the service is served by that many worker
+    processes sharing the port (see `WorkerSupervisor`), each one with its own execution
+    pool, so size `exec_workers` accordingly. `reload_service` then restarts the workers
+    without dropping the requests in flight.
+    """
+
     def __init__(
         self,
         mappings: Dict[str, Dict[str, Union[str, Callable]]],
@@ -150,7 +203,7 @@ class Server(HeartbeatServer):
         **kwargs: Dict[str, Any],
     ) -> None:
         super().__init__(*args, **kwargs)
-        self.mappings: List[Tuple[str, Callable]] = mappings.items()
+        self.mappings: List[Tuple[str, Callable]] = list(mappings.items())
         self.service_web_server = web.Application()
         self.server_metadata: Dict[str, str] = {
             "name": kwargs.get("server_name", "SerPyTor Server"),
@@ -161,27 +214,37 @@ class Server(HeartbeatServer):
         self.server_protocol: str = server_protocol
         self.process_lock = mp.Lock()
         self.service_online: bool = True
+        self.service_workers: int = kwargs.get("service_workers", 1)
+        self.reuse_port: bool = kwargs.get("reuse_port", True)
+        self.service_process: Optional[Process] = None
+
+        self.task_metrics: TaskMetrics = TaskMetrics()
+        self.exec_endpoint: Optional[str] = kwargs.get("exec_endpoint", "/exec")
+        self.execution_pool: Optional[ExecutionPool] = None
+        if self.exec_endpoint is not None and self.exec_endpoint not in mappings:
+            self.execution_pool = ExecutionPool(
+                mode=kwargs.get("exec_pool", "process"),
+                workers=kwargs.get("exec_workers"),
+                queue_size=kwargs.get("exec_queue_size"),
+                metrics=self.task_metrics,
+            )
+            self.mappings.append(
+                (
+                    self.exec_endpoint,
+                    {"type": "post", "mapped_method": self.execution_pool.handle},
+                )
+            )
+            self.service_web_server.on_startup.append(self.execution_pool.start)
+            self.service_web_server.on_cleanup.append(self.execution_pool.stop)
 
-        self.heartbeat_handler: Dict[str, Dict[str, Union[str, Callable]]] = {
-            "/heartbeat": {
-                "type": "get",
-                "mapped_method": lambda request: web.Response(
-                    text=json.dumps(
-                        {
-                            "location": f"{self.server_protocol}://{self.server_host}:{self.server_port}",
-                            "message": request.remote,
-                            "cpu": psutil.cpu_percent(),
-                            "memory": psutil.virtual_memory()[2],
-                        }
-                    ),
-                    content_type="application/json",
-                ),
-            },
-        }
-
-        self.heartbeat_mappings: List[
-            Tuple[str, Callable]
-        ] = self.heartbeat_handler.items()
+        # Heartbeats report the location and the tasks of the service, not of the
+        # heartbeat server.
+        self.vitals_sampler.location = (
+            f"{self.server_protocol}://{self.server_host}:{self.server_port}"
+        )
+        self.vitals_sampler.task_metrics = self.task_metrics
+        if self.membership is not None and self.exec_endpoint is not None:
+            self.membership.resource = f"{self.server_protocol}://{self.server_host}:{self.server_port}{self.exec_endpoint}"
 
     def __str__(self):
         return "Server"
@@ -207,22 +270,34 @@ class Server(HeartbeatServer):
         self.service_web_server.add_routes(transformed_mappings)
 
         try:
-            p = Process(
-                target=web.run_app,
-                # args=(self.service_web_server),
-                kwargs={
-                    "print": None,
-                    "app": self.service_web_server,
-                    "port": self.server_port,
-                    "host": self.server_host,
+            if self.service_workers > 1:
+                supervisor: WorkerSupervisor = WorkerSupervisor(
+                    self.service_web_server,
+                    host=self.server_host,
+                    port=self.server_port,
+                    workers=self.service_workers,
+                    reuse_port=self.reuse_port,
                     **server_kwargs,
-                },
-            )
+                )
+                p = Process(target=supervisor.run)
+            else:
+                p = Process(
+                    target=web.run_app,
+                    # args=(self.service_web_server),
+                    kwargs={
+                        "print": None,
+                        "app": self.service_web_server,
+                        "port": self.server_port,
+                        "host": self.server_host,
+                        **server_kwargs,
+                    },
+                )
             rich_print(
                 f"[green][*] Starting service web server at {self.server_host}:{self.server_port}...[/green]"
             )
             self.service_online = True
             p.start()
+            self.service_process = p
         # rich_print(f"Exiting service web server at {self.server_host}:{self.server_port}...")
         # p.join()
         # self.service_online = False
@@ -230,22 +305,51 @@ class Server(HeartbeatServer):
             rich_print(f"Service {self.__str__} crashed :(\n Reason: {e}")
             self.service_online = False
 
+    def reload_service(self) -> None:
+        """Gracefully restart the workers of a multi-worker service."""
+        if self.service_process is None or self.service_workers <= 1:
+            raise RuntimeError("Only multi-worker services started here can be reloaded.")
+        os.kill(self.service_process.pid, signal.SIGHUP)
+
     def is_service_online(self) -> bool:
         return self.service_online
 
+    def stop(self, timeout: float = 30.0) -> None:
+        """Stop the service and heartbeat processes started here.
+
+        They get `SIGTERM` first, which lets the service finish the requests in flight, and
+        are killed if they are still running after `timeout` seconds.
+        """
+        processes: List[Process] = [
+            process
+            for process in (self.service_process, self.heartbeat_process)
+            if process is not None
+        ]
+        for process in processes:
+            if process.is_alive():
+                process.terminate()
+        for process in processes:
+            process.join(timeout=timeout)
+            if process.is_alive():
+                process.kill()
+                process.join()
+        self.service_online = False
+        self.resource_online = False
+
     def execute(self) -> None:
+        """Start the heartbeat server and the service, each in its own process.
+
+        The processes are started from here, so that `reload_service` and `stop` can reach
+        them.
+        """
         try:
-            heartbeat_process = Process(target=self.start_heartbeats)
-            service_process = Process(target=self.start_service)
-            heartbeat_process.start()
-            service_process.start()
+            self.start_heartbeats()
+            self.start_service()
         except KeyboardInterrupt:
             rich_print(
                 f"[yellow]Gracefully exiting server at {self.server_host}:{self.heartbeat_port}...[/yellow]"
             )
-
-            service_process.join()
-            heartbeat_process.join()
+            self.stop()
 
 
 if __name__ == "__main__":
@@ -275,59 +379,11 @@ if __name__ == "__main__":
             content_type="application/json",
         )
 
-    def sanity_check(code, args, kwargs):
-        """Checks if the code is safe to execute.
-        This is done by checking if the code is a function, and if the args and kwargs are of the correct type.
-        """
-        # return (
-        #     isinstance(code, types.FunctionType)
-        #     and isinstance(args, tuple)
-        #     and isinstance(kwargs, dict)
-        # )
-
-        return True
-
-    async def exec_func(
-        request, sanity_checking: Callable[..., bool] = sanity_check
-    ) -> Any:
-        """Receives a chunk of code (complete with imports, etc), executes it, and returns an output."""
-        reader = await request.multipart()
-        code_field = await reader.next()
-        code = await code_field.read()
-        args_field = await reader.next()
-        args = await args_field.read()
-        kwargs_field = await reader.next()
-        kwargs = await kwargs_field.read()
-
-        check_complete: bool = sanity_checking(
-            pickle.loads(code),
-            pickle.loads(args),
-            pickle.loads(kwargs),
-        )
-
-        print("Received kwargs = ", pickle.loads(kwargs))
-        message: str = "Sanity check not passed."
-        output: Union[Any, None] = None
-        if check_complete:
-            start_time = time.time()
-            output = pickle.loads(code)(
-                *pickle.loads(args), **pickle.loads(kwargs))
-            stop_time = time.time()
-            message = "Sanity check passed."
-        rich_print(
-            f"[green][+]Computation from {request.remote} completed in {(stop_time - start_time):.5f} second(s).[/green]"
-        )
-        return web.Response(
-            text=json.dumps({"message": message, "output": output}),
-            content_type="application/json",
-        )
-
     # heartbeat_mapping: Dict[str, Dict[str, Union[str, Callable[..., Any]]]] = {
     #     "/heartbeat": {"type": "get", "mapped_method": handleGet}
     # }
     mapping: Dict[str, Dict[str, Union[str, Callable[..., Any]]]] = {
         "/hello": {"type": "get", "mapped_method": hello},
-        "/exec": {"type": "post", "mapped_method": exec_func},
     }
 
     def test_example_v2():
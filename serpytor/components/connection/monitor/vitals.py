@@ -0,0 +1,300 @@
+import asyncio
+import hashlib
+import json
+import random
+import time
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set
+
+import aiohttp
+import psutil
+from aiohttp import web
+
+from serpytor.components.connection.monitor.metrics import (RollingMetrics,
+                                                            TaskMetrics)
+
+
+def diff_vitals(old: Dict[str, Any], new: Dict[str, Any]) -> Dict[str, Any]:
+    """The entries of `new` that are missing from, or differ in, `old`. Nested dicts are diffed too."""
+    changes: Dict[str, Any] = {}
+    for key, value in new.items():
+        if isinstance(value, dict) and isinstance(old.get(key), dict):
+            nested: Dict[str, Any] = diff_vitals(old[key], value)
+            if nested:
+                changes[key] = nested
+        elif key not in old or old[key] != value:
+            changes[key] = value
+    return changes
+
+
+def apply_delta(vitals: Dict[str, Any], changes: Dict[str, Any]) -> Dict[str, Any]:
+    """Merge a delta produced by `diff_vitals` into `vitals`, in place."""
+    for key, value in changes.items():
+        if isinstance(value, dict) and isinstance(vitals.get(key), dict):
+            apply_delta(vitals[key], value)
+        else:
+            vitals[key] = value
+    return vitals
+
+
+class VitalsSampler:
+    """Samples the vitals of the host in the background, and serves the latest sample.
+
+    Every `interval` seconds, the CPU and memory usage, the load average and, given the
+    `TaskMetrics` of the service, the tasks in flight and queued are read and serialized
+    once into a JSON body with an ETag. Along with these instantaneous readings, the body
+    carries their rolling averages over the last 1, 10 and 60 seconds under `windows`,
+    with the number of tasks completed and their latency percentiles in each window.
+
+    The `/heartbeat` handler sends that body as-is, or a bare `304 Not Modified` when the
+    caller already has it (`If-None-Match`), so answering a heartbeat costs the same
+    however many gateways are polling.
+
+    Subscribers connected to the `/heartbeat/ws` websocket (see `VitalsSubscriber`)
+    don't poll at all: they get a snapshot of the vitals when they connect, then only the
+    fields that changed, when they change. Each delta is serialized once for all of them.
+
+    Example usage:
+
+    ```python
+    sampler = VitalsSampler("http://127.0.0.1:8100", interval=1.0)
+    app = web.Application()
+    app.on_startup.append(sampler.start)
+    app.on_cleanup.append(sampler.stop)
+    app.add_routes(
+        [
+            web.get("/heartbeat", sampler.handle),
+            web.get("/heartbeat/ws", sampler.subscribe),
+        ]
+    )
+    ```
+    """
+
+    def __init__(
+        self,
+        location: str,
+        interval: float = 1.0,
+        task_metrics: Optional[TaskMetrics] = None,
+    ) -> None:
+        self.location: str = location
+        self.interval: float = interval
+        self.metrics: RollingMetrics = RollingMetrics(
+            interval=interval, task_metrics=task_metrics
+        )
+        self.vitals: Dict[str, Any] = {}
+        self.body: bytes = b""
+        self.etag: str = ""
+        self.subscribers: Set[web.WebSocketResponse] = set()
+        self._task: Optional[asyncio.Task] = None
+        # The first call only sets the reference point for the next ones.
+        psutil.cpu_percent()
+
+    def __str__(self) -> str:
+        return f"{self.__class__.__name__}({self.location}, every {self.interval}s)"
+
+    @property
+    def task_metrics(self) -> Optional[TaskMetrics]:
+        return self.metrics.task_metrics
+
+    @task_metrics.setter
+    def task_metrics(self, task_metrics: Optional[TaskMetrics]) -> None:
+        self.metrics.task_metrics = task_metrics
+
+    def sample(self) -> Dict[str, Any]:
+        return {
+            "location": self.location,
+            "cpu": psutil.cpu_percent(),
+            "memory": psutil.virtual_memory()[2],
+            "load": psutil.getloadavg()[0],
+            "in_flight": self.task_metrics.in_flight if self.task_metrics else 0,
+            "queue_depth": self.task_metrics.queue_depth if self.task_metrics else 0,
+        }
+
+    def refresh(self) -> Dict[str, Any]:
+        """Take a sample, and return the fields that changed since the previous one."""
+        vitals: Dict[str, Any] = self.sample()
+        self.metrics.record(vitals)
+        vitals["windows"] = self.metrics.windows()
+        changes: Dict[str, Any] = diff_vitals(self.vitals, vitals)
+        if changes:
+            self.vitals = vitals
+            self.body = json.dumps(vitals).encode()
+            self.etag = f'"{hashlib.blake2b(self.body, digest_size=8).hexdigest()}"'
+        return changes
+
+    async def broadcast(self, message: str) -> None:
+        subscribers: List[web.WebSocketResponse] = list(self.subscribers)
+        results: List[Any] = await asyncio.gather(
+            *[ws.send_str(message) for ws in subscribers], return_exceptions=True
+        )
+        for ws, result in zip(subscribers, results):
+            if isinstance(result, Exception):
+                self.subscribers.discard(ws)
+
+    async def run(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            changes: Dict[str, Any] = self.refresh()
+            if changes and self.subscribers:
+                await self.broadcast(json.dumps({"type": "delta", "changes": changes}))
+
+    async def start(self, app: Optional[web.Application] = None) -> None:
+        self.refresh()
+        self._task = asyncio.create_task(self.run())
+
+    async def stop(self, app: Optional[web.Application] = None) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        for ws in list(self.subscribers):
+            await ws.close(code=aiohttp.WSCloseCode.GOING_AWAY)
+        self.subscribers.clear()
+
+    async def handle(self, request: web.Request) -> web.Response:
+        """The `/heartbeat` endpoint."""
+        if not self.body:
+            self.refresh()
+        headers: Dict[str, str] = {"ETag": self.etag, "Cache-Control": "no-cache"}
+        if request.headers.get("If-None-Match") == self.etag:
+            return web.Response(status=304, headers=headers)
+        return web.Response(
+            body=self.body, content_type="application/json", headers=headers
+        )
+
+    async def subscribe(self, request: web.Request) -> web.WebSocketResponse:
+        """The `/heartbeat/ws` endpoint."""
+        ws: web.WebSocketResponse = web.WebSocketResponse(heartbeat=30.0)
+        await ws.prepare(request)
+        if not self.body:
+            self.refresh()
+        await ws.send_str(json.dumps({"type": "snapshot", "vitals": self.vitals}))
+        self.subscribers.add(ws)
+        try:
+            async for _ in ws:
+                # Subscribers have nothing to say; this only waits for them to leave.
+                pass
+        finally:
+            self.subscribers.discard(ws)
+        return ws
+
+
+class VitalsSubscriber:
+    """Follows the vitals of many heartbeat servers over persistent websockets.
+
+    One connection is kept open to the `/heartbeat/ws` endpoint of every heartbeat
+    address (e.g. `http://127.0.0.1:5000/heartbeat`), all of them on one client session.
+    The latest vitals of each server are kept in `vitals`, and every update is passed to
+    the `on_update` callbacks. Lost connections are reopened after a jittered exponential
+    backoff, up to `max_reconnect_delay` seconds.
+
+    Example usage:
+
+    ```python
+    subscriber = VitalsSubscriber(["http://127.0.0.1:5000/heartbeat"])
+    await subscriber.start()
+    await subscriber.wait_ready()
+    print(subscriber.vitals)
+    await subscriber.stop()
+    ```
+    """
+
+    def __init__(
+        self,
+        addresses: Iterable[str],
+        session: Optional[aiohttp.ClientSession] = None,
+        on_update: Optional[Callable[[str, Dict[str, Any]], Any]] = None,
+        reconnect_delay: float = 0.5,
+        max_reconnect_delay: float = 30.0,
+    ) -> None:
+        self.addresses: List[str] = list(addresses)
+        self.vitals: Dict[str, Dict[str, Any]] = {}
+        self.updated_at: Dict[str, float] = {}
+        self.connected: Set[str] = set()
+        self.callbacks: List[Callable[[str, Dict[str, Any]], Any]] = (
+            [on_update] if on_update is not None else []
+        )
+        self.reconnect_delay: float = reconnect_delay
+        self.max_reconnect_delay: float = max_reconnect_delay
+        self._session: Optional[aiohttp.ClientSession] = session
+        self._owns_session: bool = session is None
+        self._tasks: Dict[str, asyncio.Task] = {}
+
+    def __str__(self) -> str:
+        return f"{self.__class__.__name__}({len(self.connected)}/{len(self.addresses)} connected)"
+
+    @staticmethod
+    def subscription_url(address: str) -> str:
+        """The websocket URL matching a `/heartbeat` URL."""
+        if address.startswith("https://"):
+            address = "wss://" + address[len("https://") :]
+        elif address.startswith("http://"):
+            address = "ws://" + address[len("http://") :]
+        return address.rstrip("/") + "/ws"
+
+    def add_callback(self, callback: Callable[[str, Dict[str, Any]], Any]) -> None:
+        self.callbacks.append(callback)
+
+    def handle_message(self, address: str, message: Dict[str, Any]) -> None:
+        if message.get("type") == "snapshot":
+            self.vitals[address] = message["vitals"]
+        elif address in self.vitals:
+            apply_delta(self.vitals[address], message.get("changes", {}))
+        else:
+            return
+        self.updated_at[address] = time.monotonic()
+        for callback in self.callbacks:
+            callback(address, self.vitals[address])
+
+    async def follow(self, address: str) -> None:
+        delay: float = self.reconnect_delay
+        while True:
+            try:
+                async with self._session.ws_connect(
+                    self.subscription_url(address), heartbeat=30.0
+                ) as ws:
+                    async for msg in ws:
+                        if msg.type != aiohttp.WSMsgType.TEXT:
+                            break
+                        self.handle_message(address, json.loads(msg.data))
+                        self.connected.add(address)
+                        delay = self.reconnect_delay
+            except (aiohttp.ClientError, asyncio.TimeoutError, ConnectionError):
+                pass
+            self.connected.discard(address)
+            await asyncio.sleep(random.uniform(0, delay))
+            delay = min(delay * 2, self.max_reconnect_delay)
+
+    async def start(self) -> None:
+        if self._session is None:
+            self._session = aiohttp.ClientSession()
+        for address in self.addresses:
+            if address not in self._tasks:
+                self._tasks[address] = asyncio.create_task(self.follow(address))
+
+    async def set_addresses(self, addresses: Iterable[str]) -> None:
+        """Follow a new set of heartbeat servers, e.g. after a membership change."""
+        self.addresses = list(addresses)
+        for address in list(self._tasks):
+            if address not in self.addresses:
+                self._tasks.pop(address).cancel()
+                self.connected.discard(address)
+                self.vitals.pop(address, None)
+        await self.start()
+
+    async def wait_ready(self, timeout: float = 1.0) -> bool:
+        """Wait until every server has sent its snapshot, or for `timeout` seconds."""
+        deadline: float = time.monotonic() + timeout
+        while len(self.connected) < len(self.addresses):
+            if time.monotonic() >= deadline:
+                return False
+            await asyncio.sleep(0.01)
+        return True
+
+    async def stop(self) -> None:
+        for task in self._tasks.values():
+            task.cancel()
+        await asyncio.gather(*self._tasks.values(), return_exceptions=True)
+        self._tasks.clear()
+        self.connected.clear()
+        if self._owns_session and self._session is not None:
+            await self._session.close()
+            self._session = None
@@ -0,0 +1,261 @@
+import asyncio
+import multiprocessing as mp
+import os
+import signal
+import socket
+import time
+from multiprocessing import Process
+from typing import Any, Dict, List, Optional
+
+from aiohttp import web
+from rich import print as rich_print
+
+
+def serve_worker(
+    app: web.Application,
+    host: str,
+    port: int,
+    sock: Optional[socket.socket],
+    slot: int,
+    generation: int,
+    health: Any,
+    health_interval: float,
+    health_endpoint: str,
+    server_kwargs: Dict[str, Any],
+) -> None:
+    """Entrypoint of a worker process: serve `app` and report liveness in `health[slot]`.
+
+    The liveness timestamp is written from the event loop itself, so a worker whose loop
+    is stuck stops reporting even though its process is alive.
+    """
+
+    async def report_health(app: web.Application):
+        async def beat() -> None:
+            while True:
+                health[slot] = time.time()
+                await asyncio.sleep(health_interval)
+
+        task: asyncio.Task = asyncio.create_task(beat())
+        yield
+        task.cancel()
+
+    async def health_handler(request: web.Request) -> web.Response:
+        return web.json_response(
+            {"pid": os.getpid(), "slot": slot, "generation": generation}
+        )
+
+    app.cleanup_ctx.append(report_health)
+    app.router.add_get(health_endpoint, health_handler)
+
+    if sock is not None:
+        web.run_app(app, sock=sock, print=None, **server_kwargs)
+    else:
+        web.run_app(
+            app, host=host, port=port, reuse_port=True, print=None, **server_kwargs
+        )
+
+
+class WorkerSupervisor:
+    """Serve one aiohttp application from several worker processes sharing a port.
+
+    With `reuse_port=True` (and when the platform supports it), every worker binds its
+    own `SO_REUSEPORT` socket and the kernel spreads the incoming connections across them.
+    Otherwise, the supervisor binds the socket once and the workers inherit it.
+
+    The supervisor restarts the workers that die, or whose event loop stops reporting for
+    `health_timeout` seconds. Each worker also answers on `health_endpoint` with its pid,
+    slot and generation.
+
+    Sending `SIGHUP` to the supervisor reloads the workers gracefully: a new generation is
+    started, and the old workers only get `SIGTERM` (which lets them finish the requests
+    in flight) once the new ones are up. `SIGTERM` and `SIGINT` stop everything.
+
+    Example usage:
+
+    ```python
+    supervisor = WorkerSupervisor(app, host="127.0.0.1", port=8100, workers=4)
+    Process(target=supervisor.run).start()
+    ```
+    """
+
+    def __init__(
+        self,
+        app: web.Application,
+        host: str,
+        port: int,
+        workers: Optional[int] = None,
+        reuse_port: bool = True,
+        health_endpoint: str = "/health",
+        health_interval: float = 1.0,
+        health_timeout: float = 10.0,
+        startup_timeout: float = 30.0,
+        **server_kwargs: Any,
+    ) -> None:
+        self.app: web.Application = app
+        self.host: str = host
+        self.port: int = port
+        self.workers: int = workers or os.cpu_count() or 1
+        self.reuse_port: bool = reuse_port and hasattr(socket, "SO_REUSEPORT")
+        self.health_endpoint: str = health_endpoint
+        self.health_interval: float = health_interval
+        self.health_timeout: float = health_timeout
+        self.startup_timeout: float = startup_timeout
+        self.server_kwargs: Dict[str, Any] = server_kwargs
+
+        self.generation: int = 0
+        self.processes: List[Optional[Process]] = []
+        self.started_at: List[float] = []
+        self.health: Any = None
+        self._sock: Optional[socket.socket] = None
+        self._running: bool = False
+        self._reload_requested: bool = False
+
+    def __str__(self) -> str:
+        return f"{self.__class__.__name__}({self.workers} workers at {self.host}:{self.port}, generation {self.generation})"
+
+    def bind(self) -> Optional[socket.socket]:
+        """Bind the shared listening socket, unless the workers bind their own."""
+        if self.reuse_port:
+            return None
+        sock: socket.socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        sock.bind((self.host, self.port))
+        sock.listen(1024)
+        sock.set_inheritable(True)
+        return sock
+
+    def spawn_worker(self, slot: int) -> Process:
+        process: Process = Process(
+            target=serve_worker,
+            args=(
+                self.app,
+                self.host,
+                self.port,
+                self._sock,
+                slot,
+                self.generation,
+                self.health,
+                self.health_interval,
+                self.health_endpoint,
+                self.server_kwargs,
+            ),
+            daemon=False,
+        )
+        process.start()
+        self.started_at[slot] = time.time()
+        return process
+
+    def start(self) -> None:
+        """Start a generation of workers."""
+        if self._sock is None:
+            self._sock = self.bind()
+        self.generation += 1
+        self.health = mp.Array("d", self.workers, lock=False)
+        self.started_at = [0.0] * self.workers
+        self.processes = [self.spawn_worker(slot) for slot in range(self.workers)]
+        rich_print(
+            f"[green][*] Started {self.workers} workers at {self.host}:{self.port} (generation {self.generation}).[/green]"
+        )
+
+    def is_healthy(self, slot: int) -> bool:
+        process: Optional[Process] = self.processes[slot]
+        if process is None or not process.is_alive():
+            return False
+        last_beat: float = max(self.health[slot], self.started_at[slot])
+        timeout: float = (
+            self.health_timeout if self.health[slot] else self.startup_timeout
+        )
+        return time.time() - last_beat <= timeout
+
+    def worker_status(self) -> List[Dict[str, Any]]:
+        """Per-worker health, as seen by the supervisor."""
+        return [
+            {
+                "slot": slot,
+                "pid": process.pid if process is not None else None,
+                "alive": process is not None and process.is_alive(),
+                "healthy": self.is_healthy(slot),
+                "last_beat": self.health[slot],
+                "generation": self.generation,
+            }
+            for slot, process in enumerate(self.processes)
+        ]
+
+    def check_workers(self) -> None:
+        """Replace the workers that died or stopped reporting."""
+        for slot in range(self.workers):
+            if self.is_healthy(slot):
+                continue
+            process: Optional[Process] = self.processes[slot]
+            rich_print(
+                f"[yellow][!] Worker {slot} at {self.host}:{self.port} is unhealthy. Restarting it...[/yellow]"
+            )
+            if process is not None and process.is_alive():
+                process.kill()
+                process.join(timeout=5)
+            self.health[slot] = 0.0
+            self.processes[slot] = self.spawn_worker(slot)
+
+    def wait_until_up(self) -> bool:
+        deadline: float = time.time() + self.startup_timeout
+        while time.time() < deadline:
+            if all(self.health[slot] > 0 for slot in range(self.workers)):
+                return True
+            time.sleep(0.1)
+        return False
+
+    def terminate(self, processes: List[Optional[Process]], timeout: float = 30.0) -> None:
+        """Stop workers gracefully, killing those still running after `timeout` seconds."""
+        for process in processes:
+            if process is not None and process.is_alive():
+                process.terminate()
+        deadline: float = time.time() + timeout
+        for process in processes:
+            if process is None:
+                continue
+            process.join(timeout=max(deadline - time.time(), 0))
+            if process.is_alive():
+                process.kill()
+                process.join()
+
+    def reload(self) -> None:
+        """Start a new generation of workers, then retire the old one once the new one is up."""
+        old_processes: List[Optional[Process]] = self.processes
+        self.start()
+        if not self.wait_until_up():
+            rich_print(
+                "[yellow][!] New workers did not come up in time. Retiring the old ones anyway.[/yellow]"
+            )
+        self.terminate(old_processes)
+
+    def stop(self) -> None:
+        self._running = False
+        self.terminate(self.processes)
+        if self._sock is not None:
+            self._sock.close()
+            self._sock = None
+
+    def run(self) -> None:
+        """Start the workers and supervise them until `SIGTERM`/`SIGINT`. Blocks."""
+
+        def request_reload(signum, frame) -> None:
+            self._reload_requested = True
+
+        def request_stop(signum, frame) -> None:
+            self._running = False
+
+        signal.signal(signal.SIGHUP, request_reload)
+        signal.signal(signal.SIGTERM, request_stop)
+        signal.signal(signal.SIGINT, request_stop)
+
+        self._running = True
+        self.start()
+        try:
+            while self._running:
+                if self._reload_requested:
+                    self._reload_requested = False
+                    self.reload()
+                self.check_workers()
+                time.sleep(self.health_interval)
+        finally:
+            self.stop()
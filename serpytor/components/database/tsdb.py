@@ -0,0 +1,559 @@
+"""Embedded time-series storage for heartbeat and task metrics.
+
+Every series (a metric of a node) is stored at three resolutions: the raw points, and
+1-minute and 1-hour rollups (mean, min, max and count of the points of each bucket),
+maintained as the points come in.
+
+Each resolution of a series is a directory of append-only segment files. A segment
+holds up to `capacity` rows in columnar layout, memory-mapped:
+
+```
+| magic "SPTS" | version (u16) | columns (u16) | capacity (u32) | count (u32) |
+| timestamps (capacity x f64) | column 1 (capacity x f64) | ... | column n |
+```
+
+so a range query is a binary search over the timestamp column, and a copy of a slice of
+each column. Old segments are deleted wholesale when they fall out of the retention
+period of their resolution.
+
+Points are buffered in memory and written to the segments in batches (`flush`).
+"""
+import array
+import bisect
+import json
+import math
+import mmap
+import os
+import struct
+import time
+from collections import OrderedDict
+from threading import Lock
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+RESOLUTIONS: Dict[str, float] = {"raw": 0.0, "1m": 60.0, "1h": 3600.0}
+ROLLUPS: Tuple[str, ...] = ("1m", "1h")
+RAW_COLUMNS: Tuple[str, ...] = ("value",)
+ROLLUP_COLUMNS: Tuple[str, ...] = ("mean", "min", "max", "count")
+
+DEFAULT_RETENTION: Dict[str, float] = {
+    "raw": 2 * 86400.0,
+    "1m": 30 * 86400.0,
+    "1h": 365 * 86400.0,
+}
+
+# Task statistics taken from the shortest window of a heartbeat by `append_vitals`.
+TASK_FIELDS: Tuple[str, ...] = ("tasks", "latency_p50", "latency_p90", "latency_p99")
+
+_HEADER: struct.Struct = struct.Struct("<4sHHII")
+_MAGIC: bytes = b"SPTS"
+_VERSION: int = 1
+_ITEM: int = 8
+
+
+class Segment:
+    """An append-only, memory-mapped, columnar segment file."""
+
+    def __init__(self, path: str, columns: int = 1, capacity: int = 65536) -> None:
+        self.path: str = path
+        if not os.path.exists(path):
+            with open(path, "wb") as f:
+                f.write(_HEADER.pack(_MAGIC, _VERSION, columns, capacity, 0))
+                f.truncate(_HEADER.size + (columns + 1) * capacity * _ITEM)
+
+        with open(path, "r+b") as f:
+            self._mmap: mmap.mmap = mmap.mmap(f.fileno(), 0)
+        magic, version, self.columns, self.capacity, _ = _HEADER.unpack_from(
+            self._mmap, 0
+        )
+        if magic != _MAGIC or version != _VERSION:
+            self._mmap.close()
+            raise ValueError(f"{path} is not a serpytor time-series segment.")
+
+        self._view: memoryview = memoryview(self._mmap)
+        self._timestamps: memoryview = self._column_view(0)
+        self._columns: List[memoryview] = [
+            self._column_view(idx + 1) for idx in range(self.columns)
+        ]
+
+    def __repr__(self) -> str:
+        return f"Segment({self.path}, {self.count}/{self.capacity} rows)"
+
+    def _column_view(self, idx: int) -> memoryview:
+        start: int = _HEADER.size + idx * self.capacity * _ITEM
+        return self._view[start : start + self.capacity * _ITEM].cast("d")
+
+    @property
+    def count(self) -> int:
+        return struct.unpack_from("<I", self._mmap, _HEADER.size - 4)[0]
+
+    def _set_count(self, count: int) -> None:
+        struct.pack_into("<I", self._mmap, _HEADER.size - 4, count)
+
+    @property
+    def free(self) -> int:
+        return self.capacity - self.count
+
+    @property
+    def first_timestamp(self) -> Optional[float]:
+        return self._timestamps[0] if self.count else None
+
+    @property
+    def last_timestamp(self) -> Optional[float]:
+        count: int = self.count
+        return self._timestamps[count - 1] if count else None
+
+    def append(self, timestamps: array.array, columns: List[array.array]) -> int:
+        """Append as many rows as fit, and return how many were written."""
+        count: int = self.count
+        written: int = min(len(timestamps), self.capacity - count)
+        if written <= 0:
+            return 0
+        self._timestamps[count : count + written] = timestamps[:written]
+        for view, values in zip(self._columns, columns):
+            view[count : count + written] = values[:written]
+        # The rows only become visible once they are complete.
+        self._set_count(count + written)
+        return written
+
+    def replace_last(self, values: Iterable[float]) -> None:
+        last: int = self.count - 1
+        for view, value in zip(self._columns, values):
+            view[last] = value
+
+    def last_row(self) -> List[float]:
+        last: int = self.count - 1
+        return [view[last] for view in self._columns]
+
+    def search(self, start: float, end: float) -> Tuple[int, int]:
+        """Indices of the rows with `start <= timestamp < end`."""
+        timestamps: memoryview = self._timestamps[: self.count]
+        try:
+            return (
+                bisect.bisect_left(timestamps, start),
+                bisect.bisect_left(timestamps, end),
+            )
+        finally:
+            timestamps.release()
+
+    def read(self, lo: int, hi: int) -> Tuple[array.array, List[array.array]]:
+        timestamps: array.array = array.array("d")
+        timestamps.frombytes(self._timestamps[lo:hi].cast("B"))
+        columns: List[array.array] = []
+        for view in self._columns:
+            columns.append(array.array("d"))
+            columns[-1].frombytes(view[lo:hi].cast("B"))
+        return timestamps, columns
+
+    def close(self) -> None:
+        for view in [self._timestamps] + self._columns:
+            view.release()
+        self._view.release()
+        self._mmap.close()
+
+
+class SeriesStore:
+    """The segments of one resolution of one series."""
+
+    def __init__(
+        self, path: str, columns: int, capacity: int, segments: "OrderedDict[str, Segment]"
+    ) -> None:
+        self.path: str = path
+        self.columns: int = columns
+        self.capacity: int = capacity
+        self._open_segments: "OrderedDict[str, Segment]" = segments
+        os.makedirs(path, exist_ok=True)
+        self.files: List[str] = sorted(
+            name for name in os.listdir(path) if name.endswith(".seg")
+        )
+        self.starts: List[float] = [self._start_of(name) for name in self.files]
+
+    @staticmethod
+    def _start_of(name: str) -> float:
+        return int(name[: -len(".seg")]) / 1000.0
+
+    def segment(self, name: str) -> Segment:
+        """Open a segment, keeping at most `max_open_segments` of them mapped."""
+        path: str = os.path.join(self.path, name)
+        segment: Optional[Segment] = self._open_segments.pop(path, None)
+        if segment is None:
+            segment = Segment(path, self.columns, self.capacity)
+        self._open_segments[path] = segment
+        return segment
+
+    def tail(self) -> Optional[Segment]:
+        return self.segment(self.files[-1]) if self.files else None
+
+    def append(self, timestamps: array.array, columns: List[array.array]) -> None:
+        while len(timestamps):
+            segment: Optional[Segment] = self.tail()
+            if segment is None or segment.free == 0:
+                start: int = int(timestamps[0] * 1000)
+                if self.starts:
+                    start = max(start, int(self.starts[-1] * 1000) + 1)
+                name: str = f"{start:016d}.seg"
+                self.files.append(name)
+                self.starts.append(self._start_of(name))
+                segment = self.segment(name)
+            written: int = segment.append(timestamps, columns)
+            timestamps = timestamps[written:]
+            columns = [column[written:] for column in columns]
+
+    def upsert(self, timestamp: float, values: List[float]) -> None:
+        """Overwrite the last row if it has the same timestamp, append a row otherwise."""
+        segment: Optional[Segment] = self.tail()
+        if segment is not None and segment.last_timestamp == timestamp:
+            segment.replace_last(values)
+        else:
+            self.append(
+                array.array("d", [timestamp]),
+                [array.array("d", [value]) for value in values],
+            )
+
+    def last_row(self) -> Optional[Tuple[float, List[float]]]:
+        segment: Optional[Segment] = self.tail()
+        if segment is None or not segment.count:
+            return None
+        return segment.last_timestamp, segment.last_row()
+
+    def _span(self, start: float, end: float) -> Tuple[int, int]:
+        # The segments starting before `end`, from the last one starting before `start`.
+        return (
+            max(bisect.bisect_right(self.starts, start) - 1, 0),
+            bisect.bisect_left(self.starts, end),
+        )
+
+    def count(self, start: float, end: float) -> int:
+        """Number of rows with `start <= timestamp < end`."""
+        first, last = self._span(start, end)
+        if last - first <= 2:
+            return sum(hi - lo for _, lo, hi in self._ranges(start, end))
+        # Only the tail segment isn't full, so only the first and last ones need a look.
+        lo, hi = self.segment(self.files[first]).search(start, end)
+        count: int = hi - lo + (last - first - 2) * self.capacity
+        lo, hi = self.segment(self.files[last - 1]).search(start, end)
+        return count + hi - lo
+
+    def _ranges(self, start: float, end: float) -> List[Tuple[str, int, int]]:
+        first, last = self._span(start, end)
+        ranges: List[Tuple[str, int, int]] = []
+        for name in self.files[first:last]:
+            lo, hi = self.segment(name).search(start, end)
+            if hi > lo:
+                ranges.append((name, lo, hi))
+        return ranges
+
+    def read(self, start: float, end: float) -> Tuple[array.array, List[array.array]]:
+        timestamps: array.array = array.array("d")
+        columns: List[array.array] = [array.array("d") for _ in range(self.columns)]
+        for name, lo, hi in self._ranges(start, end):
+            segment_timestamps, segment_columns = self.segment(name).read(lo, hi)
+            timestamps.extend(segment_timestamps)
+            for column, values in zip(columns, segment_columns):
+                column.extend(values)
+        return timestamps, columns
+
+    def drop_before(self, cutoff: float) -> int:
+        """Delete the segments holding only rows older than `cutoff`."""
+        dropped: int = 0
+        while self.files:
+            if len(self.files) > 1:
+                expired: bool = self.starts[1] <= cutoff
+            else:
+                last: Optional[float] = self.segment(self.files[0]).last_timestamp
+                expired = last is not None and last < cutoff
+            if not expired:
+                break
+            path: str = os.path.join(self.path, self.files.pop(0))
+            self.starts.pop(0)
+            segment: Optional[Segment] = self._open_segments.pop(path, None)
+            if segment is not None:
+                segment.close()
+            os.remove(path)
+            dropped += 1
+        return dropped
+
+
+class TimeSeriesDB:
+    """Embedded time-series database for heartbeat and task metrics.
+
+    Series are identified by a metric name and a node. Points must be appended in
+    timestamp order for each series; older points are ignored. They are kept in memory
+    until `flush_size` of them are buffered (or `flush` is called), then written to the
+    segments along with the rollups. Queries flush first, so they see every point. The
+    segments past their `retention` period (in seconds, per resolution) are deleted at
+    most every `retention_interval` seconds, on flush, or by `enforce_retention`.
+
+    At most `max_open_segments` segments are kept mapped (each holds a file descriptor);
+    queries over many nodes are faster when it covers three segments per node.
+
+    Without an explicit `resolution`, a query returns the finest resolution with at
+    most `max_points` rows in the range, so that a query over days reads hours or
+    minutes, not raw points.
+
+    Example usage:
+
+    ```python
+    db = TimeSeriesDB("tsdb")
+    db.append("cpu", "http://127.0.0.1:8100", 12.5)
+    db.append_vitals("http://127.0.0.1:8101", {"cpu": 10.0, "memory": 50.0})
+    result = db.query("cpu", "http://127.0.0.1:8100", start=time.time() - 86400)
+    print(result["resolution"], result["timestamps"], result["value"])
+    db.close()
+    ```
+    """
+
+    def __init__(
+        self,
+        path: str,
+        segment_capacity: int = 65536,
+        retention: Optional[Dict[str, float]] = None,
+        flush_size: int = 10000,
+        max_open_segments: int = 256,
+        retention_interval: float = 3600.0,
+    ) -> None:
+        self.path: str = path
+        self.segment_capacity: int = segment_capacity
+        self.retention: Dict[str, float] = {**DEFAULT_RETENTION, **(retention or {})}
+        self.flush_size: int = flush_size
+        self.max_open_segments: int = max_open_segments
+        self.retention_interval: float = retention_interval
+        self.lock: Lock = Lock()
+        os.makedirs(path, exist_ok=True)
+
+        self._index_path: str = os.path.join(path, "index.json")
+        self._index: Dict[str, Dict[str, int]] = {}
+        if os.path.exists(self._index_path):
+            with open(self._index_path) as f:
+                self._index = json.load(f)
+        self._open_segments: "OrderedDict[str, Segment]" = OrderedDict()
+        self._stores: Dict[Tuple[int, str], SeriesStore] = {}
+        self._buffers: Dict[int, Tuple[array.array, array.array]] = {}
+        self._buffered: int = 0
+        # Current rollup bucket of every series: [start, sum, min, max, count].
+        self._buckets: Dict[Tuple[int, str], List[float]] = {}
+        self._pending_rollups: Dict[Tuple[int, str], List[List[float]]] = {}
+        self._dirty_buckets: set = set()
+        self._last_timestamps: Dict[int, float] = {}
+        self._retention_checked_at: float = time.monotonic()
+
+    def __str__(self) -> str:
+        return f"{self.__class__.__name__}({self.path}, {len(self.series())} series)"
+
+    def series(self) -> List[Tuple[str, str]]:
+        """Every (metric, node) pair stored."""
+        return [
+            (metric, node) for node, metrics in self._index.items() for metric in metrics
+        ]
+
+    def _series_id(self, metric: str, node: str, create: bool = True) -> Optional[int]:
+        if metric not in self._index.get(node, {}):
+            if not create:
+                return None
+            metrics: Dict[str, int] = self._index.setdefault(node, {})
+            metrics[metric] = sum(len(m) for m in self._index.values())
+            with open(self._index_path + ".tmp", "w") as f:
+                json.dump(self._index, f)
+            os.replace(self._index_path + ".tmp", self._index_path)
+        return self._index[node][metric]
+
+    def _store(self, series_id: int, resolution: str) -> SeriesStore:
+        key: Tuple[int, str] = (series_id, resolution)
+        if key not in self._stores:
+            self._stores[key] = SeriesStore(
+                os.path.join(self.path, resolution, str(series_id)),
+                len(RAW_COLUMNS if resolution == "raw" else ROLLUP_COLUMNS),
+                self.segment_capacity,
+                self._open_segments,
+            )
+        return self._stores[key]
+
+    def _last_timestamp(self, series_id: int) -> float:
+        if series_id not in self._last_timestamps:
+            last: Optional[Tuple[float, List[float]]] = self._store(
+                series_id, "raw"
+            ).last_row()
+            self._last_timestamps[series_id] = last[0] if last else -math.inf
+        return self._last_timestamps[series_id]
+
+    def _load_bucket(self, series_id: int, resolution: str, start: float) -> List[float]:
+        """Resume the rollup bucket stored before a restart, if the point falls into it."""
+        last: Optional[Tuple[float, List[float]]] = self._store(
+            series_id, resolution
+        ).last_row()
+        if last is not None and last[0] == start:
+            mean, low, high, count = last[1]
+            return [start, mean * count, low, high, count]
+        return [start, 0.0, math.inf, -math.inf, 0]
+
+    def _roll_up(self, series_id: int, timestamp: float, value: float) -> None:
+        for resolution in ROLLUPS:
+            width: float = RESOLUTIONS[resolution]
+            start: float = math.floor(timestamp / width) * width
+            key: Tuple[int, str] = (series_id, resolution)
+            bucket: Optional[List[float]] = self._buckets.get(key)
+            if bucket is None or bucket[0] != start:
+                if bucket is not None:
+                    self._pending_rollups.setdefault(key, []).append(bucket)
+                bucket = self._load_bucket(series_id, resolution, start)
+                self._buckets[key] = bucket
+            self._dirty_buckets.add(key)
+            bucket[1] += value
+            bucket[2] = min(bucket[2], value)
+            bucket[3] = max(bucket[3], value)
+            bucket[4] += 1
+
+    def append(
+        self, metric: str, node: str, value: float, timestamp: Optional[float] = None
+    ) -> bool:
+        """Append a point. Returns False if it is older than the last point of the series."""
+        timestamp = timestamp if timestamp is not None else time.time()
+        with self.lock:
+            series_id: int = self._series_id(metric, node)
+            if timestamp < self._last_timestamp(series_id):
+                return False
+            self._last_timestamps[series_id] = timestamp
+
+            timestamps, values = self._buffers.setdefault(
+                series_id, (array.array("d"), array.array("d"))
+            )
+            timestamps.append(timestamp)
+            values.append(value)
+            self._roll_up(series_id, timestamp, value)
+            self._buffered += 1
+            if self._buffered >= self.flush_size:
+                self._flush()
+        return True
+
+    def append_vitals(
+        self, node: str, vitals: Dict[str, Any], timestamp: Optional[float] = None
+    ) -> None:
+        """Append the numeric fields of a heartbeat, and the task statistics of its shortest window."""
+        timestamp = timestamp if timestamp is not None else time.time()
+        fields: Dict[str, Any] = dict(vitals)
+        windows: Dict[str, Dict[str, Any]] = vitals.get("windows") or {}
+        if windows:
+            shortest: Dict[str, Any] = windows[min(windows, key=_window_seconds)]
+            fields.update({field: shortest.get(field) for field in TASK_FIELDS})
+        for metric, value in fields.items():
+            if isinstance(value, (int, float)) and not isinstance(value, bool):
+                self.append(metric, node, float(value), timestamp)
+
+    def _flush(self) -> None:
+        for series_id, (timestamps, values) in self._buffers.items():
+            if timestamps:
+                self._store(series_id, "raw").append(timestamps, [values])
+        self._buffers.clear()
+        self._buffered = 0
+
+        # The finished buckets, then the current ones, which get overwritten until they end.
+        for key in self._dirty_buckets:
+            store: SeriesStore = self._store(*key)
+            for start, total, low, high, count in self._pending_rollups.get(key, []) + [
+                self._buckets[key]
+            ]:
+                store.upsert(start, [total / count, low, high, count])
+        self._pending_rollups.clear()
+        self._dirty_buckets.clear()
+
+        if time.monotonic() - self._retention_checked_at > self.retention_interval:
+            self._enforce_retention(time.time())
+
+        while len(self._open_segments) > self.max_open_segments:
+            _, segment = self._open_segments.popitem(last=False)
+            segment.close()
+
+    def flush(self) -> None:
+        with self.lock:
+            self._flush()
+
+    def query(
+        self,
+        metric: str,
+        node: str,
+        start: float = -math.inf,
+        end: float = math.inf,
+        resolution: Optional[str] = None,
+        max_points: int = 2000,
+    ) -> Dict[str, Any]:
+        """Rows of a series with `start <= timestamp < end`, as columns.
+
+        Raw results have a `value` column; rollups have `mean`, `min`, `max` and `count`
+        columns, and `value` as an alias of `mean`.
+        """
+        with self.lock:
+            self._flush()
+            series_id: Optional[int] = self._series_id(metric, node, create=False)
+            if resolution is None:
+                resolution = "1h"
+                for candidate in RESOLUTIONS:
+                    if (
+                        series_id is not None
+                        and self._store(series_id, candidate).count(start, end)
+                        <= max_points
+                    ):
+                        resolution = candidate
+                        break
+
+            names: Tuple[str, ...] = RAW_COLUMNS if resolution == "raw" else ROLLUP_COLUMNS
+            if series_id is None:
+                timestamps: array.array = array.array("d")
+                columns: List[array.array] = [array.array("d") for _ in names]
+            else:
+                timestamps, columns = self._store(series_id, resolution).read(start, end)
+
+        result: Dict[str, Any] = {"resolution": resolution, "timestamps": timestamps}
+        result.update(zip(names, columns))
+        result.setdefault("value", result.get("mean"))
+        return result
+
+    def query_nodes(
+        self, metric: str, nodes: Iterable[str], *args: Any, **kwargs: Any
+    ) -> Dict[str, Dict[str, Any]]:
+        """Run the same query over several nodes."""
+        return {node: self.query(metric, node, *args, **kwargs) for node in nodes}
+
+    def latest(self, metric: str, node: str) -> Optional[Tuple[float, float]]:
+        """The last raw point of a series, as a (timestamp, value) pair."""
+        with self.lock:
+            series_id: Optional[int] = self._series_id(metric, node, create=False)
+            if series_id is None:
+                return None
+            buffered: Optional[Tuple[array.array, array.array]] = self._buffers.get(
+                series_id
+            )
+            if buffered and buffered[0]:
+                return buffered[0][-1], buffered[1][-1]
+            last: Optional[Tuple[float, List[float]]] = self._store(
+                series_id, "raw"
+            ).last_row()
+            return (last[0], last[1][0]) if last else None
+
+    def enforce_retention(self, now: Optional[float] = None) -> int:
+        """Delete the segments past the retention period of their resolution."""
+        with self.lock:
+            self._flush()
+            return self._enforce_retention(now if now is not None else time.time())
+
+    def _enforce_retention(self, now: float) -> int:
+        self._retention_checked_at = time.monotonic()
+        dropped: int = 0
+        for metrics in self._index.values():
+            for series_id in metrics.values():
+                for resolution in RESOLUTIONS:
+                    dropped += self._store(series_id, resolution).drop_before(
+                        now - self.retention[resolution]
+                    )
+        return dropped
+
+    def close(self) -> None:
+        with self.lock:
+            self._flush()
+            for segment in self._open_segments.values():
+                segment.close()
+            self._open_segments.clear()
+            self._stores.clear()
+
+
+def _window_seconds(name: str) -> float:
+    units: Dict[str, float] = {"s": 1.0, "m": 60.0, "h": 3600.0}
+    return float(name[:-1]) * units.get(name[-1], 1.0)
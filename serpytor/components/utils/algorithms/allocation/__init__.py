@@ -1,10 +1,29 @@
 """
 """
+from serpytor.components.utils.algorithms.allocation.bin_packing_allocation import \
+    BinPackingAllocation
+from serpytor.components.utils.algorithms.allocation.deadline_allocation import \
+    DeadlineAllocation
+from serpytor.components.utils.algorithms.allocation.exceptions import \
+    AdmissionError
 from serpytor.components.utils.algorithms.allocation.fair_resource_allocation import \
     FairResourceAllocation
 from serpytor.components.utils.algorithms.allocation.fcfs_allocation import \
     FCFSAllocation
+from serpytor.components.utils.algorithms.allocation.priority_allocation import \
+    PriorityAllocation
 from serpytor.components.utils.algorithms.allocation.round_robin_allocation import \
     RoundRobinAllocation
+from serpytor.components.utils.algorithms.allocation.work_stealing_allocation import \
+    WorkStealingAllocation
 
-__all__ = ["FairResourceAllocation", "FCFSAllocation", "RoundRobinAllocation"]
+__all__ = [
+    "AdmissionError",
+    "BinPackingAllocation",
+    "DeadlineAllocation",
+    "FairResourceAllocation",
+    "FCFSAllocation",
+    "PriorityAllocation",
+    "RoundRobinAllocation",
+    "WorkStealingAllocation",
+]
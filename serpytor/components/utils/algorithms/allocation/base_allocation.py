@@ -1,10 +1,39 @@
-import multiprocessing as mp
-from queue import Queue
-from typing import Any, Dict, Iterable, List, Optional, Union
+import itertools
+import threading
+from queue import Full, Queue
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Union
+
+# Iterables that are put as one item, not item by item.
+SCALAR_TYPES = (str, bytes, bytearray, memoryview)
+
+
+def put_many(target: Queue, items: List[Any]) -> None:
+    """Put `items` in `target` at once, taking its mutex a single time.
+
+    Raises `queue.Full` without putting anything if they don't all fit.
+    """
+    if not items:
+        return
+    with target.not_full:
+        if 0 < target.maxsize < target._qsize() + len(items):
+            raise Full()
+        target.queue.extend(items)
+        target.unfinished_tasks += len(items)
+        target.not_empty.notify(len(items))
 
 
 class BaseAllocation:
-    """Base class for implementing queuing methods."""
+    """Base class for implementing queuing methods.
+
+    The queues of `queue_silo` are thread-safe on their own, so a put only takes the
+    mutex of the queue it goes to: producers putting in different queues never wait
+    for each other, and an iterable of items is put in one go. The `lock` is only taken
+    to change the silo itself, in `add_queue`.
+
+    Without an `index`, `put` shards the items over the silo by producer thread, so that
+    many producers don't all fight over the same queue: each thread gets the next slot,
+    round-robin, the first time it puts.
+    """
 
     def __init__(
         self,
@@ -14,35 +43,44 @@ class BaseAllocation:
         **kwargs: Dict[str, Any],
     ) -> None:
         self.max_size = max_size
-        self.queue_silo: List = [Queue(maxsize=max_size) for _ in range(num_queues)]
-        self.lock = mp.Lock()
+        self.queue_silo: List[Queue] = [Queue(maxsize=max_size) for _ in range(num_queues)]
+        self.lock = threading.Lock()
         self.sortable_fields = kwargs.get("sortable_fields")
+        self._slots: Iterator[int] = itertools.count()
+        self._thread_slot: threading.local = threading.local()
 
     def __str__(self) -> str:
-        return f"{self.__class__.__name__}({len(self.queue)} items)"
+        return f"{self.__class__.__name__}({len(self)} items)"
+
+    def __len__(self) -> int:
+        return sum(silo.qsize() for silo in self.queue_silo)
+
+    def add_queue(self, max_size=0) -> int:
+        """Add a queue to the silo, and return its index."""
+        with self.lock:
+            self.queue_silo.append(Queue(maxsize=max_size))
+            return len(self.queue_silo) - 1
 
-    def add_queue(self, max_size=0) -> None:
-        self.lock.acquire()
-        new_queue = Queue(maxsize=max_size)
-        self.queue_silo.append(new_queue)
-        self.lock.release()
+    def shard(self) -> int:
+        """Index of the queue the current thread puts in when no index is given."""
+        slot: Optional[int] = getattr(self._thread_slot, "slot", None)
+        if slot is None:
+            slot = self._thread_slot.slot = next(self._slots)
+        return slot % len(self.queue_silo)
 
     def put(
         self,
         item: Union[Iterable[Any], int, str, Any],
-        # pop: Optional[bool] = True,
-        index: Optional[int],
+        index: Optional[int] = None,
         *args: Optional[List[Any]],
         **kwargs: Optional[Dict[str, Any]],
     ) -> None:
-        """Put an item in the queue."""
-        self.lock.acquire()
-        if hasattr(item, "__iter__"):
-            for i in item:
-                self.queue_silo[index].put_nowait(i)
+        """Put an item, or every item of an iterable other than a string, in a queue."""
+        target: Queue = self.queue_silo[self.shard() if index is None else index]
+        if hasattr(item, "__iter__") and not isinstance(item, SCALAR_TYPES):
+            put_many(target, list(item))
         else:
-            self.queue_silo[index].put_nowait(item)
-        self.lock.release()
+            target.put_nowait(item)
 
     def queue(
         self, *args: Optional[List[Any]], **kwargs: Optional[Dict[str, Any]]
@@ -59,10 +97,10 @@ class BaseAllocation:
         lower_limit: Optional[Union[int, None]] = None,
         upper_limit: Optional[int] = 5,
     ) -> Iterable[Any]:
-        """Peek at the items in the queue. Put limit = -1 to peek at all items in the queue."""
-        k = lower_limit if (lower_limit > 0 and lower_limit != None) else 0
-        for item in self.queue_silo[queue_index]:
-            yield item
-            k += 1
-            if k != -1 and k == upper_limit:
-                break
+        """Peek at the items in the queue. Put upper_limit = -1 to peek at all items in the queue."""
+        target: Queue = self.queue_silo[queue_index]
+        with target.mutex:
+            items: List[Any] = list(target.queue)
+        start: int = lower_limit if lower_limit is not None and lower_limit > 0 else 0
+        end: Optional[int] = None if upper_limit is None or upper_limit == -1 else upper_limit
+        yield from items[start:end]
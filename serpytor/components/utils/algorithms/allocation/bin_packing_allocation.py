@@ -0,0 +1,198 @@
+import bisect
+import heapq
+import itertools
+import time
+from threading import Lock
+from typing import (Any, Callable, Dict, Hashable, Iterable, List, Optional,
+                    Set, Tuple)
+
+from serpytor.components.utils.algorithms.allocation.base_allocation import \
+    BaseAllocation
+from serpytor.components.utils.algorithms.allocation.fair_resource_allocation import (
+    RESOURCE_TYPES, Demand)
+
+Placement = Tuple[Any, Hashable, Demand]
+
+
+class BinPackingAllocation(BaseAllocation):
+    """Place batches of tasks with CPU and memory requirements on the resources.
+
+    `put` a `{resource: vitals}` report (as built by `Gateway.get_available_resources`)
+    to set what is free on each resource, and `put` tasks with their `demand`, in percent
+    of a resource like for `FairResourceAllocation`, e.g. `{"cpu": 50, "memory": 10}`.
+
+    `place` packs the pending tasks with best-fit decreasing: the largest tasks (on their
+    largest requirement) first, each on the resource it fits best, i.e. the one with the
+    least room left once it is placed. Resources are never oversubscribed: tasks that fit
+    nowhere stay pending until `release` gives back what a finished task held, or new
+    vitals come in. `reserve` keeps a share of every resource free.
+
+    Vitals lag behind the placements: what was placed on a resource less than
+    `settle_time` seconds (on the `clock`) before its vitals come in, and isn't released
+    yet, is assumed to be missing from them, and still counted as taken.
+
+    Packing tight leaves the other resources empty, for the large tasks to come, and lets
+    fewer resources do the same work.
+
+    Example usage:
+
+    ```python
+    allocation = BinPackingAllocation()
+    allocation.put(await gateway.get_available_resources())
+    allocation.put("job-1", demand={"cpu": 60, "memory": 10})
+    allocation.put("job-2", demand={"cpu": 30, "memory": 70})
+    for task, resource, demand in allocation.place():
+        ...
+        allocation.release(resource, demand)
+    ```
+    """
+
+    def __init__(
+        self,
+        reserve: Optional[float] = 0.0,
+        default_demand: Optional[Demand] = None,
+        settle_time: Optional[float] = 5.0,
+        clock: Optional[Callable[[], float]] = time.monotonic,
+        *args: List[Any],
+        **kwargs: Dict[str, Any],
+    ) -> None:
+        super().__init__(0, *args, **kwargs)
+        self.reserve: float = reserve
+        self.default_demand: Demand = default_demand or {"cpu": 1.0, "memory": 1.0}
+        self.settle_time: float = settle_time
+        self.clock: Callable[[], float] = clock
+        self.free: Dict[Hashable, Demand] = {}
+        # Resource -> (time, demand) of the placements not released yet, oldest first, for
+        # as long as the vitals may not account for them.
+        self.recent: Dict[Hashable, List[Tuple[float, Demand]]] = {}
+        # (-size, order, task, demand) of the tasks that didn't fit, largest first, and of
+        # the ones not tried yet.
+        self.pending: List[Tuple[float, int, Any, Demand]] = []
+        self.arrived: List[Tuple[float, int, Any, Demand]] = []
+        # The resources with more room than when the pending tasks were tried.
+        self.dirty: Set[Hashable] = set()
+        self.placements: List[Placement] = []
+        self.order = itertools.count()
+        self.selection_lock: Lock = Lock()
+
+    def __str__(self) -> str:
+        return f"{self.__class__.__name__}({len(self.free)} resources, {len(self.pending)} pending)"
+
+    def __len__(self) -> int:
+        return len(self.pending) + len(self.arrived)
+
+    def set_vitals(self, report: Dict[Hashable, Dict[str, Any]]) -> None:
+        """Set what is free on the resources from their vitals, which count the tasks they
+        run, except the ones placed in the last `settle_time` seconds."""
+        with self.selection_lock:
+            settled: float = self.clock() - self.settle_time
+            for resource, vitals in report.items():
+                recent: List[Tuple[float, Demand]] = [
+                    placed
+                    for placed in self.recent.get(resource, [])
+                    if placed[0] > settled
+                ]
+                self.recent[resource] = recent
+                self.free[resource] = {
+                    resource_type: 100.0
+                    - self.reserve
+                    - float((vitals or {}).get(resource_type) or 0.0)
+                    - sum(demand.get(resource_type, 0.0) for _, demand in recent)
+                    for resource_type in RESOURCE_TYPES
+                }
+                self.dirty.add(resource)
+
+    def put(
+        self,
+        item: Any,
+        index: Optional[int] = None,
+        *args: Optional[List[Any]],
+        **kwargs: Optional[Dict[str, Any]],
+    ) -> None:
+        """Queue a task with its `demand`, or set the vitals if `item` is a report."""
+        if kwargs.get("demand") is None and isinstance(item, dict):
+            self.set_vitals(item)
+            return
+        demand: Demand = kwargs.get("demand") or self.default_demand
+        size: float = max(demand.get(resource_type, 0.0) for resource_type in RESOURCE_TYPES)
+        with self.selection_lock:
+            self.arrived.append((-size, next(self.order), item, demand))
+
+    def best_fit(self, demand: Demand, resources: Iterable[Hashable]) -> Optional[Hashable]:
+        """The resource with the least room left after `demand` is placed on it, if any fits."""
+        best: Optional[Hashable] = None
+        best_room: float = 0.0
+        for resource in resources:
+            free: Demand = self.free[resource]
+            room: float = 0.0
+            for resource_type in RESOURCE_TYPES:
+                left: float = free[resource_type] - demand.get(resource_type, 0.0)
+                if left < 0:
+                    break
+                room += left
+            else:
+                if best is None or room < best_room:
+                    best, best_room = resource, room
+        return best
+
+    def place(self) -> List[Placement]:
+        """Pack the pending tasks, and return the `(task, resource, demand)` placements.
+
+        Resources only get more room from vitals or `release`, so the tasks that didn't fit
+        before are only tried on those, and the new ones on every resource.
+        """
+        with self.selection_lock:
+            now: float = self.clock()
+            placements: List[Placement] = []
+            arrived: Set[int] = {pending[1] for pending in self.arrived}
+            dirty: List[Hashable] = [resource for resource in self.dirty if resource in self.free]
+            # The tasks larger than any room on those don't need to be tried at all.
+            room: float = max(
+                (
+                    self.free[resource][resource_type]
+                    for resource in dirty
+                    for resource_type in RESOURCE_TYPES
+                ),
+                default=-1.0,
+            )
+            start: int = bisect.bisect_left(self.pending, (-room,))
+            left: List[Tuple[float, int, Any, Demand]] = self.pending[:start]
+            self.arrived.sort()
+            for pending in heapq.merge(self.pending[start:], self.arrived):
+                demand: Demand = pending[3]
+                resource: Optional[Hashable] = self.best_fit(
+                    demand, self.free if pending[1] in arrived else dirty
+                )
+                if resource is None:
+                    left.append(pending)
+                    continue
+                for resource_type in RESOURCE_TYPES:
+                    self.free[resource][resource_type] -= demand.get(resource_type, 0.0)
+                self.recent.setdefault(resource, []).append((now, demand))
+                placements.append((pending[2], resource, demand))
+            left.sort()
+            self.pending = left
+            self.arrived = []
+            self.dirty = set()
+            return placements
+
+    def queue(
+        self, *args: Optional[List[Any]], **kwargs: Optional[Dict[str, Any]]
+    ) -> Optional[Placement]:
+        """The next `(task, resource, demand)` placement, packing a new batch if needed."""
+        if not self.placements:
+            self.placements = self.place()[::-1]
+        return self.placements.pop() if self.placements else None
+
+    def release(self, resource: Hashable, demand: Demand) -> None:
+        """Give back the resources held by a finished task."""
+        with self.selection_lock:
+            recent: List[Tuple[float, Demand]] = self.recent.get(resource, [])
+            for position, (_, placed) in enumerate(recent):
+                if placed == demand:
+                    del recent[position]
+                    break
+            if resource in self.free:
+                for resource_type in RESOURCE_TYPES:
+                    self.free[resource][resource_type] += demand.get(resource_type, 0.0)
+                self.dirty.add(resource)
@@ -0,0 +1,252 @@
+import bisect
+import hashlib
+import heapq
+import itertools
+import math
+import time
+from threading import Lock
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from serpytor.components.utils.algorithms.allocation.base_allocation import \
+    BaseAllocation
+from serpytor.components.utils.algorithms.allocation.exceptions import \
+    AdmissionError
+from serpytor.components.utils.structs.heaps import IndexedHeap
+
+POLICIES: Tuple[str, ...] = ("edf", "sept")
+
+
+def task_digest(task: Any) -> str:
+    """What identifies the runs of a task, to learn how long it takes.
+
+    Encoded tasks are hashed, `(callable, args, kwargs)` tasks and callables are known by
+    the qualified name of the callable (their runtime rarely depends on the arguments
+    enough to tell them apart), anything else by its `repr`.
+    """
+    if isinstance(task, (bytes, bytearray, memoryview)):
+        return hashlib.blake2b(task, digest_size=16).hexdigest()
+    if isinstance(task, (tuple, list)) and task and callable(task[0]):
+        task = task[0]
+    if callable(task):
+        return f"{getattr(task, '__module__', '')}.{getattr(task, '__qualname__', repr(task))}"
+    return hashlib.blake2b(repr(task).encode(), digest_size=16).hexdigest()
+
+
+class RuntimeEstimator:
+    """Expected runtime of tasks, per digest: a moving average of their past runtimes."""
+
+    def __init__(self, alpha: float = 0.2, default_runtime: float = 0.1) -> None:
+        self.alpha: float = alpha
+        self.default_runtime: float = default_runtime
+        self.estimates: Dict[str, float] = {}
+        self.samples: Dict[str, int] = {}
+
+    def estimate(self, digest: str) -> float:
+        return self.estimates.get(digest, self.default_runtime)
+
+    def record(self, digest: str, runtime: float) -> None:
+        if digest in self.estimates:
+            self.estimates[digest] += self.alpha * (runtime - self.estimates[digest])
+        else:
+            self.estimates[digest] = runtime
+        self.samples[digest] = self.samples.get(digest, 0) + 1
+
+
+class DeadlineAllocation(BaseAllocation):
+    """Schedule tasks by deadline or by expected runtime.
+
+    `put` queues one task, with an optional `deadline` (on the `clock`, `time.monotonic`
+    by default) or a `timeout` from now, and returns its ticket. The runtime of the task
+    is estimated from the past runs of the tasks with the same digest (see `task_digest`),
+    which `complete` records when the task is done.
+
+    `queue` returns the next `(ticket, task)` to run: with the `edf` policy, the one with
+    the earliest deadline (tasks without one come last, shortest first), and with the
+    `sept` policy, the one expected to be the shortest (earliest deadline first among
+    equals). EDF meets every deadline that can be met; SEPT has the lowest mean latency.
+
+    With `admission` set, a task with a deadline is only queued if, served in the order of
+    the policy by the first of the `workers` to be done with what it runs, it and the
+    tasks already admitted would still finish in time. Otherwise `put` raises `AdmissionError`, so that
+    the caller can send it elsewhere, instead of a latency-critical job missing its
+    deadline late. The estimates are multiplied by `headroom` there, to leave room for
+    their error.
+
+    Example usage:
+
+    ```python
+    allocation = DeadlineAllocation(policy="edf", workers=4, admission=True)
+    ticket = allocation.put((render, [frame], {}), timeout=0.5)
+    ticket, task = allocation.queue()
+    ...
+    allocation.complete(ticket)
+    ```
+
+    A running task that will never complete (e.g. lost with its resource) is `abandon`ed.
+    """
+
+    def __init__(
+        self,
+        policy: Optional[str] = "edf",
+        workers: Optional[int] = 1,
+        admission: Optional[bool] = False,
+        headroom: Optional[float] = 1.0,
+        estimator: Optional[RuntimeEstimator] = None,
+        clock: Optional[Callable[[], float]] = time.monotonic,
+        *args: List[Any],
+        **kwargs: Dict[str, Any],
+    ) -> None:
+        super().__init__(0, *args, **kwargs)
+        if policy not in POLICIES:
+            raise ValueError(f"Unknown policy {policy}, use one of {', '.join(POLICIES)}.")
+        self.policy: str = policy
+        self.workers: int = workers
+        self.admission: bool = admission
+        self.headroom: float = headroom
+        self.estimator: RuntimeEstimator = estimator or RuntimeEstimator()
+        self.clock: Callable[[], float] = clock
+        # ticket: (task, digest, deadline, estimate)
+        self.tasks: Dict[int, Tuple[Any, str, float, float]] = {}
+        # ticket: (digest, start time, estimate)
+        self.running: Dict[int, Tuple[str, float, float]] = {}
+        self.heap: IndexedHeap = IndexedHeap()
+        # (deadline, ticket, estimate) of the queued tasks with a deadline, for admission.
+        self.deadlines: List[Tuple[float, int, float]] = []
+        self.tickets = itertools.count()
+        self.selection_lock: Lock = Lock()
+
+    def __str__(self) -> str:
+        return f"{self.__class__.__name__}({self.policy}, {len(self.tasks)} queued, {len(self.running)} running)"
+
+    def __len__(self) -> int:
+        return len(self.tasks)
+
+    def priority(self, deadline: float, estimate: float) -> Tuple[float, float]:
+        return (deadline, estimate) if self.policy == "edf" else (estimate, deadline)
+
+    def free_at(self, now: float) -> List[float]:
+        """When each worker is expected to be done with what it runs, as a heap."""
+        free: List[float] = [
+            now + max(estimate * self.headroom - (now - started), 0.0)
+            for _, started, estimate in self.running.values()
+        ]
+        free += [now] * (self.workers - len(free))
+        heapq.heapify(free)
+        return free
+
+    def admit(self, deadline: float, estimate: float, now: float) -> None:
+        """Raise `AdmissionError` if a task can't be added without missing a deadline.
+
+        The queued tasks are given in the order of the policy to the first worker to be
+        free, the new one among them. With EDF, only the ones with a deadline count: the
+        others come after them. With SEPT, every shorter task goes first.
+        """
+        free: List[float] = self.free_at(now)
+        queued: List[Tuple[float, float]]
+        position: int
+        if self.policy == "edf":
+            queued = [
+                (queued_deadline, queued_estimate)
+                for queued_deadline, _, queued_estimate in self.deadlines
+            ]
+            position = bisect.bisect_right(self.deadlines, (deadline, math.inf))
+        else:
+            queued = sorted(
+                (
+                    (queued_deadline, queued_estimate)
+                    for _, _, queued_deadline, queued_estimate in self.tasks.values()
+                ),
+                key=lambda queued_task: self.priority(*queued_task),
+            )
+            position = bisect.bisect_right(
+                [self.priority(*queued_task) for queued_task in queued],
+                self.priority(deadline, estimate),
+            )
+        for _, queued_estimate in queued[:position]:
+            heapq.heappush(free, heapq.heappop(free) + queued_estimate * self.headroom)
+        finish: float = heapq.heappop(free) + estimate * self.headroom
+        if finish > deadline:
+            raise AdmissionError(deadline, finish)
+        heapq.heappush(free, finish)
+        # The tasks served after it are delayed.
+        for queued_deadline, queued_estimate in queued[position:]:
+            queued_finish: float = heapq.heappop(free) + queued_estimate * self.headroom
+            if queued_finish > queued_deadline:
+                raise AdmissionError(deadline, finish)
+            heapq.heappush(free, queued_finish)
+
+    def put(
+        self,
+        item: Any,
+        index: Optional[int] = None,
+        *args: Optional[List[Any]],
+        **kwargs: Optional[Dict[str, Any]],
+    ) -> int:
+        """Queue a task, with its `deadline` or `timeout` and `digest` if any, and return its ticket."""
+        digest: str = kwargs.get("digest") or task_digest(item)
+        estimate: float = self.estimator.estimate(digest)
+        with self.selection_lock:
+            now: float = self.clock()
+            deadline: float = math.inf
+            if kwargs.get("deadline") is not None:
+                deadline = kwargs["deadline"]
+            elif kwargs.get("timeout") is not None:
+                deadline = now + kwargs["timeout"]
+            if self.admission and deadline != math.inf:
+                self.admit(deadline, estimate, now)
+            ticket: int = next(self.tickets)
+            self.tasks[ticket] = (item, digest, deadline, estimate)
+            self.heap.push(ticket, self.priority(deadline, estimate))
+            if deadline != math.inf:
+                bisect.insort(self.deadlines, (deadline, ticket, estimate))
+            return ticket
+
+    def _forget(self, ticket: int) -> Tuple[Any, str, float, float]:
+        item, digest, deadline, estimate = self.tasks.pop(ticket)
+        if deadline != math.inf:
+            del self.deadlines[bisect.bisect_left(self.deadlines, (deadline, ticket, estimate))]
+        return item, digest, deadline, estimate
+
+    def queue(
+        self, *args: Optional[List[Any]], **kwargs: Optional[Dict[str, Any]]
+    ) -> Optional[Tuple[int, Any]]:
+        """Take the next task to run, as a `(ticket, task)` tuple, or None if there is none."""
+        with self.selection_lock:
+            if not len(self.heap):
+                return None
+            ticket, _ = self.heap.pop()
+            item, digest, _, estimate = self._forget(ticket)
+            self.running[ticket] = (digest, self.clock(), estimate)
+            return ticket, item
+
+    def remove(self, ticket: int) -> Any:
+        """Take a queued task out, and return it."""
+        with self.selection_lock:
+            self.heap.remove(ticket)
+            return self._forget(ticket)[0]
+
+    def abandon(self, ticket: int) -> None:
+        """Forget a running task that won't complete, without learning from it."""
+        with self.selection_lock:
+            self.running.pop(ticket, None)
+
+    def complete(self, ticket: int, runtime: Optional[float] = None) -> None:
+        """Mark a task as done, learning from its `runtime` (the time since `queue` by default)."""
+        with self.selection_lock:
+            digest, started, _ = self.running.pop(ticket)
+            self.estimator.record(
+                digest, runtime if runtime is not None else self.clock() - started
+            )
+
+
+if __name__ == "__main__":
+    allocation = DeadlineAllocation(policy="edf", admission=True)
+    allocation.estimator.record("batch", 1.0)
+    allocation.estimator.record("interactive", 0.01)
+    allocation.put("report", digest="batch")
+    allocation.put("search", digest="interactive", timeout=0.05)
+    print(allocation.queue())
+    try:
+        allocation.put("report", digest="batch", timeout=0.5)
+    except Exception as error:
+        print(error)
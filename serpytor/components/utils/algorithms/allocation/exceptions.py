@@ -0,0 +1,11 @@
+class AdmissionError(Exception):
+    def __init__(self, deadline: float = 0.0, finish: float = 0.0) -> None:
+        super().__init__(deadline, finish)
+        self.deadline: float = deadline
+        self.finish: float = finish
+
+    def __str__(self) -> str:
+        return (
+            f"The task can't meet its deadline: expected to finish at {self.finish:.3f}, "
+            f"due at {self.deadline:.3f}."
+        )
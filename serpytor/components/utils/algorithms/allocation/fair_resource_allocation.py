@@ -1,11 +1,169 @@
-from typing import Any, Dict, List
+from threading import Lock
+from typing import Any, Dict, Hashable, List, Optional, Tuple
 
+from serpytor.components.utils.algorithms.allocation.base_allocation import \
+    BaseAllocation
+from serpytor.components.utils.structs.heaps import IndexedHeap
 
-class FairResourceAllocation:
-    """ """
+Demand = Dict[str, float]
 
-    def __init__(self) -> None:
-        ...
+RESOURCE_TYPES: Tuple[str, ...] = ("cpu", "memory")
 
-    def queue(self, *args: List[Any], **kwargs: Dict[str, Any]) -> Any:
-        ...
+
+class FairResourceAllocation(BaseAllocation):
+    """Dominant Resource Fairness (Ghodsi et al.) across tenants.
+
+    Each tenant has its own queue in the silo (see `add_tenant`), holding tasks with a
+    demand of CPU and memory, in percent of one resource (e.g. `{"cpu": 50, "memory": 10}`
+    is half a core's worth of a resource and a tenth of its memory). The capacity of the
+    cluster is what the heartbeats report as free: `put` a `{resource: vitals}` report to
+    set it, e.g. 4 resources at 25% CPU have 300 points of CPU available.
+
+    The share of a tenant for a type of resource is what its running tasks use over the
+    capacity, and its dominant share is the largest of them, divided by its `weight`.
+    `queue` always serves the tenant with the lowest dominant share among the ones whose
+    next task fits in what is left, so a tenant asking for a lot of memory can't starve
+    the others out of CPU, and vice versa. Call `release` when a task finishes.
+
+    The tenants are kept in an `IndexedHeap` on their dominant share, so picking one is
+    O(log n) when the next task of the first tenant fits.
+
+    Example usage:
+
+    ```python
+    allocation = FairResourceAllocation()
+    allocation.put({"http://127.0.0.1:8100/exec": {"cpu": 10.0, "memory": 20.0}})
+    allocation.add_tenant("analytics")
+    allocation.put("job-1", index="analytics", demand={"cpu": 20, "memory": 5})
+    tenant, task, demand = allocation.queue()
+    ...
+    allocation.release(tenant, demand)
+    ```
+    """
+
+    def __init__(
+        self,
+        default_demand: Optional[Demand] = None,
+        *args: List[Any],
+        **kwargs: Dict[str, Any],
+    ) -> None:
+        super().__init__(0, *args, **kwargs)
+        self.default_demand: Demand = default_demand or {"cpu": 1.0, "memory": 1.0}
+        self.capacity: Demand = {resource: 0.0 for resource in RESOURCE_TYPES}
+        self.used: Demand = {resource: 0.0 for resource in RESOURCE_TYPES}
+        self.tenants: Dict[Hashable, int] = {}
+        self.weights: Dict[Hashable, float] = {}
+        self.allocated: Dict[Hashable, Demand] = {}
+        self.shares: IndexedHeap = IndexedHeap()
+        self.selection_lock: Lock = Lock()
+
+    def __str__(self) -> str:
+        return f"{self.__class__.__name__}({len(self.tenants)} tenants, capacity {self.capacity})"
+
+    def add_tenant(self, tenant: Hashable, weight: float = 1.0, max_size: int = 0) -> None:
+        with self.selection_lock:
+            if tenant in self.tenants:
+                self.weights[tenant] = weight
+                return
+            self.tenants[tenant] = self.add_queue(max_size)
+            self.weights[tenant] = weight
+            self.allocated[tenant] = {resource: 0.0 for resource in RESOURCE_TYPES}
+
+    def dominant_share(self, tenant: Hashable) -> float:
+        return max(
+            (
+                self.allocated[tenant][resource] / self.capacity[resource]
+                if self.capacity[resource] > 0
+                else 0.0
+            )
+            for resource in RESOURCE_TYPES
+        ) / self.weights[tenant]
+
+    def _reprioritize(self, tenant: Hashable) -> None:
+        """Keep the tenant in the heap while it has tasks waiting."""
+        if self.queue_silo[self.tenants[tenant]].empty():
+            if tenant in self.shares:
+                self.shares.remove(tenant)
+        else:
+            self.shares.push(tenant, self.dominant_share(tenant))
+
+    def set_capacity(self, report: Dict[Hashable, Dict[str, Any]]) -> None:
+        """Set the capacity from the vitals of the resources.
+
+        It is what the resources don't use yet, plus what the running tasks allocated here
+        hold, since the vitals already account for them.
+        """
+        with self.selection_lock:
+            for resource in RESOURCE_TYPES:
+                self.capacity[resource] = self.used[resource] + sum(
+                    max(100.0 - float((vitals or {}).get(resource) or 0.0), 0.0)
+                    for vitals in report.values()
+                )
+            for tenant in list(self.shares):
+                self._reprioritize(tenant)
+
+    def put(
+        self,
+        item: Any,
+        index: Optional[Hashable] = None,
+        *args: Optional[List[Any]],
+        **kwargs: Optional[Dict[str, Any]],
+    ) -> None:
+        """Queue a task for the tenant `index`, with its `demand`.
+
+        Without a tenant, `item` is a `{resource: vitals}` report setting the capacity.
+        """
+        if index is None:
+            self.set_capacity(item)
+            return
+        if index not in self.tenants:
+            self.add_tenant(index)
+        demand: Demand = kwargs.get("demand") or self.default_demand
+        with self.selection_lock:
+            self.queue_silo[self.tenants[index]].put_nowait((item, demand))
+            self._reprioritize(index)
+
+    def fits(self, demand: Demand) -> bool:
+        return all(
+            self.used[resource] + demand.get(resource, 0.0) <= self.capacity[resource]
+            for resource in RESOURCE_TYPES
+        )
+
+    def queue(
+        self, *args: Optional[List[Any]], **kwargs: Optional[Dict[str, Any]]
+    ) -> Optional[Tuple[Hashable, Any, Demand]]:
+        """Allocate the next task, as a `(tenant, task, demand)` tuple.
+
+        Returns None if no task is waiting, or none fits in the capacity left.
+        """
+        with self.selection_lock:
+            skipped: List[Tuple[Hashable, float]] = []
+            try:
+                while len(self.shares):
+                    tenant, share = self.shares.pop()
+                    silo = self.queue_silo[self.tenants[tenant]]
+                    task, demand = silo.queue[0]
+                    if not self.fits(demand):
+                        skipped.append((tenant, share))
+                        continue
+                    silo.get_nowait()
+                    for resource in RESOURCE_TYPES:
+                        self.allocated[tenant][resource] += demand.get(resource, 0.0)
+                        self.used[resource] += demand.get(resource, 0.0)
+                    self._reprioritize(tenant)
+                    return tenant, task, demand
+                return None
+            finally:
+                for tenant, share in skipped:
+                    self.shares.push(tenant, share)
+
+    def release(self, tenant: Hashable, demand: Demand) -> None:
+        """Give back the resources of a finished task."""
+        with self.selection_lock:
+            for resource in RESOURCE_TYPES:
+                released: float = min(
+                    demand.get(resource, 0.0), self.allocated[tenant][resource]
+                )
+                self.allocated[tenant][resource] -= released
+                self.used[resource] -= released
+            self._reprioritize(tenant)
@@ -19,7 +19,6 @@ class FCFSAllocation(BaseAllocation):
         super().queue(*args, **kwargs)
         if len(self.queue_silo) == 0:
             raise ValueError("No queues found.")
-        print("Returning queue at index 0.")
         return self.queue_silo[0].get(0)
 
     def put(self, item: Union[Iterable[Any], int, str, Any], index: int = 0) -> None:
@@ -0,0 +1,135 @@
+import math
+from typing import Any, Dict, Hashable, Iterable, List, Optional, Tuple, Union
+
+from serpytor.components.utils.algorithms.allocation.base_allocation import \
+    BaseAllocation
+from serpytor.components.utils.structs.heaps import IndexedHeap
+
+Criteria = Union[str, Iterable[str]]
+
+
+def get_field(vitals: Dict[str, Any], field: str) -> float:
+    """Read a (possibly dotted, e.g. `windows.10s.cpu`) numeric field of the vitals.
+
+    Missing fields rank last.
+    """
+    value: Any = vitals
+    for part in field.split("."):
+        if not isinstance(value, dict) or value.get(part) is None:
+            return math.inf
+        value = value[part]
+    return float(value)
+
+
+def sort_key(vitals: Dict[str, Any], fields: Tuple[str, ...]) -> Tuple[float, ...]:
+    """Priority of a resource: its fields in order, the ones prefixed with `-` descending."""
+    key: List[float] = []
+    for field in fields:
+        if field.startswith("-"):
+            value: float = get_field(vitals, field[1:])
+            key.append(-value if value != math.inf else math.inf)
+        else:
+            key.append(get_field(vitals, field))
+    return tuple(key)
+
+
+class PriorityAllocation(BaseAllocation):
+    """Allocate the best resource according to its vitals.
+
+    Resources are kept in an `IndexedHeap` ordered on the `sortable_fields` of their
+    vitals (`("cpu",)` by default): the first field decides, the next ones break ties.
+    Prefix a field with `-` to prefer high values, and use dotted names for nested
+    fields, e.g. `windows.10s.cpu`.
+
+    `put` takes a `{resource: vitals}` report (as built by `Gateway.get_available_resources`),
+    or `(resource, vitals)` pairs. New resources are inserted and known ones get their
+    priority updated, in O(log n) each. `queue` returns the best resource without taking
+    it out of the pool, and `pop` takes it out.
+
+    `queue(selection_criteria=...)` (as passed on by `Gateway.allocate_resource`) picks on
+    other fields than `sortable_fields`. One heap is kept per criteria asked for, and all
+    of them are updated by `put`.
+
+    Example usage:
+
+    ```python
+    allocation = PriorityAllocation(sortable_fields=["cpu", "memory"])
+    allocation.put({"http://127.0.0.1:8100/exec": {"cpu": 35.0, "memory": 40.0}})
+    allocation.queue()  # "http://127.0.0.1:8100/exec"
+    ```
+    """
+
+    def __init__(self, *args: List[Any], **kwargs: Dict[str, Any]) -> None:
+        super().__init__(*args, **kwargs)
+        self.sortable_fields: Tuple[str, ...] = self.criteria(
+            self.sortable_fields or ("cpu",)
+        )
+        self.vitals: Dict[Hashable, Dict[str, Any]] = {}
+        self.heaps: Dict[Tuple[str, ...], IndexedHeap] = {
+            self.sortable_fields: IndexedHeap()
+        }
+
+    def __str__(self) -> str:
+        return f"{self.__class__.__name__}({len(self.vitals)} resources, by {', '.join(self.sortable_fields)})"
+
+    @staticmethod
+    def criteria(fields: Criteria) -> Tuple[str, ...]:
+        return (fields,) if isinstance(fields, str) else tuple(fields)
+
+    def heap(self, fields: Optional[Criteria] = None) -> IndexedHeap:
+        """The heap ordered on `fields` (the `sortable_fields` by default), built on first use."""
+        fields = self.criteria(fields) if fields else self.sortable_fields
+        if fields not in self.heaps:
+            heap: IndexedHeap = IndexedHeap()
+            for resource, vitals in self.vitals.items():
+                heap.push(resource, sort_key(vitals, fields))
+            self.heaps[fields] = heap
+        return self.heaps[fields]
+
+    def put(
+        self,
+        item: Union[Dict[Hashable, Dict[str, Any]], Iterable[Tuple[Hashable, Dict[str, Any]]]],
+        index: Optional[int] = 0,
+        *args: Optional[List[Any]],
+        **kwargs: Optional[Dict[str, Any]],
+    ) -> None:
+        """Insert resources, or update their vitals."""
+        pairs: Iterable[Tuple[Hashable, Dict[str, Any]]] = (
+            item.items() if isinstance(item, dict) else item
+        )
+        for resource, vitals in pairs:
+            vitals = vitals or {}
+            self.vitals[resource] = vitals
+            for fields, heap in self.heaps.items():
+                heap.push(resource, sort_key(vitals, fields))
+
+    def remove(self, resource: Hashable) -> None:
+        del self.vitals[resource]
+        for heap in self.heaps.values():
+            heap.remove(resource)
+
+    def queue(
+        self, *args: Optional[List[Any]], **kwargs: Optional[Dict[str, Any]]
+    ) -> Any:
+        """Return the best resource, leaving it in the pool."""
+        return self.heap(kwargs.get("selection_criteria")).peek()[0]
+
+    def pop(self, selection_criteria: Optional[Criteria] = None) -> Any:
+        """Take the best resource out of the pool, and return it."""
+        resource: Hashable = self.heap(selection_criteria).peek()[0]
+        self.remove(resource)
+        return resource
+
+
+if __name__ == "__main__":
+    allocation = PriorityAllocation(sortable_fields=["cpu", "-memory"])
+    allocation.put(
+        {
+            "http://127.0.0.1:8100/exec": {"cpu": 35.0, "memory": 40.0},
+            "http://127.0.0.1:8101/exec": {"cpu": 12.5, "memory": 70.0},
+            "http://127.0.0.1:8102/exec": {"cpu": 12.5, "memory": 90.0},
+        }
+    )
+    print(allocation.queue())
+    allocation.put({"http://127.0.0.1:8102/exec": {"cpu": 95.0, "memory": 90.0}})
+    print(allocation.queue(), allocation.queue(selection_criteria="memory"))
@@ -1,11 +1,98 @@
-from typing import Any, Dict, List
+from queue import Empty
+from threading import Lock
+from typing import Any, Dict, Iterable, List, Optional
 
 from serpytor.components.utils.algorithms.allocation.base_allocation import \
     BaseAllocation
 
 
 class RoundRobinAllocation(BaseAllocation):
-    """ """
+    """Smooth weighted round-robin across the queues of the silo, as in nginx.
 
-    def queue(self, *args: List[Any], **kwargs: Dict[str, Any]) -> Any:
-        ...
+    Every queue of `queue_silo` has a weight (1 by default, see `weights` and
+    `set_weight`). Each call to `queue` takes the next item from one of the non-empty
+    queues, so that over a round of `sum(weights)` calls, a queue of weight w is served w
+    times. Unlike plain weighted round-robin, the turns of a heavy queue are spread over
+    the round instead of coming in a burst: with weights 5, 1 and 1, the order is
+    `a a b a c a a`, not `a a a a a b c`.
+
+    The choice of the queue is the only step taken under a lock, a thread lock rather
+    than a process one since the silo lives in one process.
+
+    Example usage:
+
+    ```python
+    allocation = RoundRobinAllocation(num_queues=3, weights=[5, 1, 1])
+    allocation.put(["a1", "a2"], index=0)
+    allocation.put(["b1"], index=1)
+    allocation.queue()  # "a1"
+    ```
+    """
+
+    def __init__(
+        self,
+        num_queues: Optional[int] = 5,
+        max_size: Optional[int] = 0,
+        weights: Optional[Iterable[int]] = None,
+        *args: List[Any],
+        **kwargs: Dict[str, Any],
+    ) -> None:
+        super().__init__(num_queues, max_size, *args, **kwargs)
+        self.weights: List[int] = list(weights) if weights is not None else []
+        self.weights += [1] * (len(self.queue_silo) - len(self.weights))
+        self.current_weights: List[int] = [0] * len(self.queue_silo)
+        self.selection_lock: Lock = Lock()
+
+    def __str__(self) -> str:
+        return f"{self.__class__.__name__}({len(self.queue_silo)} queues, weights {self.weights})"
+
+    def add_queue(self, max_size=0, weight: int = 1) -> int:
+        index: int = super().add_queue(max_size)
+        with self.selection_lock:
+            self.weights.append(weight)
+            self.current_weights.append(0)
+        return index
+
+    def set_weight(self, index: int, weight: int) -> None:
+        with self.selection_lock:
+            self.weights[index] = weight
+
+    def next_index(self) -> Optional[int]:
+        """Pick the next non-empty queue, or None if they are all empty."""
+        with self.selection_lock:
+            best: Optional[int] = None
+            total: int = 0
+            for index, weight in enumerate(self.weights):
+                if weight <= 0 or self.queue_silo[index].empty():
+                    continue
+                self.current_weights[index] += weight
+                total += weight
+                if best is None or self.current_weights[index] > self.current_weights[best]:
+                    best = index
+            if best is not None:
+                self.current_weights[best] -= total
+            return best
+
+    def queue(
+        self, *args: Optional[List[Any]], **kwargs: Optional[Dict[str, Any]]
+    ) -> Any:
+        """Take the next item, from the queue whose turn it is.
+
+        Raises `queue.Empty` if every queue is empty.
+        """
+        while True:
+            index: Optional[int] = self.next_index()
+            if index is None:
+                raise Empty()
+            try:
+                return self.queue_silo[index].get_nowait()
+            except Empty:
+                # Another consumer took the last item in the meantime.
+                continue
+
+
+if __name__ == "__main__":
+    allocation = RoundRobinAllocation(num_queues=3, weights=[5, 1, 1])
+    for index, name in enumerate("abc"):
+        allocation.put([f"{name}{idx}" for idx in range(10)], index=index)
+    print([allocation.queue() for _ in range(14)])
@@ -0,0 +1,128 @@
+import random
+from queue import Empty, Full
+from typing import Any, Deque, Dict, Iterable, List, Optional, Union
+
+from serpytor.components.utils.algorithms.allocation.base_allocation import (
+    SCALAR_TYPES, BaseAllocation)
+
+
+class WorkStealingAllocation(BaseAllocation):
+    """Work-stealing across the queues of the silo, one per worker.
+
+    Worker `i` owns `queue_silo[i]`: it puts its tasks at the head of its own deque and
+    takes them back from there, newest first, so it never waits on the others. When its
+    deque is empty, `queue(worker=i)` steals from the tail of another worker's deque, the
+    oldest tasks there, starting from a random victim (drawn from `rng`, seeded with the
+    `seed` keyword argument if given). Half of the victim's tasks are taken
+    at once (up to `max_steal`), so that a worker left with a long backlog is relieved in
+    a few steals and the thieves don't come back for every task.
+
+    Pushes, pops and steals are single `deque` operations, atomic in CPython, so no lock
+    is taken on the way: the owner and a thief racing for the last task can't both get it.
+    Only `qsize`, `empty` and the `peek` of the silo queues remain meaningful, the blocking
+    `get` of `queue.Queue` is not used.
+
+    Example usage:
+
+    ```python
+    allocation = WorkStealingAllocation(num_workers=4)
+    allocation.put(tasks, index=0)
+    # In worker 1:
+    task = allocation.queue(worker=1)  # stolen from worker 0
+    ```
+    """
+
+    def __init__(
+        self,
+        num_workers: Optional[int] = 5,
+        max_size: Optional[int] = 0,
+        max_steal: Optional[int] = 64,
+        *args: List[Any],
+        **kwargs: Dict[str, Any],
+    ) -> None:
+        super().__init__(num_workers, max_size, *args, **kwargs)
+        self.max_steal: int = max_steal
+        self.steals: List[int] = [0] * len(self.queue_silo)
+        self.rng: random.Random = random.Random(kwargs.get("seed"))
+
+    def __str__(self) -> str:
+        return f"{self.__class__.__name__}({len(self.queue_silo)} workers, {len(self)} items)"
+
+    def add_queue(self, max_size=0) -> int:
+        """Add a worker, and return its index."""
+        index: int = super().add_queue(max_size)
+        self.steals.append(0)
+        return index
+
+    def worker_deque(self, worker: int) -> Deque[Any]:
+        return self.queue_silo[worker].queue
+
+    def put(
+        self,
+        item: Union[Iterable[Any], int, str, Any],
+        index: Optional[int] = None,
+        *args: Optional[List[Any]],
+        **kwargs: Optional[Dict[str, Any]],
+    ) -> None:
+        """Push an item, or every item of an iterable other than a string, to a worker."""
+        worker: int = self.shard() if index is None else index
+        items: List[Any] = (
+            list(item)
+            if hasattr(item, "__iter__") and not isinstance(item, SCALAR_TYPES)
+            else [item]
+        )
+        local: Deque[Any] = self.worker_deque(worker)
+        max_size: int = self.queue_silo[worker].maxsize
+        if 0 < max_size < len(local) + len(items):
+            raise Full()
+        local.extend(items)
+
+    def steal(self, worker: int) -> Optional[Any]:
+        """Move tasks from the tail of another worker to `worker`, and return one of them."""
+        num_workers: int = len(self.queue_silo)
+        start: int = self.rng.randrange(num_workers)
+        for offset in range(num_workers):
+            victim: int = (start + offset) % num_workers
+            if victim == worker:
+                continue
+            remote: Deque[Any] = self.worker_deque(victim)
+            count: int = min(max(len(remote) // 2, 1), self.max_steal)
+            stolen: List[Any] = []
+            try:
+                for _ in range(count):
+                    stolen.append(remote.popleft())
+            except IndexError:
+                # The owner or another thief got there first.
+                pass
+            if stolen:
+                self.steals[worker] += 1
+                # The oldest stolen task runs first, the rest go to the local deque.
+                self.worker_deque(worker).extend(reversed(stolen[1:]))
+                return stolen[0]
+        return None
+
+    def queue(
+        self, *args: Optional[List[Any]], **kwargs: Optional[Dict[str, Any]]
+    ) -> Any:
+        """Take the next task of `worker`, stealing one if its own deque is empty.
+
+        Raises `queue.Empty` if no worker has a task left.
+        """
+        worker: int = kwargs.get("worker")
+        if worker is None:
+            worker = self.shard()
+        try:
+            return self.worker_deque(worker).pop()
+        except IndexError:
+            pass
+        task: Any = self.steal(worker)
+        if task is None:
+            raise Empty()
+        return task
+
+
+if __name__ == "__main__":
+    allocation = WorkStealingAllocation(num_workers=3)
+    allocation.put(range(10), index=0)
+    print(allocation.queue(worker=0), allocation.queue(worker=1), allocation.queue(worker=2))
+    print([list(silo.queue) for silo in allocation.queue_silo], allocation.steals)
@@ -0,0 +1,19 @@
+"""
+"""
+from serpytor.components.utils.simulation.drivers import (Driver, get_driver,
+                                                          register_driver)
+from serpytor.components.utils.simulation.simulator import (
+    ClusterSimulator, SimulatedResource, SimulationReport, TraceTask,
+    load_trace, poisson_trace)
+
+__all__ = [
+    "ClusterSimulator",
+    "Driver",
+    "SimulatedResource",
+    "SimulationReport",
+    "TraceTask",
+    "get_driver",
+    "load_trace",
+    "poisson_trace",
+    "register_driver",
+]
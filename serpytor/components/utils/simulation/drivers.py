@@ -0,0 +1,269 @@
+from collections import deque
+from queue import Empty
+from typing import Any, Deque, Dict, List, Optional, Set, Tuple, Type
+
+from serpytor.components.utils.algorithms.allocation import (
+    AdmissionError, BinPackingAllocation, DeadlineAllocation,
+    FairResourceAllocation, PriorityAllocation, WorkStealingAllocation)
+from serpytor.components.utils.algorithms.allocation.base_allocation import \
+    BaseAllocation
+
+# (task, name of the resource to run it on, or None to let the simulator pick)
+Pick = Tuple[Any, Optional[str]]
+
+
+class Driver:
+    """How the simulator talks to an allocation: the default is a plain task queue.
+
+    Tasks are `put` in the queue of their tenant (in order of first appearance, modulo
+    the size of the silo), and `queue` returns the next one, or raises `queue.Empty` or
+    returns None when there is none. A task that can't run yet is held, and offered again
+    before any other once there is room.
+    """
+
+    def __init__(self, allocation: BaseAllocation) -> None:
+        self.allocation: BaseAllocation = allocation
+        self.held: Deque[Pick] = deque()
+        self.tenants: Dict[Any, int] = {}
+        self.simulator: Any = None
+
+    def attach(self, simulator: Any) -> None:
+        self.simulator = simulator
+
+    def tenant_index(self, task: Any) -> int:
+        index: int = self.tenants.setdefault(task.tenant, len(self.tenants))
+        return index % max(len(self.allocation.queue_silo), 1)
+
+    def submit(self, task: Any) -> Optional[bool]:
+        """Queue a task, or return False if the allocation rejects it."""
+        self.allocation.put(task, index=self.tenant_index(task))
+        return None
+
+    def take(self, idle: List[Any]) -> Optional[Pick]:
+        try:
+            task: Any = self.allocation.queue()
+        except Empty:
+            return None
+        return None if task is None else (task, None)
+
+    def next(self, simulator: Any, idle: List[Any]) -> Optional[Pick]:
+        """The next task to start, and where if the allocation says.
+
+        Held tasks go first, except the ones waiting for a resource that has no free slot.
+        """
+        names: Set[str] = {resource.name for resource in idle}
+        for position, (task, name) in enumerate(self.held):
+            if name is None or name in names:
+                del self.held[position]
+                return task, name
+        return self.take(idle)
+
+    def hold(self, task: Any) -> None:
+        self.held.appendleft((task, None))
+
+    def done(self, task: Any, resource: str, runtime: float) -> None:
+        """A task finished on `resource`, after `runtime` seconds."""
+
+    def lost(self, task: Any, resource: str) -> None:
+        """A task was lost to a failure of `resource`, and is about to be submitted again."""
+
+    def resource_down(self, resource: str) -> None:
+        pass
+
+    def resource_up(self, resource: str) -> None:
+        pass
+
+
+class WorkStealingDriver(Driver):
+    """Tasks go to the worker of their tenant, and each resource is a worker."""
+
+    def attach(self, simulator: Any) -> None:
+        super().attach(simulator)
+        # The victims of the steals are drawn from the seed of the simulation.
+        self.allocation.rng.seed(simulator.rng.getrandbits(64))
+        num_workers: int = len(self.allocation.queue_silo)
+        self.workers: Dict[str, int] = {
+            resource.name: idx % num_workers for idx, resource in enumerate(simulator.resources)
+        }
+
+    def take(self, idle: List[Any]) -> Optional[Pick]:
+        if not len(self.allocation):
+            return None
+        for resource in idle:
+            try:
+                return self.allocation.queue(worker=self.workers[resource.name]), resource.name
+            except Empty:
+                continue
+        return None
+
+
+class ResourceDriver(Driver):
+    """Base of the drivers of allocations that also pick the resource of a task."""
+
+    def __init__(self, allocation: BaseAllocation) -> None:
+        super().__init__(allocation)
+        self.picks: Dict[int, Pick] = {}
+
+    def hold(self, task: Any) -> None:
+        self.held.appendleft(self.picks[task.index])
+
+    def report(self, names: Optional[List[str]] = None) -> Dict[str, Dict[str, float]]:
+        return {
+            resource.name: resource.vitals()
+            for resource in self.simulator.resources
+            if resource.up and (names is None or resource.name in names)
+        }
+
+
+class PriorityDriver(ResourceDriver):
+    """Tasks are run in order of arrival, each on the best resource by its vitals."""
+
+    def __init__(self, allocation: PriorityAllocation) -> None:
+        super().__init__(allocation)
+        self.tasks: Deque[Any] = deque()
+
+    def submit(self, task: Any) -> None:
+        self.tasks.append(task)
+
+    def take(self, idle: List[Any]) -> Optional[Pick]:
+        if not self.tasks:
+            return None
+        self.allocation.put(self.report())
+        task: Any = self.tasks.popleft()
+        self.picks[task.index] = (task, self.allocation.queue())
+        return self.picks[task.index]
+
+    def resource_down(self, resource: str) -> None:
+        if resource in self.allocation.vitals:
+            self.allocation.remove(resource)
+
+
+class FairResourceDriver(Driver):
+    """Tasks are queued per tenant with their demand, against the capacity of the cluster."""
+
+    def attach(self, simulator: Any) -> None:
+        super().attach(simulator)
+        self.set_capacity()
+
+    def set_capacity(self) -> None:
+        self.allocation.put(
+            {
+                resource.name: dict(resource.used)
+                for resource in self.simulator.resources
+                if resource.up
+            }
+        )
+
+    def submit(self, task: Any) -> None:
+        self.allocation.put(task, index=task.tenant or "default", demand=task.demand or None)
+
+    def take(self, idle: List[Any]) -> Optional[Pick]:
+        allocated: Optional[Tuple[Any, Any, Dict[str, float]]] = self.allocation.queue()
+        return None if allocated is None else (allocated[1], None)
+
+    def done(self, task: Any, resource: str, runtime: float) -> None:
+        self.allocation.release(
+            task.tenant or "default", task.demand or self.allocation.default_demand
+        )
+
+    def lost(self, task: Any, resource: str) -> None:
+        self.done(task, resource, 0.0)
+
+    def resource_down(self, resource: str) -> None:
+        self.set_capacity()
+
+    def resource_up(self, resource: str) -> None:
+        self.set_capacity()
+
+
+class DeadlineDriver(Driver):
+    """Tasks are queued with their deadline and kind, on the clock of the simulator."""
+
+    def __init__(self, allocation: DeadlineAllocation) -> None:
+        super().__init__(allocation)
+        self.tickets: Dict[int, int] = {}
+
+    def attach(self, simulator: Any) -> None:
+        super().attach(simulator)
+        self.allocation.clock = lambda: simulator.now
+
+    def submit(self, task: Any) -> Optional[bool]:
+        """Queue a task, due `deadline` seconds after its arrival, even when resubmitted."""
+        timeout: Optional[float] = (
+            task.deadline - (self.simulator.now - task.arrival)
+            if task.deadline is not None
+            else None
+        )
+        try:
+            self.allocation.put(task, timeout=timeout, digest=task.kind or "task")
+        except AdmissionError:
+            return False
+        return None
+
+    def take(self, idle: List[Any]) -> Optional[Pick]:
+        allocated: Optional[Tuple[int, Any]] = self.allocation.queue()
+        if allocated is None:
+            return None
+        ticket, task = allocated
+        self.tickets[task.index] = ticket
+        return task, None
+
+    def done(self, task: Any, resource: str, runtime: float) -> None:
+        self.allocation.complete(self.tickets.pop(task.index), runtime)
+
+    def lost(self, task: Any, resource: str) -> None:
+        self.allocation.abandon(self.tickets.pop(task.index))
+
+
+class BinPackingDriver(ResourceDriver):
+    """Tasks are packed on the resources with their demand."""
+
+    def attach(self, simulator: Any) -> None:
+        super().attach(simulator)
+        self.allocation.clock = lambda: simulator.now
+        self.allocation.put(self.report())
+
+    def submit(self, task: Any) -> None:
+        self.allocation.put(task, demand=task.demand or None)
+
+    def take(self, idle: List[Any]) -> Optional[Pick]:
+        placement: Optional[Tuple[Any, str, Dict[str, float]]] = self.allocation.queue()
+        if placement is None:
+            return None
+        task, resource, _ = placement
+        self.picks[task.index] = (task, resource)
+        return self.picks[task.index]
+
+    def done(self, task: Any, resource: str, runtime: float) -> None:
+        self.allocation.release(resource, task.demand or self.allocation.default_demand)
+
+    def lost(self, task: Any, resource: str) -> None:
+        self.done(task, resource, 0.0)
+
+    def resource_down(self, resource: str) -> None:
+        self.allocation.free.pop(resource, None)
+
+    def resource_up(self, resource: str) -> None:
+        self.allocation.put(self.report([resource]))
+
+
+DRIVERS: Dict[type, Type[Driver]] = {
+    BaseAllocation: Driver,
+    WorkStealingAllocation: WorkStealingDriver,
+    PriorityAllocation: PriorityDriver,
+    FairResourceAllocation: FairResourceDriver,
+    DeadlineAllocation: DeadlineDriver,
+    BinPackingAllocation: BinPackingDriver,
+}
+
+
+def register_driver(allocation_class: type, driver_class: Type[Driver]) -> None:
+    """Use `driver_class` to simulate the allocations of `allocation_class` and its subclasses."""
+    DRIVERS[allocation_class] = driver_class
+
+
+def get_driver(allocation: BaseAllocation) -> Driver:
+    for allocation_class in type(allocation).__mro__:
+        if allocation_class in DRIVERS:
+            return DRIVERS[allocation_class](allocation)
+    raise TypeError(f"No simulation driver for {type(allocation).__name__}.")
@@ -0,0 +1,346 @@
+import heapq
+import itertools
+import json
+import math
+import random
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from serpytor.components.connection.monitor.metrics import percentile
+from serpytor.components.utils.algorithms.allocation.base_allocation import \
+    BaseAllocation
+from serpytor.components.utils.simulation.drivers import Driver, get_driver
+
+RESOURCE_TYPES: Tuple[str, ...] = ("cpu", "memory")
+
+
+class TraceTask:
+    """A task of an arrival trace.
+
+    `work` is its runtime on a resource of speed 1, `demand` what it holds of a resource
+    while it runs (in percent, like the vitals), and `deadline` how long after its arrival
+    it is due, if it is. `tenant` and `kind` are passed to the allocations that use them
+    (the latter as the digest of a `DeadlineAllocation`).
+    """
+
+    def __init__(
+        self,
+        arrival: float,
+        work: float,
+        demand: Optional[Dict[str, float]] = None,
+        deadline: Optional[float] = None,
+        tenant: Optional[str] = None,
+        kind: Optional[str] = None,
+        index: int = 0,
+    ) -> None:
+        self.arrival: float = arrival
+        self.work: float = work
+        self.demand: Dict[str, float] = demand or {}
+        self.deadline: Optional[float] = deadline
+        self.tenant: Optional[str] = tenant
+        self.kind: Optional[str] = kind
+        self.index: int = index
+        self.attempts: int = 0
+        self.started: Optional[float] = None
+        self.finished: Optional[float] = None
+
+    def __repr__(self) -> str:
+        return f"{self.__class__.__name__}(#{self.index}, arrival={self.arrival:.3f}, work={self.work:.3f})"
+
+    @classmethod
+    def from_dict(cls, record: Dict[str, Any], index: int = 0) -> "TraceTask":
+        return cls(
+            arrival=float(record["arrival"]),
+            work=float(record["work"]),
+            demand=record.get("demand"),
+            deadline=record.get("deadline"),
+            tenant=record.get("tenant"),
+            kind=record.get("kind"),
+            index=index,
+        )
+
+
+def load_trace(path: str) -> List[TraceTask]:
+    """Read a trace of tasks, one JSON object per line (see `TraceTask` for the fields)."""
+    with open(path) as trace_file:
+        return [
+            TraceTask.from_dict(json.loads(line), index)
+            for index, line in enumerate(line for line in trace_file if line.strip())
+        ]
+
+
+def poisson_trace(
+    count: int,
+    rate: float,
+    mean_work: float = 1.0,
+    seed: int = 0,
+    demand: Optional[Dict[str, Tuple[float, float]]] = None,
+    **fields: Any,
+) -> List[TraceTask]:
+    """A trace of `count` tasks arriving at `rate` per second, with exponential work.
+
+    `demand` gives the range of each requirement, drawn uniformly.
+    """
+    rng: random.Random = random.Random(seed)
+    now: float = 0.0
+    trace: List[TraceTask] = []
+    for index in range(count):
+        now += rng.expovariate(rate)
+        trace.append(
+            TraceTask(
+                arrival=now,
+                work=rng.expovariate(1 / mean_work),
+                demand={key: rng.uniform(*bounds) for key, bounds in (demand or {}).items()},
+                index=index,
+                **fields,
+            )
+        )
+    return trace
+
+
+class SimulatedResource:
+    """A simulated resource, running up to `slots` tasks at `speed` times their work.
+
+    It fails at `failure_rate` per second (exponentially distributed, 0 for never), losing
+    the tasks it runs, and is back `repair_time` seconds later.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        speed: float = 1.0,
+        slots: int = 1,
+        failure_rate: float = 0.0,
+        repair_time: float = 10.0,
+    ) -> None:
+        self.name: str = name
+        self.speed: float = speed
+        self.slots: int = slots
+        self.failure_rate: float = failure_rate
+        self.repair_time: float = repair_time
+        self.up: bool = True
+        self.running: Dict[int, TraceTask] = {}
+        self.used: Dict[str, float] = {resource_type: 0.0 for resource_type in RESOURCE_TYPES}
+        self.busy_time: float = 0.0
+
+    def __repr__(self) -> str:
+        return f"{self.__class__.__name__}({self.name}, {len(self.running)}/{self.slots} running)"
+
+    def fits(self, task: TraceTask) -> bool:
+        return (
+            self.up
+            and len(self.running) < self.slots
+            and all(
+                self.used[resource_type] + task.demand.get(resource_type, 0.0) <= 100.0
+                for resource_type in RESOURCE_TYPES
+            )
+        )
+
+    def vitals(self) -> Dict[str, float]:
+        """What the resource would report in its heartbeats: what its tasks hold, or the
+        share of its slots in use if they don't say."""
+        if any(self.used.values()):
+            return dict(self.used)
+        share: float = 100.0 * len(self.running) / self.slots
+        return {resource_type: share for resource_type in RESOURCE_TYPES}
+
+
+class SimulationReport:
+    """What a simulation measured. Times are in seconds of simulated time."""
+
+    def __init__(self, **metrics: Any) -> None:
+        self.metrics: Dict[str, Any] = metrics
+
+    def __getitem__(self, key: str) -> Any:
+        return self.metrics[key]
+
+    def __repr__(self) -> str:
+        return f"{self.__class__.__name__}({self.metrics})"
+
+    def as_dict(self) -> Dict[str, Any]:
+        return dict(self.metrics)
+
+
+class ClusterSimulator:
+    """Deterministic discrete-event simulation of an allocation on a cluster.
+
+    The tasks of the `trace` arrive at the `allocation` (any `BaseAllocation`, through the
+    `Driver` registered for its class, see `drivers`), which decides what runs next, and
+    where for the ones that place tasks themselves. The others get the fastest resource
+    with room for the task. Running tasks finish after `work / speed` seconds; the ones
+    running on a resource that fails are queued again.
+
+    Events are processed in order of time, then of creation, and every random draw comes
+    from a generator seeded with `seed`, so a run is the same every time: policies can be
+    compared offline, and in CI.
+
+    Example usage:
+
+    ```python
+    simulator = ClusterSimulator(
+        RoundRobinAllocation(num_queues=1),
+        [SimulatedResource(f"node-{idx}", speed=1 + idx % 2) for idx in range(8)],
+        poisson_trace(10000, rate=10.0),
+    )
+    report = simulator.run()
+    report["throughput"], report["latency_p99"]
+    ```
+    """
+
+    def __init__(
+        self,
+        allocation: BaseAllocation,
+        resources: Iterable[SimulatedResource],
+        trace: Iterable[TraceTask],
+        seed: int = 0,
+        driver: Optional[Driver] = None,
+    ) -> None:
+        self.resources: List[SimulatedResource] = list(resources)
+        self.by_name: Dict[str, SimulatedResource] = {
+            resource.name: resource for resource in self.resources
+        }
+        self.trace: List[TraceTask] = sorted(trace, key=lambda task: (task.arrival, task.index))
+        self.driver: Driver = driver or get_driver(allocation)
+        self.rng: random.Random = random.Random(seed)
+        self.now: float = 0.0
+        # (time, order, kind, payload)
+        self.events: List[Tuple[float, int, str, Any]] = []
+        self.order = itertools.count()
+        self.failures: int = 0
+        self.retries: int = 0
+        self.rejected: int = 0
+
+    def schedule(self, delay: float, kind: str, payload: Any) -> None:
+        heapq.heappush(self.events, (self.now + delay, next(self.order), kind, payload))
+
+    def idle_resources(self) -> List[SimulatedResource]:
+        """The resources with a free slot, fastest first."""
+        return sorted(
+            (
+                resource
+                for resource in self.resources
+                if resource.up and len(resource.running) < resource.slots
+            ),
+            key=lambda resource: -resource.speed,
+        )
+
+    def start(self, task: TraceTask, resource: SimulatedResource) -> None:
+        task.attempts += 1
+        if task.started is None:
+            task.started = self.now
+        resource.running[task.index] = task
+        for resource_type, amount in task.demand.items():
+            resource.used[resource_type] = resource.used.get(resource_type, 0.0) + amount
+        self.schedule(task.work / resource.speed, "done", (task, resource, task.attempts))
+
+    def stop(self, task: TraceTask, resource: SimulatedResource) -> None:
+        del resource.running[task.index]
+        for resource_type, amount in task.demand.items():
+            resource.used[resource_type] -= amount
+
+    def dispatch(self) -> None:
+        """Start tasks while the allocation has some that fit somewhere."""
+        while True:
+            idle: List[SimulatedResource] = self.idle_resources()
+            if not idle:
+                return
+            picked: Optional[Tuple[TraceTask, Optional[str]]] = self.driver.next(self, idle)
+            if picked is None:
+                return
+            task, name = picked
+            resource: Optional[SimulatedResource] = (
+                self.by_name[name]
+                if name is not None
+                else next((resource for resource in idle if resource.fits(task)), None)
+            )
+            if resource is None or not resource.fits(task):
+                # Nowhere to run it for now: it goes first once something changes.
+                self.driver.hold(task)
+                return
+            self.start(task, resource)
+
+    def account(self, elapsed: float) -> None:
+        for resource in self.resources:
+            resource.busy_time += elapsed * len(resource.running) / resource.slots
+            for resource_type in RESOURCE_TYPES:
+                self.usage[resource_type] += elapsed * resource.used.get(resource_type, 0.0)
+
+    def run(self, until: float = math.inf) -> SimulationReport:
+        """Replay the trace, up to `until` seconds of simulated time, and report."""
+        self.usage: Dict[str, float] = {resource_type: 0.0 for resource_type in RESOURCE_TYPES}
+        for task in self.trace:
+            heapq.heappush(self.events, (task.arrival, next(self.order), "arrival", task))
+        for resource in self.resources:
+            if resource.failure_rate > 0:
+                self.schedule(self.rng.expovariate(resource.failure_rate), "failure", resource)
+        self.driver.attach(self)
+        start: float = self.trace[0].arrival if self.trace else 0.0
+        self.now = start
+        pending_tasks: int = len(self.trace)
+
+        while self.events and pending_tasks:
+            time, _, kind, payload = heapq.heappop(self.events)
+            if time > until:
+                break
+            self.account(time - self.now)
+            self.now = time
+            if kind == "arrival":
+                if self.driver.submit(payload) is False:
+                    self.rejected += 1
+                    pending_tasks -= 1
+            elif kind == "done":
+                task, resource, attempt = payload
+                if attempt != task.attempts or task.index not in resource.running:
+                    # Lost to a failure of its resource.
+                    continue
+                self.stop(task, resource)
+                task.finished = self.now
+                pending_tasks -= 1
+                self.driver.done(task, resource.name, task.work / resource.speed)
+            elif kind == "failure":
+                self.failures += 1
+                payload.up = False
+                for task in list(payload.running.values()):
+                    self.stop(task, payload)
+                    self.driver.lost(task, payload.name)
+                    self.retries += 1
+                    if self.driver.submit(task) is False:
+                        self.rejected += 1
+                        pending_tasks -= 1
+                self.driver.resource_down(payload.name)
+                self.schedule(payload.repair_time, "repair", payload)
+            elif kind == "repair":
+                payload.up = True
+                self.driver.resource_up(payload.name)
+                if payload.failure_rate > 0:
+                    self.schedule(self.rng.expovariate(payload.failure_rate), "failure", payload)
+            self.dispatch()
+
+        return self.report(start)
+
+    def report(self, start: float) -> SimulationReport:
+        finished: List[TraceTask] = [task for task in self.trace if task.finished is not None]
+        makespan: float = self.now - start
+        latencies: List[float] = [task.finished - task.arrival for task in finished]
+        waits: List[float] = [task.started - task.arrival for task in finished]
+        capacity: float = makespan * len(self.resources) or math.inf
+        return SimulationReport(
+            tasks=len(self.trace),
+            completed=len(finished),
+            makespan=makespan,
+            throughput=len(finished) / makespan if makespan else 0.0,
+            utilization=sum(resource.busy_time for resource in self.resources) / capacity,
+            cpu_utilization=self.usage["cpu"] / (100.0 * capacity),
+            memory_utilization=self.usage["memory"] / (100.0 * capacity),
+            latency_mean=sum(latencies) / len(latencies) if latencies else None,
+            latency_p50=percentile(latencies, 50),
+            latency_p90=percentile(latencies, 90),
+            latency_p99=percentile(latencies, 99),
+            wait_p99=percentile(waits, 99),
+            deadline_misses=sum(
+                task.deadline is not None and task.finished - task.arrival > task.deadline
+                for task in finished
+            ),
+            failures=self.failures,
+            retries=self.retries,
+            rejected=self.rejected,
+        )
@@ -0,0 +1,119 @@
+from typing import Any, Dict, Hashable, Iterator, List, Tuple
+
+
+class IndexedHeap:
+    """Binary min-heap of keys with priorities, indexed by key.
+
+    On top of the `heapq`-style push and pop, the position of every key is tracked, so
+    the priority of a key already in the heap can be changed (`update`) or the key removed
+    (`remove`) in O(log n), without leaving stale entries behind. Keys with equal
+    priorities come out in insertion order.
+
+    Example usage:
+
+    ```python
+    heap = IndexedHeap()
+    heap.push("http://127.0.0.1:8100/exec", 35.0)
+    heap.push("http://127.0.0.1:8101/exec", 12.5)
+    heap.update("http://127.0.0.1:8101/exec", 80.0)
+    heap.peek()  # ("http://127.0.0.1:8100/exec", 35.0)
+    ```
+    """
+
+    def __init__(self) -> None:
+        # Entries are [priority, insertion number, key] lists, compared in that order.
+        self._entries: List[List[Any]] = []
+        self._positions: Dict[Hashable, int] = {}
+        self._counter: int = 0
+
+    def __repr__(self) -> str:
+        return f"{self.__class__.__name__}({len(self)} keys)"
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._positions
+
+    def __iter__(self) -> Iterator[Hashable]:
+        """Iterate over the keys, in no particular order."""
+        return iter(list(self._positions))
+
+    def priority(self, key: Hashable) -> Any:
+        return self._entries[self._positions[key]][0]
+
+    def push(self, key: Hashable, priority: Any) -> None:
+        """Add a key, or change its priority if it is already in the heap."""
+        if key in self._positions:
+            self.update(key, priority)
+            return
+        self._entries.append([priority, self._counter, key])
+        self._counter += 1
+        self._positions[key] = len(self._entries) - 1
+        self._sift_up(len(self._entries) - 1)
+
+    def update(self, key: Hashable, priority: Any) -> None:
+        """Change the priority of a key in the heap."""
+        position: int = self._positions[key]
+        old_priority: Any = self._entries[position][0]
+        self._entries[position][0] = priority
+        if priority < old_priority:
+            self._sift_up(position)
+        elif old_priority < priority:
+            self._sift_down(position)
+
+    def peek(self) -> Tuple[Hashable, Any]:
+        """The key with the lowest priority, and its priority."""
+        if not self._entries:
+            raise IndexError("peek at an empty heap")
+        priority, _, key = self._entries[0]
+        return key, priority
+
+    def pop(self) -> Tuple[Hashable, Any]:
+        """Remove and return the key with the lowest priority, and its priority."""
+        if not self._entries:
+            raise IndexError("pop from an empty heap")
+        key, priority = self.peek()
+        self.remove(key)
+        return key, priority
+
+    def remove(self, key: Hashable) -> Any:
+        """Remove a key from the heap, and return its priority."""
+        position: int = self._positions.pop(key)
+        entry: List[Any] = self._entries[position]
+        last: List[Any] = self._entries.pop()
+        if position < len(self._entries):
+            self._entries[position] = last
+            self._positions[last[2]] = position
+            # The moved entry may belong above or below its new position.
+            self._sift_up(position)
+            self._sift_down(self._positions[last[2]])
+        return entry[0]
+
+    def _swap(self, i: int, j: int) -> None:
+        entries: List[List[Any]] = self._entries
+        entries[i], entries[j] = entries[j], entries[i]
+        self._positions[entries[i][2]] = i
+        self._positions[entries[j][2]] = j
+
+    def _sift_up(self, position: int) -> None:
+        entries: List[List[Any]] = self._entries
+        while position > 0:
+            parent: int = (position - 1) >> 1
+            if not entries[position] < entries[parent]:
+                break
+            self._swap(position, parent)
+            position = parent
+
+    def _sift_down(self, position: int) -> None:
+        entries: List[List[Any]] = self._entries
+        size: int = len(entries)
+        while True:
+            smallest: int = position
+            for child in (2 * position + 1, 2 * position + 2):
+                if child < size and entries[child] < entries[smallest]:
+                    smallest = child
+            if smallest == position:
+                break
+            self._swap(position, smallest)
+            position = smallest
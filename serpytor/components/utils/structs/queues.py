@@ -1,5 +1,16 @@
-from queue import Queue
-from typing import Any, Dict, Iterable, List, Optional
+import multiprocessing as mp
+import pickle
+import struct
+import time
+from multiprocessing.shared_memory import SharedMemory
+from queue import Empty, Full, Queue
+from typing import Any, Dict, Iterable, List, Optional, Union
+
+# head and tail (in bytes, they only grow), number of records, and number of processes
+# waiting to get and to put, then the ring buffer.
+_HEADER: struct.Struct = struct.Struct("<QQQII")
+_DATA_OFFSET: int = 64
+_LENGTH: struct.Struct = struct.Struct("<I")
 
 
 class TasksQueue:
@@ -9,26 +20,257 @@ class TasksQueue:
 
     def __init__(
         self,
-        queue: Iterable[Any],
+        queue: Optional[Iterable[Any]] = None,
         queue_maxsize: Optional[int] = 0,
         # algorithm: Optional[BaseAllocation] = FCFSAllocation,
         *args: List[Any],
         **kwargs: Dict[str, Any]
     ) -> None:
         self._task_queue: Queue = Queue(maxsize=queue_maxsize)
-        self._queue = queue
         # self.algorithm = algorithm(
         #     kwargs.get("algorithm_args", []), kwargs.get("algorithm_kwargs", {})
         # )
+        if queue is not None:
+            self.put(queue)
+
+    def __len__(self) -> int:
+        return self._task_queue.qsize()
 
     def put(
         self, item: Optional[Any], *args: List[Any], **kwargs: Dict[str, Any]
-    ) -> Iterable[Any]:
-        if hasattr(item, "__iter__"):
+    ) -> None:
+        if hasattr(item, "__iter__") and not isinstance(item, (str, bytes, bytearray)):
             for i in item:
-                self._queue.put_nowait(i)
+                self._task_queue.put_nowait(i)
         else:
-            self._queue.put_nowait(item)
+            self._task_queue.put_nowait(item)
+
+    def pop(self) -> Any:
+        return self._task_queue.get_nowait()
+
+
+class SharedMemoryQueue:
+    """FIFO queue between local processes, over a `multiprocessing.shared_memory` ring buffer.
+
+    Items are written to and read from the shared memory directly, instead of going
+    through a pipe and a feeder thread as with `multiprocessing.Queue`. Each of them is a
+    record: a 4-byte length, then its pickle, or the bytes themselves if `raw` is set.
+    Records are packed one after the other and wrap around the end of the buffer, or take
+    a fixed `slot_size` each if one is given (records larger than a slot are refused).
+
+    One lock guards the head and tail of the ring, with two conditions on it to wait for
+    records or for free space, only notified when a process waits on them. A blocking get
+    yields the CPU up to `spin` times before it waits, as items are often about to come.
+    `put_many` and `get_many` move a whole batch under a single acquisition of the lock.
+    Like `queue.Queue`, `put` and `get` block by default (with an optional `timeout`), and
+    raise `queue.Full` and `queue.Empty` when they can't block.
+
+    The queue is created in the parent process and passed to the children as an argument
+    of their `Process`. The parent owns the shared memory: it should `close` and `unlink`
+    it once the children are done.
+
+    Example usage:
+
+    ```python
+    tasks = SharedMemoryQueue(capacity=1 << 20)
+    worker = mp.Process(target=consume, args=(tasks,))
+    worker.start()
+    tasks.put_many([(square, [idx], {}) for idx in range(100)])
+    ...
+    tasks.close()
+    tasks.unlink()
+    ```
+    """
+
+    def __init__(
+        self,
+        capacity: Optional[int] = 1 << 20,
+        slot_size: Optional[int] = 0,
+        raw: Optional[bool] = False,
+        spin: Optional[int] = 100,
+        context: Optional[Any] = None,
+    ) -> None:
+        if slot_size:
+            if slot_size <= _LENGTH.size:
+                raise ValueError(f"Slots must be larger than {_LENGTH.size} bytes.")
+            capacity -= capacity % slot_size
+        if capacity <= 0:
+            raise ValueError("The capacity of the queue must be positive.")
+        context = context or mp.get_context()
+        self.capacity: int = capacity
+        self.slot_size: int = slot_size
+        self.raw: bool = raw
+        self.spin: int = spin
+        self._shm: SharedMemory = SharedMemory(create=True, size=_DATA_OFFSET + capacity)
+        self._buf: memoryview = self._shm.buf
+        _HEADER.pack_into(self._buf, 0, 0, 0, 0, 0, 0)
+        self._lock = context.Lock()
+        self._not_empty = context.Condition(self._lock)
+        self._not_full = context.Condition(self._lock)
+
+    def __repr__(self) -> str:
+        return f"{self.__class__.__name__}({self.name}, {self.qsize()} items)"
+
+    def __getstate__(self) -> Dict[str, Any]:
+        state: Dict[str, Any] = dict(self.__dict__)
+        state["_shm"] = self._shm.name
+        del state["_buf"]
+        return state
+
+    def __setstate__(self, state: Dict[str, Any]) -> None:
+        self.__dict__.update(state)
+        self._shm = SharedMemory(name=state["_shm"])
+        self._buf = self._shm.buf
+
+    @property
+    def name(self) -> str:
+        return self._shm.name
+
+    def qsize(self) -> int:
+        return _HEADER.unpack_from(self._buf, 0)[2]
+
+    def empty(self) -> bool:
+        return self.qsize() == 0
+
+    def _footprint(self, length: int) -> int:
+        return self.slot_size or _LENGTH.size + length
+
+    def _encode(self, item: Any) -> Union[bytes, memoryview]:
+        data: Union[bytes, memoryview] = (
+            memoryview(item).cast("B") if self.raw else pickle.dumps(item, protocol=5)
+        )
+        footprint: int = _LENGTH.size + len(data)
+        if footprint > (self.slot_size or self.capacity):
+            raise ValueError(
+                f"An item of {len(data)} bytes doesn't fit in {self.slot_size or self.capacity} bytes."
+            )
+        return data
+
+    def _write(self, position: int, data: Union[bytes, memoryview]) -> None:
+        position %= self.capacity
+        first: int = min(len(data), self.capacity - position)
+        start: int = _DATA_OFFSET + position
+        self._buf[start:start + first] = data[:first]
+        if first < len(data):
+            self._buf[_DATA_OFFSET:_DATA_OFFSET + len(data) - first] = data[first:]
+
+    def _read(self, position: int, length: int) -> bytes:
+        position %= self.capacity
+        first: int = min(length, self.capacity - position)
+        start: int = _DATA_OFFSET + position
+        data: bytes = bytes(self._buf[start:start + first])
+        if first < length:
+            data += bytes(self._buf[_DATA_OFFSET:_DATA_OFFSET + length - first])
+        return data
+
+    def _wait(self, condition: Any, field: int, predicate: Any, timeout: Optional[float]) -> bool:
+        """Wait on `condition`, counted in the `field` of the header while at it."""
+        header: List[int] = list(_HEADER.unpack_from(self._buf, 0))
+        header[field] += 1
+        _HEADER.pack_into(self._buf, 0, *header)
+        try:
+            return condition.wait_for(predicate, timeout)
+        finally:
+            header = list(_HEADER.unpack_from(self._buf, 0))
+            header[field] -= 1
+            _HEADER.pack_into(self._buf, 0, *header)
+
+    def put_many(
+        self, items: Iterable[Any], block: bool = True, timeout: Optional[float] = None
+    ) -> None:
+        """Put all the items at once, waiting for the room to fit them all."""
+        records: List[Union[bytes, memoryview]] = [self._encode(item) for item in items]
+        needed: int = sum(self._footprint(len(record)) for record in records)
+        if needed > self.capacity:
+            raise ValueError(f"{needed} bytes of items don't fit in {self.capacity} bytes.")
+        if not records:
+            return
+        buf: memoryview = self._buf
+        with self._lock:
+            head, tail, count, getters, putters = _HEADER.unpack_from(buf, 0)
+            if self.capacity - (tail - head) < needed:
+                if not block or not self._wait(
+                    self._not_full, 4, lambda: self._free() >= needed, timeout
+                ):
+                    raise Full()
+                head, tail, count, getters, putters = _HEADER.unpack_from(buf, 0)
+            for record in records:
+                length: int = len(record)
+                position: int = tail % self.capacity
+                if position + _LENGTH.size + length <= self.capacity:
+                    start: int = _DATA_OFFSET + position
+                    _LENGTH.pack_into(buf, start, length)
+                    buf[start + _LENGTH.size:start + _LENGTH.size + length] = record
+                else:
+                    self._write(tail, _LENGTH.pack(length))
+                    self._write(tail + _LENGTH.size, record)
+                tail += self.slot_size or _LENGTH.size + length
+            _HEADER.pack_into(buf, 0, head, tail, count + len(records), getters, putters)
+            if getters:
+                self._not_empty.notify(len(records))
+
+    def _free(self) -> int:
+        head, tail = _HEADER.unpack_from(self._buf, 0)[:2]
+        return self.capacity - (tail - head)
+
+    def get_many(
+        self,
+        max_items: Optional[int] = None,
+        block: bool = True,
+        timeout: Optional[float] = None,
+    ) -> List[Any]:
+        """Take up to `max_items` items (all of them by default), waiting for at least one."""
+        records: List[bytes] = []
+        buf: memoryview = self._buf
+        if block:
+            # Waiting on the condition costs a few system calls on both sides: give the
+            # producers a chance first.
+            for _ in range(self.spin):
+                if _HEADER.unpack_from(buf, 0)[2]:
+                    break
+                time.sleep(0)
+        with self._lock:
+            head, tail, count, getters, putters = _HEADER.unpack_from(buf, 0)
+            if count == 0:
+                if not block or not self._wait(
+                    self._not_empty, 3, lambda: self.qsize() > 0, timeout
+                ):
+                    raise Empty()
+                head, tail, count, getters, putters = _HEADER.unpack_from(buf, 0)
+            for _ in range(count if max_items is None else min(max_items, count)):
+                position: int = head % self.capacity
+                if position + _LENGTH.size <= self.capacity:
+                    (length,) = _LENGTH.unpack_from(buf, _DATA_OFFSET + position)
+                else:
+                    (length,) = _LENGTH.unpack(self._read(head, _LENGTH.size))
+                start: int = _DATA_OFFSET + position + _LENGTH.size
+                if position + _LENGTH.size + length <= self.capacity:
+                    records.append(bytes(buf[start:start + length]))
+                else:
+                    records.append(self._read(head + _LENGTH.size, length))
+                head += self.slot_size or _LENGTH.size + length
+            _HEADER.pack_into(buf, 0, head, tail, count - len(records), getters, putters)
+            if putters:
+                self._not_full.notify_all()
+        return records if self.raw else [pickle.loads(record) for record in records]
+
+    def put(self, item: Any, block: bool = True, timeout: Optional[float] = None) -> None:
+        self.put_many([item], block, timeout)
+
+    def get(self, block: bool = True, timeout: Optional[float] = None) -> Any:
+        return self.get_many(1, block, timeout)[0]
+
+    def put_nowait(self, item: Any) -> None:
+        self.put(item, block=False)
+
+    def get_nowait(self) -> Any:
+        return self.get(block=False)
+
+    def close(self) -> None:
+        """Detach from the shared memory, in this process."""
+        self._buf = None
+        self._shm.close()
 
-    def pop(self):
-        return self._queue.get_nowait()
+    def unlink(self) -> None:
+        """Free the shared memory, once every process is done with it."""
+        self._shm.unlink()
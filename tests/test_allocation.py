@@ -0,0 +1,308 @@
+import random
+import threading
+from queue import Empty, Full
+
+import pytest
+
+from serpytor.components.utils.algorithms.allocation import (
+    AdmissionError, BinPackingAllocation, DeadlineAllocation,
+    FairResourceAllocation, PriorityAllocation, RoundRobinAllocation,
+    WorkStealingAllocation)
+from serpytor.components.utils.algorithms.allocation.base_allocation import \
+    BaseAllocation
+from serpytor.components.utils.structs.heaps import IndexedHeap
+
+
+def test_base_allocation() -> None:
+    allocation = BaseAllocation(num_queues=2, max_size=4)
+    allocation.put("task", index=0)
+    allocation.put([b"a", b"b"], index=0)
+    assert list(allocation.peek(0, upper_limit=-1)) == ["task", b"a", b"b"]
+    assert list(allocation.peek(0, lower_limit=1, upper_limit=2)) == [b"a"]
+    assert str(allocation) == "BaseAllocation(3 items)"
+
+    # A batch that doesn't fit isn't put at all.
+    with pytest.raises(Full):
+        allocation.put([1, 2], index=0)
+    allocation.put([1, 2, 3, 4], index=1)
+    assert len(allocation) == 7
+    assert allocation.add_queue() == 2
+
+
+def test_sharded_puts() -> None:
+    allocation = BaseAllocation(num_queues=4)
+
+    def produce(producer: int) -> None:
+        for idx in range(500):
+            allocation.put(f"{producer}/{idx}")
+        allocation.put([f"{producer}/{idx}" for idx in range(500, 1000)])
+
+    threads = [threading.Thread(target=produce, args=(producer,)) for producer in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    items = [
+        tuple(map(int, item.split("/")))
+        for silo in allocation.queue_silo
+        for item in silo.queue
+    ]
+    assert sorted(items) == [(producer, idx) for producer in range(8) for idx in range(1000)]
+    # The producers are spread over the queues: two each.
+    assert [silo.qsize() for silo in allocation.queue_silo] == [2000] * 4
+    # Every producer sticks to one queue, in order.
+    for silo in allocation.queue_silo:
+        owners = [tuple(map(int, item.split("/"))) for item in silo.queue]
+        for producer in {producer for producer, _ in owners}:
+            assert [idx for owner, idx in owners if owner == producer] == list(range(1000))
+
+
+def test_indexed_heap() -> None:
+    rng = random.Random(0)
+    heap = IndexedHeap()
+    reference = {}
+    for step in range(2000):
+        key = rng.randrange(100)
+        action = rng.random()
+        if action < 0.6:
+            priority = rng.random()
+            heap.push(key, priority)
+            reference[key] = priority
+        elif action < 0.8 and key in reference:
+            assert heap.remove(key) == reference.pop(key)
+        elif reference:
+            key, priority = heap.pop()
+            assert priority == min(reference.values())
+            assert reference.pop(key) == priority
+        assert len(heap) == len(reference)
+        assert all(key in heap for key in reference)
+
+    assert [heap.pop()[1] for _ in range(len(heap))] == sorted(reference.values())
+
+
+def test_priority_allocation() -> None:
+    allocation = PriorityAllocation(sortable_fields=["cpu", "-memory"])
+    allocation.put(
+        {
+            "a": {"cpu": 35.0, "memory": 40.0},
+            "b": {"cpu": 12.5, "memory": 70.0},
+            "c": {"cpu": 12.5, "memory": 90.0},
+            "d": {"memory": 10.0},
+        }
+    )
+    # Lowest CPU, then highest memory. Missing fields rank last.
+    assert allocation.queue() == "c"
+    assert allocation.queue() == "c"
+
+    # New vitals move the resources around.
+    allocation.put({"c": {"cpu": 95.0, "memory": 90.0}})
+    assert allocation.queue() == "b"
+
+    # Other criteria, as passed by the Gateway.
+    assert allocation.queue(selection_criteria="memory") == "d"
+    allocation.put({"d": {"cpu": 1.0, "memory": 99.0}})
+    assert allocation.queue(selection_criteria="memory") == "a"
+    assert allocation.queue() == "d"
+
+    assert [allocation.pop() for _ in range(4)] == ["d", "b", "a", "c"]
+
+
+def test_nested_fields() -> None:
+    allocation = PriorityAllocation(sortable_fields="windows.10s.cpu")
+    allocation.put(
+        {
+            "a": {"cpu": 90.0, "windows": {"10s": {"cpu": 10.0}}},
+            "b": {"cpu": 5.0, "windows": {"10s": {"cpu": 60.0}}},
+        }
+    )
+
+    assert allocation.queue() == "a"
+    assert allocation.queue(selection_criteria="cpu") == "b"
+
+
+def test_round_robin_allocation() -> None:
+    allocation = RoundRobinAllocation(num_queues=3, weights=[5, 1, 1])
+    for index, name in enumerate("abc"):
+        allocation.put([name] * 10, index=index)
+    assert "".join(allocation.queue() for _ in range(14)) == "aabacaa" * 2
+
+    # Empty queues lose their turns, and weight 0 pauses a queue.
+    allocation.set_weight(2, 0)
+    served = "".join(allocation.queue() for _ in range(8))
+    assert "c" not in served and served.count("b") == 8 - served.count("a")
+    with pytest.raises(Empty):
+        while True:
+            assert allocation.queue() != "c"
+
+
+def test_fair_resource_allocation() -> None:
+    allocation = FairResourceAllocation()
+    # 90 points of CPU and 180 of memory free, as in the example of the DRF paper.
+    allocation.put({"r1": {"cpu": 10.0, "memory": 10.0}, "r2": {"cpu": 100.0, "memory": 10.0}})
+    # C comes first, with nothing allocated, but its task never fits.
+    allocation.put("c0", index="C", demand={"cpu": 1000.0})
+    for idx in range(10):
+        allocation.put(f"a{idx}", index="A", demand={"cpu": 10.0, "memory": 40.0})
+        allocation.put(f"b{idx}", index="B", demand={"cpu": 30.0, "memory": 10.0})
+
+    served = []
+    while (allocated := allocation.queue()) is not None:
+        served.append(allocated)
+    # A (memory-bound) runs 3 tasks and B (CPU-bound) 2, at equal dominant shares.
+    assert [tenant for tenant, _, _ in served].count("A") == 3
+    assert [tenant for tenant, _, _ in served].count("B") == 2
+    assert allocation.dominant_share("A") == pytest.approx(2 / 3)
+    assert allocation.dominant_share("B") == pytest.approx(2 / 3)
+
+    # The tenant with the lowest share gets what is given back.
+    allocation.release("B", {"cpu": 30.0, "memory": 10.0})
+    tenant, task, demand = allocation.queue()
+    assert (tenant, task) == ("B", "b2")
+    assert allocation.queue() is None
+    assert "C" in allocation.shares
+
+
+def test_work_stealing_allocation() -> None:
+    allocation = WorkStealingAllocation(num_workers=2)
+    allocation.put(range(10), index=0)
+    # The owner takes its newest task, a thief the oldest half of the others.
+    assert allocation.queue(worker=0) == 9
+    assert allocation.queue(worker=1) == 0
+    assert list(allocation.worker_deque(1)) == [3, 2, 1]
+    assert allocation.queue(worker=1) == 1
+    assert allocation.steals == [0, 1]
+
+    # Every task is taken once, with the workers racing for them.
+    allocation = WorkStealingAllocation(num_workers=4, max_steal=8)
+    allocation.put(range(20000), index=0)
+    taken = [[] for _ in range(4)]
+
+    def work(worker: int) -> None:
+        while True:
+            try:
+                task = allocation.queue(worker=worker)
+            except Empty:
+                return
+            taken[worker].append(task)
+            if task % 7 == 0:
+                allocation.put(-task - 1, index=worker)
+
+    threads = [threading.Thread(target=work, args=(worker,)) for worker in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    spawned = [-task - 1 for task in range(0, 20000, 7)]
+    assert sorted(task for tasks in taken for task in tasks) == sorted(
+        list(range(20000)) + spawned
+    )
+    assert len(allocation) == 0
+
+
+def test_deadline_allocation() -> None:
+    now = [100.0]
+    allocation = DeadlineAllocation(policy="edf", workers=2, admission=True, clock=lambda: now[0])
+    allocation.estimator.record("batch", 2.0)
+    allocation.estimator.record("query", 0.5)
+
+    allocation.put("backfill", digest="batch")
+    allocation.put("late", digest="query", deadline=110.0)
+    allocation.put("soon", digest="query", timeout=1.0)
+    # One worker runs "soon" then "late", the other "nightly".
+    allocation.put("nightly", digest="batch", timeout=2.5)
+    with pytest.raises(AdmissionError):
+        allocation.put("hourly", digest="batch", timeout=1.5)
+    # "hourly" would go first, pushing "nightly" to 102.5 on the first worker.
+    allocation.put("hourly", digest="batch", timeout=2.0)
+    with pytest.raises(AdmissionError):
+        allocation.put("daily", digest="query", timeout=1.9)
+
+    assert [allocation.queue()[1] for _ in range(5)] == [
+        "soon", "hourly", "nightly", "late", "backfill"
+    ]
+    assert allocation.queue() is None
+
+    # Completed tasks teach the estimator.
+    now[0] += 1.0
+    allocation.complete(0)
+    assert allocation.estimator.estimate("batch") == pytest.approx(2.0 - 0.2 * 1.0)
+    allocation.complete(1, runtime=0.25)
+    assert allocation.estimator.estimate("query") == pytest.approx(0.45)
+
+    sept = DeadlineAllocation(policy="sept")
+    sept.estimator.record("batch", 4.0)
+    sept.estimator.record("query", 0.5)
+    sept.put("backfill", digest="batch", timeout=1.0)
+    sept.put("lookup", digest="query")
+    ticket = sept.put("urgent", digest="query", timeout=5.0)
+    assert sept.remove(ticket) == "urgent"
+    assert [sept.queue()[1] for _ in range(2)] == ["lookup", "backfill"]
+
+    # SEPT admission follows the SEPT order: shorter tasks go first, even without deadline.
+    sept = DeadlineAllocation(policy="sept", admission=True, clock=lambda: 0.0)
+    sept.estimator.record("long", 1.0)
+    sept.estimator.record("short", 0.1)
+    for _ in range(5):
+        sept.put("lookup", digest="short")
+    with pytest.raises(AdmissionError):
+        sept.put("report", digest="long", timeout=1.2)
+    sept.put("report", digest="long", timeout=1.6)
+    # One more short task delays "report" to 1.6, a second one would make it late.
+    sept.put("lookup", digest="short", timeout=1.0)
+    with pytest.raises(AdmissionError):
+        sept.put("lookup", digest="short", timeout=1.0)
+
+    # Abandoned tasks are forgotten, and don't teach the estimator.
+    ticket, _ = sept.queue()
+    sept.abandon(ticket)
+    assert ticket not in sept.running
+    assert sept.estimator.samples == {"long": 1, "short": 1}
+
+
+def test_bin_packing_allocation() -> None:
+    now = [0.0]
+    allocation = BinPackingAllocation(settle_time=5.0, clock=lambda: now[0])
+    allocation.put({"a": {"cpu": 50.0, "memory": 0.0}, "b": {"cpu": 0.0, "memory": 0.0}})
+    allocation.put("small", demand={"cpu": 20.0, "memory": 20.0})
+    allocation.put("large", demand={"cpu": 70.0, "memory": 10.0})
+    allocation.put("medium", demand={"cpu": 40.0, "memory": 60.0})
+    allocation.put("huge", demand={"cpu": 10.0, "memory": 95.0})
+
+    # Largest first, each where it leaves the least room: "medium" doesn't fit any more.
+    assert allocation.place() == [
+        ("huge", "a", {"cpu": 10.0, "memory": 95.0}),
+        ("large", "b", {"cpu": 70.0, "memory": 10.0}),
+        ("small", "b", {"cpu": 20.0, "memory": 20.0}),
+    ]
+    assert allocation.free["a"] == {"cpu": 40.0, "memory": 5.0}
+    assert allocation.free["b"] == {"cpu": 10.0, "memory": 70.0}
+    assert allocation.queue() is None
+
+    allocation.release("b", {"cpu": 70.0, "memory": 10.0})
+    assert allocation.queue() == ("medium", "b", {"cpu": 40.0, "memory": 60.0})
+    assert len(allocation) == 0
+
+    # Vitals that may predate the last placements don't free what they hold.
+    allocation.put({"a": {"cpu": 0.0, "memory": 0.0}})
+    assert allocation.free["a"] == {"cpu": 90.0, "memory": 5.0}
+
+    # Once the vitals account for them, new vitals replace what was free.
+    now[0] = 10.0
+    allocation.put({"a": {"cpu": 95.0, "memory": 95.0}})
+    assert allocation.free["a"] == {"cpu": 5.0, "memory": 5.0}
+    allocation.put("task")
+    assert allocation.queue() == ("task", "a", {"cpu": 1.0, "memory": 1.0})
+
+
+if __name__ == "__main__":
+    test_base_allocation()
+    test_sharded_puts()
+    test_indexed_heap()
+    test_priority_allocation()
+    test_nested_fields()
+    test_round_robin_allocation()
+    test_fair_resource_allocation()
+    test_work_stealing_allocation()
+    test_deadline_allocation()
+    test_bin_packing_allocation()
@@ -0,0 +1,107 @@
+import asyncio
+import time
+
+from serpytor.components.connection.monitor.autoscaler import (LocalAutoscaler,
+                                                               ScalingPolicy)
+from serpytor.components.connection.monitor.gateway import Gateway
+from serpytor.components.utils.algorithms.allocation import FCFSAllocation
+
+PORTS = range(8860, 8863)
+
+
+def square(x):
+    return x * x
+
+
+def test_scaling_policy() -> None:
+    now = [0.0]
+    policy = ScalingPolicy(
+        min_servers=1,
+        max_servers=4,
+        target_load=4.0,
+        target_latency=0.5,
+        max_step=2,
+        scale_up_cooldown=5.0,
+        scale_down_delay=10.0,
+        clock=lambda: now[0],
+    )
+
+    assert policy.desired(0, 0.0) == 1
+    # 20 tasks need 5 servers: 2 more at most, then wait for the cooldown.
+    assert policy.desired(1, 20.0) == 3
+    now[0] = 1.0
+    assert policy.desired(3, 20.0) == 3
+    now[0] = 6.0
+    assert policy.desired(3, 20.0) == 4
+    # Slow, but already at the maximum.
+    now[0] = 12.0
+    assert policy.desired(4, 8.0, latency=1.0) == 4
+
+    # Light load: one server less after 10 seconds of it, then another 10 seconds later.
+    assert policy.desired(4, 2.0, latency=0.1) == 4
+    now[0] = 21.0
+    assert policy.desired(4, 2.0, latency=0.1) == 4
+    now[0] = 22.0
+    assert policy.desired(4, 2.0, latency=0.1) == 3
+    now[0] = 25.0
+    assert policy.desired(3, 2.0, latency=0.1) == 3
+    # A busy moment resets the delay.
+    assert policy.desired(3, 12.0) == 3
+    now[0] = 33.0
+    assert policy.desired(3, 2.0) == 3
+    now[0] = 43.0
+    assert policy.desired(3, 2.0) == 2
+
+    # High latency grows the pool, whatever the load.
+    now[0] = 50.0
+    assert policy.desired(2, 0.0, latency=0.8) == 3
+
+
+def test_autoscaler_spawns_and_retires_servers() -> None:
+    async def scenario():
+        gateway = Gateway(
+            task=square,
+            allocation_algorithm=FCFSAllocation(),
+            routing_policy="p2c",
+            vitals_ttl=float("inf"),
+        )
+        autoscaler = LocalAutoscaler(
+            PORTS,
+            ScalingPolicy(min_servers=1, max_servers=2, scale_down_delay=0.0),
+            gateway=gateway,
+            heartbeat_offset=100,
+            interval=0.2,
+            stop_timeout=5.0,
+            server_kwargs={"exec_pool": "thread", "exec_workers": 2},
+        )
+        sizes = []
+        try:
+            await autoscaler.scale_to(2)
+            deadline = time.monotonic() + 20.0
+            while len(gateway._resource_addr) < 2 and time.monotonic() < deadline:
+                await autoscaler.poll()
+                await asyncio.sleep(0.1)
+            sizes.append(list(gateway._resource_addr))
+            output = await gateway.execute(task_args=[7])
+            # Idle: back to the minimum.
+            sizes.append(await autoscaler.step())
+            sizes.append(list(gateway._resource_addr))
+            processes = [autoscaler.servers[0].server.service_process]
+        finally:
+            await autoscaler.stop()
+            await gateway.close()
+        return sizes, output, processes, autoscaler
+
+    (ready, size, left), output, processes, autoscaler = asyncio.run(scenario())
+
+    assert ready == [f"http://127.0.0.1:{port}/exec" for port in PORTS[:2]]
+    assert output["output"] == 49
+    assert size == 1 and left == ready[:1]
+    assert autoscaler.scaled_up == 2 and autoscaler.scaled_down == 2
+    assert not autoscaler.servers
+    assert not any(process.is_alive() for process in processes)
+
+
+if __name__ == "__main__":
+    test_scaling_policy()
+    test_autoscaler_spawns_and_retires_servers()
@@ -0,0 +1,188 @@
+import asyncio
+import os
+import threading
+import time
+
+import aiohttp
+from aiohttp import web
+
+from serpytor.components.connection.monitor.execution import (
+    ExecutionPool, run_encoded_task)
+from serpytor.components.connection.monitor.serialization import (
+    CONTENT_TYPE, RETURN_TYPE_HEADER, FrameDecoder, dumps_bytes, loads)
+
+PORT = 8790
+
+
+def slow_square(x):
+    time.sleep(0.3)
+    return x * x
+
+
+def fail(x):
+    raise ValueError(f"bad input {x}")
+
+
+def die(x):
+    os._exit(1)
+
+
+def count_up_then_fail(n):
+    for idx in range(n):
+        yield idx
+    raise ValueError(f"stopped at {n}")
+
+
+def thread_names(n):
+    for _ in range(n):
+        yield threading.current_thread().name
+
+
+async def post_tasks(pool: ExecutionPool, count: int, task=slow_square, headers=None):
+    app = web.Application()
+    app.on_startup.append(pool.start)
+    app.on_cleanup.append(pool.stop)
+    app.add_routes([web.post("/exec", pool.handle)])
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, "127.0.0.1", PORT).start()
+
+    async def post(session: aiohttp.ClientSession, x: int):
+        async with session.post(
+            f"http://127.0.0.1:{PORT}/exec",
+            data=dumps_bytes((task, [x], {})),
+            headers={"Content-Type": CONTENT_TYPE, "Accept": CONTENT_TYPE, **(headers or {})},
+        ) as resp:
+            body = await resp.read()
+            return resp.status, resp.headers, body
+
+    try:
+        async with aiohttp.ClientSession() as session:
+            return await asyncio.gather(*[post(session, x) for x in range(count)])
+    finally:
+        await runner.cleanup()
+
+
+def test_run_encoded_task() -> None:
+    result = loads(run_encoded_task(dumps_bytes((lambda x: x + 1, [1], {}))))
+
+    assert result == {"message": "Sanity check passed.", "output": 2}
+
+
+def test_saturated_pool_rejects() -> None:
+    pool = ExecutionPool(mode="thread", workers=2, queue_size=0)
+
+    responses = asyncio.run(post_tasks(pool, 3))
+
+    statuses = sorted(status for status, _, _ in responses)
+    assert statuses == [200, 200, 429]
+    for status, headers, body in responses:
+        if status == 429:
+            assert int(headers["Retry-After"]) >= 1
+        else:
+            assert loads(body)["message"] == "Sanity check passed."
+
+
+def test_tasks_run_concurrently() -> None:
+    pool = ExecutionPool(mode="thread", workers=4, queue_size=0)
+
+    start_time = time.time()
+    responses = asyncio.run(post_tasks(pool, 4))
+
+    assert all(status == 200 for status, _, _ in responses)
+    assert time.time() - start_time < 1.0
+
+
+def test_process_pool() -> None:
+    pool = ExecutionPool(mode="process", workers=2, queue_size=2)
+
+    responses = asyncio.run(post_tasks(pool, 4))
+
+    assert [loads(body)["output"] for _, _, body in responses] == [0, 1, 4, 9]
+
+
+def test_failing_task_returns_error_payload() -> None:
+    for mode in ("process", "thread"):
+        pool = ExecutionPool(mode=mode, workers=2)
+
+        responses = asyncio.run(post_tasks(pool, 2, task=fail))
+
+        for status, _, body in responses:
+            assert status == 200
+            assert loads(body)["error"].startswith("ValueError: bad input")
+
+
+def test_broken_pool_is_replaced() -> None:
+    pool = ExecutionPool(mode="process", workers=2)
+
+    async def scenario():
+        app = web.Application()
+        app.on_startup.append(pool.start)
+        app.on_cleanup.append(pool.stop)
+        app.add_routes([web.post("/exec", pool.handle)])
+        runner = web.AppRunner(app)
+        await runner.setup()
+        await web.TCPSite(runner, "127.0.0.1", PORT).start()
+
+        async def post(session, task, x):
+            async with session.post(
+                f"http://127.0.0.1:{PORT}/exec",
+                data=dumps_bytes((task, [x], {})),
+                headers={"Content-Type": CONTENT_TYPE, "Accept": CONTENT_TYPE},
+            ) as resp:
+                return resp.status, await resp.read()
+
+        try:
+            async with aiohttp.ClientSession() as session:
+                died = await post(session, die, 0)
+                after = [await post(session, slow_square, x) for x in (2, 3)]
+        finally:
+            await runner.cleanup()
+        return died, after
+
+    (status, _), after = asyncio.run(scenario())
+
+    # The resource failed, not the task: a 503, and the next tasks run on a new pool.
+    assert status == 503
+    assert [(status, loads(body)["output"]) for status, body in after] == [(200, 4), (200, 9)]
+
+
+def test_stream() -> None:
+    pool = ExecutionPool(mode="process", workers=2)
+
+    responses = asyncio.run(
+        post_tasks(pool, 4, task=count_up_then_fail, headers={RETURN_TYPE_HEADER: "stream"})
+    )
+
+    for x, (status, headers, body) in enumerate(responses):
+        assert status == 200
+        assert headers[RETURN_TYPE_HEADER] == "stream"
+        # The partial results, then the error of the task, which raised halfway through.
+        assert FrameDecoder().feed(body) == [
+            *[{"output": idx} for idx in range(x)],
+            {"error": f"ValueError: stopped at {x}"},
+        ]
+
+    # A task raising before its first result gets a single error payload.
+    responses = asyncio.run(post_tasks(pool, 1, task=fail, headers={RETURN_TYPE_HEADER: "stream"}))
+    assert [loads(body)["error"] for _, _, body in responses] == ["ValueError: bad input 0"]
+
+    # The steps of a generator run in the pool, not in the loop's default executor.
+    responses = asyncio.run(
+        post_tasks(pool, 3, task=thread_names, headers={RETURN_TYPE_HEADER: "stream"})
+    )
+    names = [
+        message["output"] for _, _, body in responses for message in FrameDecoder().feed(body)
+    ]
+    assert len(names) == 3
+    assert not any(name.startswith("asyncio") for name in names)
+
+
+if __name__ == "__main__":
+    test_run_encoded_task()
+    test_saturated_pool_rejects()
+    test_tasks_run_concurrently()
+    test_process_pool()
+    test_failing_task_returns_error_payload()
+    test_broken_pool_is_replaced()
+    test_stream()
@@ -0,0 +1,96 @@
+import asyncio
+
+from serpytor.components.connection.monitor.failure_detector import \
+    PhiAccrualFailureDetector
+from serpytor.components.connection.monitor.gateway import Gateway
+from serpytor.components.utils.algorithms.allocation import FCFSAllocation
+
+
+class FakeClock:
+    def __init__(self) -> None:
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def test_states_and_transitions() -> None:
+    clock = FakeClock()
+    detector = PhiAccrualFailureDetector(clock=clock)
+    transitions = []
+    detector.subscribe(lambda node, old, new: transitions.append((node, old, new)))
+
+    for _ in range(20):
+        clock.now += 1.0
+        detector.heartbeat("a")
+    assert detector.check()["a"] == "alive"
+
+    # A heartbeat half an interval late is not a failure.
+    clock.now += 1.5
+    assert detector.check()["a"] == "alive"
+    assert detector.phi("a") < detector.suspect_threshold
+
+    # Silence: the node becomes suspect, then dead.
+    states = []
+    for _ in range(10):
+        clock.now += 0.25
+        states.append(detector.check()["a"])
+    assert "suspect" in states
+    assert states[-1] == "dead"
+    assert detector.phi("a") >= detector.dead_threshold
+
+    # Only a heartbeat brings it back.
+    detector.heartbeat("a")
+    assert detector.state("a") == "alive"
+    assert transitions == [
+        ("a", "alive", "suspect"),
+        ("a", "suspect", "dead"),
+        ("a", "dead", "alive"),
+    ]
+
+
+def test_jittery_node_gets_more_slack() -> None:
+    clock = FakeClock()
+    detector = PhiAccrualFailureDetector(clock=clock)
+    for idx in range(50):
+        clock.now += 1.0
+        detector.heartbeat("steady")
+    for idx in range(50):
+        clock.now += 0.5 if idx % 2 else 1.5
+        detector.heartbeat("jittery")
+
+    clock.now += 2.0
+    assert detector.phi("jittery") < detector.phi("steady")
+
+
+def test_gateway_skips_dead_resources() -> None:
+    heartbeats = [f"http://127.0.0.1:{5000 + idx}/heartbeat" for idx in range(3)]
+    resources = [f"http://127.0.0.1:{8100 + idx}/exec" for idx in range(3)]
+    clock = FakeClock()
+    detector = PhiAccrualFailureDetector(clock=clock)
+    for heartbeat in heartbeats:
+        detector.add_node(heartbeat)
+    gateway = Gateway(
+        lambda: None,
+        FCFSAllocation(),
+        heartbeat_addresses=heartbeats,
+        resource_addresses=resources,
+        routing_policy="p2c",
+        vitals_ttl=float("inf"),
+        failure_detector=detector,
+    )
+    gateway._router.update_vitals({resource: {"cpu": 0.0} for resource in resources})
+
+    clock.now += 10.0
+    detector.heartbeat(heartbeats[1])
+    detector.heartbeat(heartbeats[2])
+    detector.check()
+
+    picks = {asyncio.run(gateway.pick_resource()) for _ in range(50)}
+    assert resources[0] not in picks
+
+
+if __name__ == "__main__":
+    test_states_and_transitions()
+    test_jittery_node_gets_more_slack()
+    test_gateway_skips_dead_resources()
@@ -0,0 +1,295 @@
+import asyncio
+import time
+from collections import Counter
+
+import pytest
+from aiohttp import web
+
+from serpytor.components.connection.monitor.exceptions import \
+    RemoteExecutionError
+from serpytor.components.connection.monitor.execution import ExecutionPool
+from serpytor.components.connection.monitor.gateway import Gateway
+from serpytor.components.connection.monitor.quotas import Quota, QuotaManager
+from serpytor.components.utils.algorithms.allocation import (
+    FCFSAllocation, PriorityAllocation)
+
+WORKER_PORTS = [8800, 8801]
+UNREACHABLE = "http://127.0.0.1:8802/exec"
+WORKERS = [f"http://127.0.0.1:{port}/exec" for port in WORKER_PORTS]
+HEARTBEATS = [f"http://127.0.0.1:{port}/heartbeat" for port in WORKER_PORTS]
+
+
+def square(x):
+    return x * x
+
+
+def fail(x):
+    raise ValueError(f"bad input {x}")
+
+
+def count_up(n):
+    for idx in range(n):
+        yield idx
+
+
+def count_up_then_fail(n):
+    yield from count_up(n)
+    raise ValueError(f"stopped at {n}")
+
+
+async def run_workers(scenario, delays=None):
+    """Start the local workers, and run the scenario against them.
+
+    `delays` maps the ports of the workers to how long they wait before running a task.
+    """
+    requests = Counter()
+    delays = delays if delays is not None else {}
+    runners = []
+    for port in WORKER_PORTS:
+        pool = ExecutionPool(mode="thread", workers=4, queue_size=64)
+
+        async def exec_handler(request, pool=pool, port=port):
+            requests[port] += 1
+            await asyncio.sleep(delays.get(port, 0))
+            return await pool.handle(request)
+
+        async def heartbeat_handler(request, pool=pool):
+            return web.json_response({"cpu": 10.0, "memory": 10.0, "in_flight": pool.in_flight})
+
+        app = web.Application()
+        app.on_startup.append(pool.start)
+        app.on_cleanup.append(pool.stop)
+        app.add_routes(
+            [web.post("/exec", exec_handler), web.get("/heartbeat", heartbeat_handler)]
+        )
+        runner = web.AppRunner(app, shutdown_timeout=1.0)
+        await runner.setup()
+        await web.TCPSite(runner, "127.0.0.1", port).start()
+        runners.append(runner)
+    try:
+        return requests, await scenario()
+    finally:
+        for runner in runners:
+            await runner.cleanup()
+
+
+def make_gateway(resources, **kwargs) -> Gateway:
+    return Gateway(
+        task=square,
+        allocation_algorithm=FCFSAllocation(),
+        resource_addresses=resources,
+        **{
+            "heartbeat_addresses": [],
+            "routing_policy": "least_outstanding",
+            "vitals_ttl": float("inf"),
+            **kwargs,
+        },
+    )
+
+
+async def collect(results):
+    return [item async for item in results]
+
+
+def test_failing_task_is_neither_retried_nor_counted() -> None:
+    gateway = make_gateway(WORKERS, retries=2, failure_threshold=1)
+
+    async def scenario():
+        errors = []
+        for x in range(3):
+            with pytest.raises(RemoteExecutionError) as error:
+                await gateway.dispatch((fail, [x], {}))
+            errors.append(error.value.message)
+        result = await gateway.dispatch((square, [3], {}))
+        await gateway.close()
+        return errors, result
+
+    requests, (errors, result) = asyncio.run(run_workers(scenario))
+
+    assert errors == [f"ValueError: bad input {x}" for x in range(3)]
+    assert result["output"] == 9
+    assert sum(requests.values()) == 4
+    assert all(gateway.get_breaker(worker).state == "closed" for worker in WORKERS)
+
+
+def test_retry_skips_unreachable_resource() -> None:
+    gateway = make_gateway([UNREACHABLE] + WORKERS, retries=2, failure_threshold=1)
+
+    async def scenario():
+        results = [await gateway.dispatch((square, [x], {})) for x in range(5)]
+        await gateway.close()
+        return results
+
+    requests, results = asyncio.run(run_workers(scenario))
+
+    assert [result["output"] for result in results] == [x * x for x in range(5)]
+    assert sum(requests.values()) == 5
+    assert gateway.get_breaker(UNREACHABLE).state == "open"
+
+
+def test_unreachable_heartbeat_is_skipped() -> None:
+    gateway = make_gateway(
+        WORKERS + [UNREACHABLE],
+        heartbeat_addresses=HEARTBEATS + ["http://127.0.0.1:8802/heartbeat"],
+        vitals_ttl=0.0,
+        retries=2,
+        failure_threshold=1,
+    )
+
+    async def scenario():
+        report = await gateway.get_available_resources()
+        results = [await gateway.dispatch((square, [x], {})) for x in range(5)]
+        await gateway.close()
+        return report, results
+
+    _, (report, results) = asyncio.run(run_workers(scenario))
+
+    assert report[UNREACHABLE] == {}
+    assert all(report[worker]["cpu"] == 10.0 for worker in WORKERS)
+    assert [result["output"] for result in results] == [x * x for x in range(5)]
+    assert gateway.get_breaker(UNREACHABLE).state == "open"
+
+
+def test_hedged_request() -> None:
+    delays = {}
+    gateway = make_gateway(WORKERS, hedge_percentile=90)
+
+    async def scenario():
+        for x in range(20):
+            await gateway.dispatch((square, [x], {}))
+        # The first worker, picked first, becomes slow: the duplicate sent to the other
+        # one answers instead.
+        delays[WORKER_PORTS[0]] = 1.0
+        start_time = time.perf_counter()
+        result = await gateway.dispatch((square, [7], {}))
+        elapsed = time.perf_counter() - start_time
+        await gateway.close()
+        return result, elapsed
+
+    requests, (result, elapsed) = asyncio.run(run_workers(scenario, delays))
+
+    assert result["output"] == 49
+    assert elapsed < 0.5
+    assert sum(requests.values()) == 22
+
+
+def test_stream() -> None:
+    gateway = make_gateway(WORKERS, failure_threshold=1)
+
+    async def scenario():
+        results = [
+            item async for item in await gateway.execute_payload((count_up, [5], {}), "stream")
+        ]
+        partial_results = []
+        with pytest.raises(RemoteExecutionError) as error:
+            async for item in await gateway.execute_payload(
+                (count_up_then_fail, [3], {}), "stream"
+            ):
+                partial_results.append(item)
+        await gateway.close()
+        return results, partial_results, error.value.message
+
+    _, (results, partial_results, error) = asyncio.run(run_workers(scenario))
+
+    assert results == [0, 1, 2, 3, 4]
+    assert partial_results == [0, 1, 2]
+    assert error == "ValueError: stopped at 3"
+    # The task failed, not the resource.
+    assert all(gateway.get_breaker(worker).state == "closed" for worker in WORKERS)
+
+
+def test_abandoned_stream_releases_trial() -> None:
+    gateway = make_gateway(WORKERS[:1], failure_threshold=1, reset_timeout=0.0)
+    breaker = gateway.get_breaker(WORKERS[0])
+    breaker.record_failure()
+
+    async def scenario():
+        results = await gateway.execute_payload((count_up, [100], {}), "stream")
+        first = await results.__anext__()
+        # The trial request is in flight.
+        assert not breaker.is_available()
+        await results.aclose()
+        await gateway.close()
+        return first
+
+    _, first = asyncio.run(run_workers(scenario))
+
+    assert first == 0
+    assert breaker.is_available()
+
+
+def test_unstarted_stream_claims_no_trial() -> None:
+    gateway = make_gateway(WORKERS[:1], failure_threshold=1, reset_timeout=0.0)
+    breaker = gateway.get_breaker(WORKERS[0])
+    breaker.record_failure()
+
+    async def scenario():
+        results = await gateway.execute_payload((count_up, [3], {}), "stream")
+        await results.aclose()
+        # Nothing was sent: the trial request is still up for grabs.
+        assert breaker.is_available()
+        results = await gateway.execute_payload((count_up, [3], {}), "stream")
+        items = [item async for item in results]
+        await gateway.close()
+        return items
+
+    _, items = asyncio.run(run_workers(scenario))
+
+    assert items == [0, 1, 2]
+    assert breaker.state == "closed"
+
+
+def test_abandoned_streams_give_their_quota_slot_back() -> None:
+    quota = Quota(max_concurrency=1)
+    gateway = make_gateway(WORKERS, quotas=QuotaManager(task_types={"task": quota}))
+
+    async def scenario():
+        # Dropped before it started, and halfway through.
+        results = await gateway.execute_payload((count_up, [3], {}), "stream")
+        await results.aclose()
+        results = await gateway.execute_payload((count_up, [3], {}), "stream")
+        assert await results.__anext__() == 0
+        assert quota.in_flight == 1
+        await results.aclose()
+        assert quota.in_flight == 0
+        results = await gateway.execute_payload((count_up, [3], {}), "stream")
+        items = await asyncio.wait_for(collect(results), timeout=5.0)
+        await gateway.close()
+        return items
+
+    _, items = asyncio.run(run_workers(scenario))
+
+    assert items == [0, 1, 2]
+    assert quota.in_flight == 0
+
+
+def test_allocation_picks_on_its_own_fields() -> None:
+    gateway = Gateway(
+        task=square,
+        allocation_algorithm=PriorityAllocation(sortable_fields=["memory"]),
+        resource_addresses=WORKERS,
+        heartbeat_addresses=[],
+    )
+
+    async def get_available_resources():
+        return {
+            WORKERS[0]: {"cpu": 10.0, "memory": 90.0},
+            WORKERS[1]: {"cpu": 90.0, "memory": 10.0},
+        }
+
+    gateway.get_available_resources = get_available_resources
+
+    assert asyncio.run(gateway.allocate_resource()) == WORKERS[1]
+    assert asyncio.run(gateway.allocate_resource(selection_criteria="cpu")) == WORKERS[0]
+
+
+if __name__ == "__main__":
+    test_failing_task_is_neither_retried_nor_counted()
+    test_retry_skips_unreachable_resource()
+    test_unreachable_heartbeat_is_skipped()
+    test_hedged_request()
+    test_stream()
+    test_abandoned_stream_releases_trial()
+    test_unstarted_stream_claims_no_trial()
+    test_abandoned_streams_give_their_quota_slot_back()
+    test_allocation_picks_on_its_own_fields()
@@ -0,0 +1,197 @@
+import asyncio
+import time
+from collections import Counter
+
+import aiohttp
+from aiohttp import web
+
+from serpytor.components.connection.monitor.exceptions import \
+    RemoteExecutionError
+from serpytor.components.connection.monitor.execution import ExecutionPool
+from serpytor.components.connection.monitor.gateway import Gateway
+from serpytor.components.connection.monitor.gateway_server import GatewayServer
+from serpytor.components.connection.monitor.quotas import (TENANT_HEADER,
+                                                           Quota, QuotaManager)
+from serpytor.components.connection.monitor.serialization import (
+    CONTENT_TYPE, dumps_bytes, loads)
+from serpytor.components.utils.algorithms.allocation import FCFSAllocation
+
+PORT = 8796
+WORKER_PORTS = [8797, 8798]
+
+
+def square(x):
+    return x * x
+
+
+def slow_square(x):
+    time.sleep(0.2)
+    return x * x
+
+
+def fail(x):
+    raise ValueError(f"bad input {x}")
+
+
+def count_up(n):
+    for idx in range(n):
+        yield idx
+
+
+def count_up_then_fail(n):
+    yield from count_up(n)
+    raise ValueError(f"stopped at {n}")
+
+
+async def run_cluster(scenario, **kwargs):
+    """Start the stand-in workers and the gateway server, and run the scenario against them."""
+    requests = Counter()
+    runners = []
+    for port in WORKER_PORTS:
+        pool = ExecutionPool(mode="thread", workers=4, queue_size=64)
+
+        async def exec_handler(request, pool=pool, port=port):
+            requests[port] += 1
+            return await pool.handle(request)
+
+        app = web.Application()
+        app.on_startup.append(pool.start)
+        app.on_cleanup.append(pool.stop)
+        app.add_routes([web.post("/exec", exec_handler)])
+        runners.append(web.AppRunner(app))
+
+    gateway_server = GatewayServer(
+        resource_addresses=[f"http://127.0.0.1:{port}/exec" for port in WORKER_PORTS],
+        heartbeat_addresses=[f"http://127.0.0.1:{port}/heartbeat" for port in WORKER_PORTS],
+        **{"gateway_kwargs": {"vitals_ttl": float("inf")}, **kwargs},
+    )
+    app = web.Application()
+    app.add_routes(gateway_server.routes())
+    app.on_cleanup.append(gateway_server.close)
+    runners.append(web.AppRunner(app))
+
+    for runner, port in zip(runners, WORKER_PORTS + [PORT]):
+        await runner.setup()
+        await web.TCPSite(runner, "127.0.0.1", port).start()
+    try:
+        async with aiohttp.ClientSession() as session:
+            return gateway_server, requests, await scenario(session)
+    finally:
+        for runner in runners:
+            await runner.cleanup()
+
+
+async def submit(session, task, x):
+    async with session.post(
+        f"http://127.0.0.1:{PORT}/submit",
+        data=dumps_bytes((task, [x], {})),
+        headers={"Content-Type": CONTENT_TYPE, "Accept": CONTENT_TYPE},
+    ) as resp:
+        body = await resp.read()
+        return resp.status, loads(body) if resp.status == 200 else body
+
+
+def test_batching() -> None:
+    async def scenario(session):
+        return await asyncio.gather(*[submit(session, square, x) for x in range(50)])
+
+    gateway_server, requests, responses = asyncio.run(
+        run_cluster(scenario, max_batch_size=16, batch_delay=0.01)
+    )
+
+    assert [response["output"] for _, response in responses] == [
+        x * x for x in range(50)
+    ]
+    # Batches went to the workers, instead of one request per task.
+    assert gateway_server.batcher.items == 50
+    assert sum(requests.values()) == gateway_server.batcher.batches < 50
+
+
+def test_coalescing() -> None:
+    async def scenario(session):
+        return await asyncio.gather(*[submit(session, slow_square, 3) for _ in range(20)])
+
+    gateway_server, requests, responses = asyncio.run(run_cluster(scenario))
+
+    assert all(status == 200 and response["output"] == 9 for status, response in responses)
+    assert gateway_server.coalesced == 19
+    assert sum(requests.values()) == 1
+
+
+def test_failing_task_in_a_batch() -> None:
+    async def scenario(session):
+        return await asyncio.gather(
+            submit(session, square, 2), submit(session, fail, 1), submit(session, square, 3)
+        )
+
+    _, _, responses = asyncio.run(run_cluster(scenario, batch_delay=0.01))
+
+    assert [status for status, _ in responses] == [200, 500, 200]
+    assert b"bad input 1" in responses[1][1]
+
+
+def test_stream_relay() -> None:
+    async def scenario(session):
+        # A Gateway can use the gateway server as its resource.
+        gateway = Gateway(
+            task=count_up,
+            allocation_algorithm=FCFSAllocation(),
+            resource_addresses=[f"http://127.0.0.1:{PORT}/submit"],
+            routing_policy="p2c",
+            vitals_ttl=float("inf"),
+        )
+        try:
+            batch = await gateway.execute(task_args=[3])
+            stream = [item async for item in await gateway.execute("stream", task_args=[4])]
+            gateway.set_task(count_up_then_fail)
+            partial_stream, error = [], None
+            try:
+                async for item in await gateway.execute("stream", task_args=[2]):
+                    partial_stream.append(item)
+            except RemoteExecutionError as e:
+                error = e.message
+        finally:
+            await gateway.close()
+        return batch, stream, partial_stream, error
+
+    _, _, (batch, stream, partial_stream, error) = asyncio.run(run_cluster(scenario))
+
+    assert batch["output"] == [0, 1, 2]
+    assert stream == [0, 1, 2, 3]
+    # The error of a task raising halfway through is relayed after its partial results.
+    assert partial_stream == [0, 1]
+    assert "ValueError: stopped at 2" in error
+
+
+def test_tenant_quotas() -> None:
+    quotas = QuotaManager(default_tenant=Quota(max_concurrency=1), max_queued=1)
+
+    async def submit_as(session, tenant, x):
+        async with session.post(
+            f"http://127.0.0.1:{PORT}/submit",
+            data=dumps_bytes((slow_square, [x], {})),
+            headers={"Content-Type": CONTENT_TYPE, TENANT_HEADER: tenant},
+        ) as resp:
+            return resp.status
+
+    async def scenario(session):
+        return await asyncio.gather(
+            *[submit_as(session, "flood", x) for x in range(4)], submit_as(session, "other", 0)
+        )
+
+    _, _, statuses = asyncio.run(
+        run_cluster(scenario, gateway_kwargs={"vitals_ttl": float("inf"), "quotas": quotas})
+    )
+
+    # One running and one waiting, the others rejected: the other tenant is not held back.
+    assert sorted(statuses[:4]) == [200, 200, 429, 429]
+    assert statuses[4] == 200
+    assert quotas.rejected == 2
+
+
+if __name__ == "__main__":
+    test_batching()
+    test_coalescing()
+    test_failing_task_in_a_batch()
+    test_stream_relay()
+    test_tenant_quotas()
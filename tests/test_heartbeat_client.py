@@ -0,0 +1,71 @@
+import asyncio
+from collections import Counter
+
+from aiohttp import web
+
+from serpytor.components.connection.monitor.client import HeartbeatClient
+from serpytor.components.database.tsdb import TimeSeriesDB
+
+PORT = 8793
+
+
+class CountingHeartbeatClient(HeartbeatClient):
+    def __init__(self, *args, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        self.responses = Counter()
+        self.errors = []
+
+    def handle_response(self, destination, response) -> None:
+        self.responses[destination] += 1
+
+    def log_action(self, e) -> None:
+        self.errors.append(e)
+
+
+async def heartbeat(request: web.Request) -> web.Response:
+    return web.json_response({"cpu": 0.0, "memory": 0.0})
+
+
+async def run_client(client: HeartbeatClient, duration: float) -> None:
+    app = web.Application()
+    app.add_routes([web.get("/fast", heartbeat), web.get("/slow", heartbeat)])
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, "127.0.0.1", PORT).start()
+    try:
+        await asyncio.wait_for(client.run_heartbeats(), duration)
+    except asyncio.TimeoutError:
+        pass
+    finally:
+        await runner.cleanup()
+
+
+def test_per_destination_intervals(tmp_path) -> None:
+    fast = f"http://127.0.0.1:{PORT}/fast"
+    slow = f"http://127.0.0.1:{PORT}/slow"
+    dead = "http://127.0.0.1:9/heartbeat"
+    client = CountingHeartbeatClient(
+        destinations=[fast, slow, dead],
+        interval=0.5,
+        intervals={fast: 0.05},
+        timeout=0.5,
+        tsdb=TimeSeriesDB(str(tmp_path)),
+    )
+
+    asyncio.run(run_client(client, 1.2))
+
+    assert client.responses[fast] >= 10
+    assert 1 <= client.responses[slow] <= 3
+    # The dead destination is reported, and doesn't hold up the others.
+    assert client.errors
+    assert client.async_session.closed
+    # The heartbeats are recorded.
+    assert len(client.tsdb.query("cpu", fast, resolution="raw")["timestamps"]) == client.responses[fast]
+    assert client.tsdb.latest("cpu", dead) is None
+
+
+if __name__ == "__main__":
+    import tempfile
+
+    with tempfile.TemporaryDirectory() as path:
+        test_per_destination_intervals(path)
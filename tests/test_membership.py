@@ -0,0 +1,123 @@
+import asyncio
+import math
+
+from aiohttp import web
+
+from serpytor.components.connection.monitor.gateway import Gateway
+from serpytor.components.connection.monitor.membership import GossipMembership
+from serpytor.components.utils.algorithms.allocation import FCFSAllocation
+
+BASE_PORT = 8900
+NODES = 16
+INTERVAL = 0.05
+
+
+async def start_node(idx: int, seeds):
+    membership = GossipMembership(
+        f"http://127.0.0.1:{BASE_PORT + idx}",
+        resource=f"http://127.0.0.1:{BASE_PORT + 100 + idx}/exec",
+        seeds=seeds,
+        interval=INTERVAL,
+        suspect_timeout=5 * INTERVAL,
+    )
+    app = web.Application()
+    app.on_startup.append(membership.start)
+    app.on_cleanup.append(membership.stop)
+    app.add_routes(membership.routes())
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, "127.0.0.1", BASE_PORT + idx).start()
+    return membership, runner
+
+
+async def wait_for(condition, timeout: float = 10.0) -> None:
+    deadline = asyncio.get_running_loop().time() + timeout
+    while not condition():
+        assert asyncio.get_running_loop().time() < deadline, "Timed out."
+        await asyncio.sleep(INTERVAL / 2)
+
+
+async def run_cluster():
+    seed = f"http://127.0.0.1:{BASE_PORT}"
+    nodes = [await start_node(idx, [seed] if idx else []) for idx in range(NODES)]
+    memberships = [membership for membership, _ in nodes]
+    try:
+        # Every node learns about every other node.
+        await wait_for(
+            lambda: all(len(m.alive_members()) == NODES - 1 for m in memberships)
+        )
+        rounds = max(m.rounds for m in memberships)
+
+        # Gateways discover the resources from any member.
+        gateway = Gateway(
+            lambda: None,
+            FCFSAllocation(),
+            routing_policy="p2c",
+            discovery_seeds=[seed],
+        )
+        discovered = await gateway.discover_resources()
+        await gateway.close()
+
+        # A node that crashes is declared dead by everybody else.
+        crashed, crashed_runner = nodes.pop()
+        crashed._task.cancel()
+        await crashed._session.close()
+        crashed._session = None
+        await crashed_runner.cleanup()
+        await wait_for(
+            lambda: all(
+                m.members[crashed.address]["state"] == "dead" for m, _ in nodes
+            )
+        )
+
+        # A node that leaves tells the others.
+        leaving, leaving_runner = nodes.pop()
+        await leaving_runner.cleanup()
+        await wait_for(
+            lambda: all(
+                m.members[leaving.address]["state"] == "left" for m, _ in nodes
+            )
+        )
+        return rounds, discovered
+    finally:
+        for _, runner in nodes:
+            await runner.cleanup()
+
+
+def test_gossip_membership() -> None:
+    rounds, discovered = asyncio.run(run_cluster())
+
+    assert rounds <= 4 * math.ceil(math.log2(NODES)) + 4
+    assert sorted(discovered) == sorted(
+        f"http://127.0.0.1:{BASE_PORT + 100 + idx}/exec" for idx in range(NODES)
+    )
+
+
+def test_refutes_suspicion() -> None:
+    membership = GossipMembership("http://127.0.0.1:5000")
+    membership.merge(
+        [
+            {
+                "address": "http://127.0.0.1:5000",
+                "resource": None,
+                "state": "suspect",
+                "incarnation": 0,
+            }
+        ]
+    )
+    assert membership.incarnation == 1
+
+    transitions = []
+    membership.subscribe(lambda address, old, new: transitions.append((old, new)))
+    peer = {"address": "http://127.0.0.1:5001", "resource": None, "incarnation": 3}
+    membership.merge([{**peer, "state": "alive"}])
+    membership.merge([{**peer, "state": "suspect"}])
+    # Stale news don't override newer ones.
+    membership.merge([{**peer, "state": "dead", "incarnation": 2}])
+    membership.merge([{**peer, "state": "alive", "incarnation": 4}])
+    assert transitions == [(None, "alive"), ("alive", "suspect"), ("suspect", "alive")]
+
+
+if __name__ == "__main__":
+    test_gossip_membership()
+    test_refutes_suspicion()
@@ -0,0 +1,64 @@
+from serpytor.components.connection.monitor.metrics import (RollingMetrics,
+                                                            TaskMetrics)
+from serpytor.components.connection.monitor.routing import LoadAwareRouter
+
+
+def test_rolling_windows() -> None:
+    metrics = RollingMetrics(interval=1.0)
+    now = 1000.0
+    # A single spike in the last second, over a minute at 10% CPU.
+    for second in range(60, 0, -1):
+        metrics.record({"cpu": 10.0, "memory": 50.0}, timestamp=now - second)
+    metrics.record({"cpu": 100.0, "memory": 50.0}, timestamp=now)
+
+    windows = metrics.windows(now)
+
+    assert windows["1s"]["cpu"] == 100.0
+    assert windows["10s"]["cpu"] < 20.0
+    assert windows["60s"]["cpu"] < 12.0
+    assert windows["60s"]["memory"] == 50.0
+
+
+def test_ring_buffer_overwrites_old_samples() -> None:
+    metrics = RollingMetrics(horizon=10.0, interval=1.0)
+    for second in range(100):
+        metrics.record({"cpu": float(second)}, timestamp=float(second))
+
+    assert metrics.window(1000.0, now=99.0)["cpu"] == sum(range(89, 100)) / 11
+
+
+def test_task_metrics() -> None:
+    tasks = TaskMetrics(latency_capacity=4)
+    tasks.add_workers(2)
+    for _ in range(3):
+        tasks.task_started()
+    assert tasks.in_flight == 3
+    assert tasks.queue_depth == 1
+
+    for latency in (0.1, 0.2, 0.3, 0.4, 0.5, 0.6):
+        tasks.task_finished(latency)
+    assert tasks.in_flight == 0
+    assert sorted(tasks.latencies_since(0.0)) == [0.3, 0.4, 0.5, 0.6]
+
+    metrics = RollingMetrics(task_metrics=tasks)
+    window = metrics.window(10.0)
+    assert window["tasks"] == 4
+    assert window["latency_p50"] in (0.4, 0.5)
+    assert window["latency_p99"] == 0.6
+
+
+def test_router_uses_windowed_vitals() -> None:
+    router = LoadAwareRouter(["a", "b"])
+    router.update_vitals(
+        {"a": {"cpu": 100.0, "memory": 10.0, "windows": {"10s": {"cpu": 20.0}}}}
+    )
+
+    assert router.get_load("a").cpu == 20.0
+    assert router.get_load("a").memory == 10.0
+
+
+if __name__ == "__main__":
+    test_rolling_windows()
+    test_ring_buffer_overwrites_old_samples()
+    test_task_metrics()
+    test_router_uses_windowed_vitals()
@@ -0,0 +1,86 @@
+import multiprocessing as mp
+from queue import Empty, Full
+
+import pytest
+
+from serpytor.components.utils.structs.queues import (SharedMemoryQueue,
+                                                      TasksQueue)
+
+
+def echo(tasks: SharedMemoryQueue, results: SharedMemoryQueue) -> None:
+    while True:
+        for item in tasks.get_many(16):
+            if item is None:
+                return
+            results.put(item * 2)
+
+
+def test_tasks_queue() -> None:
+    tasks = TasksQueue([1, 2])
+    tasks.put("task")
+    tasks.put([3, 4])
+    assert len(tasks) == 5
+    assert [tasks.pop() for _ in range(5)] == [1, 2, "task", 3, 4]
+    with pytest.raises(Empty):
+        tasks.pop()
+
+
+def test_shared_memory_queue() -> None:
+    tasks = SharedMemoryQueue(capacity=64, raw=True)
+    try:
+        with pytest.raises(Empty):
+            tasks.get_nowait()
+        # Records wrap around the end of the buffer.
+        for size in range(20):
+            tasks.put_many([b"x" * size, bytes(range(size % 7))])
+            assert tasks.qsize() == 2
+            assert tasks.get_many() == [b"x" * size, bytes(range(size % 7))]
+
+        tasks.put(b"a" * 40)
+        with pytest.raises(Full):
+            tasks.put(b"b" * 20, timeout=0.01)
+        with pytest.raises(ValueError):
+            tasks.put(b"c" * 100)
+        assert tasks.get() == b"a" * 40
+    finally:
+        tasks.close()
+        tasks.unlink()
+
+    slots = SharedMemoryQueue(capacity=100, slot_size=32)
+    try:
+        assert slots.capacity == 96
+        slots.put_many([("a", 1), None, 3.5])
+        assert slots.get_many(2) == [("a", 1), None]
+        with pytest.raises(ValueError):
+            slots.put("x" * 40)
+        assert slots.get_nowait() == 3.5
+    finally:
+        slots.close()
+        slots.unlink()
+
+
+def test_shared_memory_queue_across_processes() -> None:
+    tasks = SharedMemoryQueue(capacity=1024)
+    results = SharedMemoryQueue(capacity=1 << 16)
+    worker = mp.Process(target=echo, args=(tasks, results))
+    worker.start()
+    try:
+        for start in range(0, 1000, 50):
+            tasks.put_many(range(start, start + 50))
+        tasks.put(None)
+        received = []
+        while len(received) < 1000:
+            received += results.get_many(timeout=10)
+        assert received == [idx * 2 for idx in range(1000)]
+        worker.join(10)
+        assert worker.exitcode == 0
+    finally:
+        for queue in (tasks, results):
+            queue.close()
+            queue.unlink()
+
+
+if __name__ == "__main__":
+    test_tasks_queue()
+    test_shared_memory_queue()
+    test_shared_memory_queue_across_processes()
@@ -0,0 +1,109 @@
+import asyncio
+import time
+
+import pytest
+
+from serpytor.components.connection.monitor.exceptions import \
+    QuotaExceededError
+from serpytor.components.connection.monitor.quotas import (Quota,
+                                                           QuotaManager,
+                                                           TokenBucket)
+
+
+def test_token_bucket() -> None:
+    now = [0.0]
+    bucket = TokenBucket(rate=10.0, burst=2.0, clock=lambda: now[0])
+
+    assert bucket.try_acquire() and bucket.try_acquire()
+    assert not bucket.try_acquire()
+    assert bucket.delay() == pytest.approx(0.1)
+
+    now[0] = 0.05
+    assert not bucket.try_acquire()
+    now[0] = 1.0
+    # Refilled up to the burst only.
+    assert bucket.try_acquire() and bucket.try_acquire()
+    assert not bucket.try_acquire()
+
+
+def test_tenants_take_turns() -> None:
+    quotas = QuotaManager(task_types={"task": Quota(max_concurrency=1)})
+    started = []
+
+    async def request(tenant, idx):
+        async with quotas.slot(tenant):
+            started.append(f"{tenant}{idx}")
+            await asyncio.sleep(0.001)
+
+    async def scenario():
+        await asyncio.gather(
+            *[request("a", idx) for idx in range(6)],
+            *[request("b", idx) for idx in range(2)],
+            *[request("c", idx) for idx in range(2)],
+        )
+
+    asyncio.run(scenario())
+
+    assert started == ["a0", "a1", "b0", "c0", "a2", "b1", "c1", "a3", "a4", "a5"]
+    assert quotas.task_types["task"].in_flight == 0
+    assert quotas.admitted == 10 and not quotas.waiting and not quotas.turns
+
+
+def test_rate_limits_and_rejections() -> None:
+    quotas = QuotaManager(
+        tenants={"limited": Quota(rate=50.0, burst=1.0)},
+        default_tenant=Quota(max_concurrency=1),
+        max_queued=2,
+    )
+
+    async def limited():
+        start = time.monotonic()
+        for _ in range(6):
+            async with quotas.slot("limited"):
+                pass
+        return time.monotonic() - start
+
+    async def crowded():
+        async def request():
+            async with quotas.slot("crowded"):
+                await asyncio.sleep(0.01)
+
+        return await asyncio.gather(*[request() for _ in range(5)], return_exceptions=True)
+
+    async def scenario():
+        return await asyncio.gather(limited(), crowded())
+
+    elapsed, results = asyncio.run(scenario())
+
+    # 5 requests beyond the burst, 20 ms apart.
+    assert elapsed >= 0.09
+    # One in flight, two waiting, the others rejected.
+    assert [isinstance(result, QuotaExceededError) for result in results] == [
+        False, False, False, True, True
+    ]
+    assert quotas.rejected == 2
+
+
+def test_cancelled_waiters_give_their_turn() -> None:
+    quotas = QuotaManager(default_tenant=Quota(max_concurrency=1))
+
+    async def scenario():
+        await quotas.acquire("a")
+        waiter = asyncio.ensure_future(quotas.acquire("a"))
+        await asyncio.sleep(0)
+        waiter.cancel()
+        await asyncio.sleep(0)
+        quotas.release("a")
+        await asyncio.wait_for(quotas.acquire("a"), timeout=1.0)
+        quotas.release("a")
+
+    asyncio.run(scenario())
+
+    assert quotas.tenants["a"].in_flight == 0
+
+
+if __name__ == "__main__":
+    test_token_bucket()
+    test_tenants_take_turns()
+    test_rate_limits_and_rejections()
+    test_cancelled_waiters_give_their_turn()
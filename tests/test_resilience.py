@@ -0,0 +1,56 @@
+import time
+
+import aiohttp
+
+from serpytor.components.connection.monitor.resilience import (CircuitBreaker,
+                                                               RetryPolicy)
+
+
+def test_circuit_breaker_opens_and_recovers() -> None:
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=0.05)
+
+    breaker.record_failure()
+    assert breaker.state == "closed"
+    breaker.record_failure()
+    assert breaker.state == "open"
+    assert not breaker.allow_request()
+
+    time.sleep(0.06)
+    assert breaker.state == "half_open"
+    assert breaker.allow_request()
+    # Only one trial request at a time.
+    assert not breaker.allow_request()
+
+    breaker.record_success()
+    assert breaker.state == "closed"
+
+
+def test_failed_trial_reopens_breaker() -> None:
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0.05)
+    breaker.record_failure()
+    time.sleep(0.06)
+
+    assert breaker.allow_request()
+    breaker.record_failure()
+
+    assert breaker.state == "open"
+
+
+def test_retry_policy() -> None:
+    policy = RetryPolicy(retries=3, base_delay=0.1, max_delay=0.3, seed=0)
+
+    assert all(0 <= policy.backoff(attempt) <= 0.3 for attempt in range(10))
+    assert policy.should_retry(aiohttp.ClientConnectionError())
+    assert policy.should_retry(
+        aiohttp.ClientResponseError(None, (), status=503)
+    )
+    assert not policy.should_retry(
+        aiohttp.ClientResponseError(None, (), status=400)
+    )
+    assert not policy.should_retry(ValueError())
+
+
+if __name__ == "__main__":
+    test_circuit_breaker_opens_and_recovers()
+    test_failed_trial_reopens_breaker()
+    test_retry_policy()
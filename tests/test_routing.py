@@ -0,0 +1,59 @@
+from collections import Counter
+
+from serpytor.components.connection.monitor.routing import LoadAwareRouter
+
+RESOURCES = [f"http://127.0.0.1:{8100 + idx}/exec" for idx in range(4)]
+
+
+def test_p2c_avoids_loaded_resource() -> None:
+    router = LoadAwareRouter(RESOURCES, policy="p2c", seed=0)
+    for _ in range(10):
+        router.acquire(RESOURCES[0])
+
+    picks = Counter(router.select() for _ in range(1000))
+
+    assert picks[RESOURCES[0]] == 0
+    assert set(picks) == set(RESOURCES[1:])
+
+
+def test_least_outstanding() -> None:
+    router = LoadAwareRouter(RESOURCES, policy="least_outstanding")
+    for resource in RESOURCES[:3]:
+        router.acquire(resource)
+
+    assert router.select() == RESOURCES[3]
+    assert router.select(exclude=[RESOURCES[3]]) in RESOURCES[:3]
+
+
+def test_latency_ewma_and_vitals() -> None:
+    router = LoadAwareRouter(RESOURCES[:2], ewma_alpha=0.5)
+
+    router.acquire(RESOURCES[0])
+    router.release(RESOURCES[0], latency=1.0)
+    router.acquire(RESOURCES[0])
+    router.release(RESOURCES[0], latency=2.0)
+    router.update_vitals({RESOURCES[1]: {"cpu": 100.0, "memory": 0.0}})
+
+    assert router.get_load(RESOURCES[0]).latency_ewma == 1.5
+    assert router.get_load(RESOURCES[0]).in_flight == 0
+    assert router.cost(RESOURCES[1]) > router.cost(RESOURCES[0])
+
+
+def test_failed_requests_are_not_timed() -> None:
+    router = LoadAwareRouter(RESOURCES[:1])
+
+    try:
+        with router.track(RESOURCES[0]):
+            raise ConnectionError()
+    except ConnectionError:
+        pass
+
+    assert router.get_load(RESOURCES[0]).latency_ewma is None
+    assert router.get_load(RESOURCES[0]).in_flight == 0
+
+
+if __name__ == "__main__":
+    test_p2c_avoids_loaded_resource()
+    test_least_outstanding()
+    test_latency_ewma_and_vitals()
+    test_failed_requests_are_not_timed()
@@ -0,0 +1,150 @@
+import asyncio
+import pickle
+
+import numpy as np
+from aiohttp import web
+
+from serpytor.components.connection.monitor.gateway import Gateway
+from serpytor.components.connection.monitor.serialization import (
+    COMPRESSION_HEADER, FrameDecoder, available_codecs, dumps, dumps_bytes,
+    is_framed, iter_dumps, join_small, loads)
+from serpytor.components.connection.monitor.server import Server
+from serpytor.components.utils.algorithms.allocation import FCFSAllocation
+
+PORT = 8803
+
+
+def double(array):
+    return array * 2
+
+
+def test_roundtrip() -> None:
+    payload = {"args": [1, "two", 3.0], "array": np.arange(12).reshape(3, 4)}
+
+    decoded = loads(dumps_bytes(payload))
+
+    assert decoded["args"] == [1, "two", 3.0]
+    assert np.array_equal(decoded["array"], payload["array"])
+
+
+def test_buffers_are_out_of_band() -> None:
+    array = np.random.rand(256, 256)
+
+    frames = dumps(array, chunk_size=array.nbytes)
+
+    # The last chunk before the END record is a view over the array itself.
+    assert isinstance(frames[-2], memoryview)
+    assert frames[-2].nbytes == array.nbytes
+
+
+def test_zero_copy_decoding() -> None:
+    data = bytearray(dumps_bytes(np.zeros(1024)))
+
+    decoded = loads(data)
+    decoded[0] = 42.0
+
+    assert loads(data)[0] == 42.0
+
+
+def test_incremental_decoding() -> None:
+    array = np.random.rand(300, 300)
+    data = dumps_bytes(array, chunk_size=4096) * 2
+    decoder = FrameDecoder()
+
+    decoded = []
+    for offset in range(0, len(data), 1000):
+        decoded.extend(decoder.feed(data[offset : offset + 1000]))
+
+    assert len(decoded) == 2
+    assert np.array_equal(decoded[1], array)
+    assert decoded[0].flags.writeable
+
+
+def test_compression() -> None:
+    array = np.zeros((512, 512))
+
+    for codec in available_codecs():
+        data = dumps_bytes(array, compression=codec)
+
+        assert len(data) < array.nbytes
+        assert np.array_equal(loads(data), array)
+
+
+def test_plain_pickle_fallback() -> None:
+    data = pickle.dumps([1, 2, 3])
+
+    assert not is_framed(data)
+    assert loads(data) == [1, 2, 3]
+
+
+def test_join_small() -> None:
+    small = join_small(iter_dumps([1, 2, 3]))
+    assert isinstance(small, bytes)
+    assert loads(small) == [1, 2, 3]
+
+    array = np.random.rand(100, 100)
+    large = join_small(iter_dumps(array, chunk_size=4096), limit=4096)
+    assert not isinstance(large, bytes)
+    assert np.array_equal(loads(b"".join(large)), array)
+
+
+def test_streamed_execution() -> None:
+    # A large payload goes from the Gateway to the /exec endpoint of a Server as a
+    # chunked, compressed upload, on the pooled session.
+    compression = (available_codecs() or [None])[0]
+    server = Server(
+        mappings={}, server_port=PORT, server_host="127.0.0.1", exec_pool="thread", exec_workers=2
+    )
+    server.service_web_server.add_routes(server.transform_mappings(server.mappings))
+    uploads = []
+
+    async def record_upload(request, response):
+        uploads.append(
+            (request.headers.get("Transfer-Encoding"), request.headers.get(COMPRESSION_HEADER))
+        )
+
+    server.service_web_server.on_response_prepare.append(record_upload)
+    gateway = Gateway(
+        task=double,
+        allocation_algorithm=FCFSAllocation(),
+        resource_addresses=[f"http://127.0.0.1:{PORT}/exec"],
+        routing_policy="p2c",
+        vitals_ttl=float("inf"),
+        compression=compression,
+        compression_threshold=1024,
+        chunk_size=64 * 1024,
+    )
+    # Half of it compresses well, half of it not at all.
+    array = np.concatenate([np.zeros(250_000), np.random.default_rng(0).random(250_000)])
+
+    async def scenario():
+        runner = web.AppRunner(server.service_web_server)
+        await runner.setup()
+        await web.TCPSite(runner, "127.0.0.1", PORT).start()
+        try:
+            results, sessions = [], []
+            for x in (1, 2):
+                results.append(await gateway.execute(task_args=[array * x]))
+                sessions.append(gateway.get_session())
+        finally:
+            await gateway.close()
+            await runner.cleanup()
+        return results, sessions
+
+    results, sessions = asyncio.run(scenario())
+
+    for x, result in zip((1, 2), results):
+        assert np.array_equal(result["output"], array * x * 2)
+    assert uploads == [("chunked", compression)] * 2
+    assert sessions[0] is sessions[1] and sessions[0].closed
+
+
+if __name__ == "__main__":
+    test_roundtrip()
+    test_buffers_are_out_of_band()
+    test_zero_copy_decoding()
+    test_incremental_decoding()
+    test_compression()
+    test_plain_pickle_fallback()
+    test_join_small()
+    test_streamed_execution()
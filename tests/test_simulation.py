@@ -0,0 +1,128 @@
+import json
+from typing import Any, Callable, List
+
+import pytest
+
+from serpytor.components.utils.algorithms.allocation import (
+    BinPackingAllocation, DeadlineAllocation, FairResourceAllocation,
+    FCFSAllocation, PriorityAllocation, RoundRobinAllocation,
+    WorkStealingAllocation)
+from serpytor.components.utils.simulation import (ClusterSimulator,
+                                                  SimulatedResource,
+                                                  TraceTask, load_trace,
+                                                  poisson_trace)
+
+
+def make_resources(failure_rate: float = 0.0) -> List[SimulatedResource]:
+    return [
+        SimulatedResource(
+            f"node-{idx}", speed=1 + idx % 2, slots=2, failure_rate=failure_rate, repair_time=5.0
+        )
+        for idx in range(4)
+    ]
+
+
+def make_trace(rate: float = 4.0, tenants: int = 1) -> List[TraceTask]:
+    trace = poisson_trace(
+        500, rate=rate, demand={"cpu": (5.0, 40.0), "memory": (5.0, 40.0)}, deadline=5.0
+    )
+    if tenants > 1:
+        for task in trace:
+            task.tenant = f"tenant-{task.index % tenants}"
+    return trace
+
+
+@pytest.mark.parametrize(
+    "make_allocation", [FCFSAllocation, lambda: WorkStealingAllocation(num_workers=4)]
+)
+def test_simulation_is_deterministic(make_allocation: Callable[[], Any]) -> None:
+    # Loaded enough, and with tenants spread over the workers, for steals to happen.
+    first = ClusterSimulator(make_allocation(), make_resources(0.01), make_trace(8.0, 3), seed=3).run()
+    second = ClusterSimulator(make_allocation(), make_resources(0.01), make_trace(8.0, 3), seed=3).run()
+    assert first.as_dict() == second.as_dict()
+    assert first["completed"] == first["tasks"] == 500
+    assert first["failures"] > 0
+    assert first["latency_p50"] <= first["latency_p90"] <= first["latency_p99"]
+    assert 0 < first["utilization"] <= 1
+
+
+def test_simulation_timing() -> None:
+    trace = [TraceTask(0.0, 2.0, index=0), TraceTask(0.0, 2.0, index=1), TraceTask(1.0, 4.0, index=2)]
+    report = ClusterSimulator(
+        FCFSAllocation(), [SimulatedResource("fast", speed=2.0), SimulatedResource("slow")], trace
+    ).run()
+    # 0 and 1 start at once, the fast resource is free again at 1.0 for 2.
+    assert report["makespan"] == pytest.approx(3.0)
+    assert report["latency_p99"] == pytest.approx(2.0)
+    assert report["utilization"] == pytest.approx((1.0 + 2.0 + 2.0) / 6.0)
+
+
+def test_failures_are_retried() -> None:
+    trace = [TraceTask(0.0, 10.0, index=0)]
+    resources = [SimulatedResource("node", failure_rate=1.0, repair_time=0.5)]
+    report = ClusterSimulator(FCFSAllocation(), resources, trace, seed=0).run()
+    assert report["completed"] == 1
+    assert report["retries"] == report["failures"] > 0
+    assert trace[0].attempts == report["retries"] + 1
+
+
+def test_resubmission_rejected_by_admission() -> None:
+    # Admitted on arrival, but once a failure has eaten into its deadline, the task can't
+    # be admitted again.
+    allocation = DeadlineAllocation(admission=True)
+    allocation.estimator.record("task", 10.0)
+    trace = [TraceTask(0.0, 10.0, deadline=11.0, index=0)]
+    resources = [SimulatedResource("node", failure_rate=1.0, repair_time=0.5)]
+    report = ClusterSimulator(allocation, resources, trace, seed=0).run()
+    assert report["completed"] == 0
+    assert report["rejected"] == 1
+    assert report["retries"] == report["failures"] > 0
+
+
+@pytest.mark.parametrize(
+    "make_allocation",
+    [
+        FCFSAllocation,
+        lambda: RoundRobinAllocation(num_queues=1),
+        PriorityAllocation,
+        FairResourceAllocation,
+        lambda: WorkStealingAllocation(num_workers=4),
+        lambda: DeadlineAllocation(workers=8),
+        BinPackingAllocation,
+    ],
+)
+def test_allocations_run_to_completion(make_allocation: Callable[[], Any]) -> None:
+    report = ClusterSimulator(make_allocation(), make_resources(0.005), make_trace(), seed=1).run()
+    assert report["completed"] == 500
+    assert report["retries"] >= 0
+
+
+def test_load_trace(tmp_path) -> None:
+    path = tmp_path / "trace.jsonl"
+    path.write_text(
+        "\n".join(
+            json.dumps(record)
+            for record in [
+                {"arrival": 0.5, "work": 1.0, "tenant": "a"},
+                {"arrival": 0.0, "work": 2.0, "demand": {"cpu": 50}, "deadline": 1.0},
+            ]
+        )
+        + "\n"
+    )
+    trace = load_trace(str(path))
+    assert [task.index for task in trace] == [0, 1]
+    assert trace[0].tenant == "a" and trace[1].demand == {"cpu": 50}
+    report = ClusterSimulator(FCFSAllocation(), [SimulatedResource("node")], trace).run()
+    # The second task arrives first, and is late.
+    assert report["makespan"] == pytest.approx(3.0)
+    assert report["deadline_misses"] == 1
+
+
+if __name__ == "__main__":
+    test_simulation_is_deterministic(FCFSAllocation)
+    test_simulation_is_deterministic(lambda: WorkStealingAllocation(num_workers=4))
+    test_simulation_timing()
+    test_failures_are_retried()
+    test_resubmission_rejected_by_admission()
+    for allocation_class in (FCFSAllocation, PriorityAllocation, FairResourceAllocation, BinPackingAllocation):
+        test_allocations_run_to_completion(allocation_class)
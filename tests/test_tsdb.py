@@ -0,0 +1,109 @@
+import os
+import time
+
+from serpytor.components.database.tsdb import TimeSeriesDB
+
+NODE: str = "http://127.0.0.1:8100/heartbeat"
+START: float = 1_699_999_200.0  # On the hour.
+
+
+def test_rollups(tmp_path) -> None:
+    db = TimeSeriesDB(str(tmp_path), segment_capacity=1000, flush_size=500)
+    # Two hours of one point per second, the value being the minute of the hour.
+    for second in range(7200):
+        db.append("cpu", NODE, float(second // 60 % 60), START + second)
+
+    raw = db.query("cpu", NODE, START, START + 120, resolution="raw")
+    assert len(raw["timestamps"]) == 120
+    assert list(raw["value"][:3]) == [0.0, 0.0, 0.0]
+
+    minutes = db.query("cpu", NODE, START, START + 7200, resolution="1m")
+    assert len(minutes["timestamps"]) == 120
+    assert set(minutes["count"]) == {60.0}
+    assert list(minutes["mean"][:3]) == [0.0, 1.0, 2.0]
+
+    hours = db.query("cpu", NODE, resolution="1h")
+    assert list(hours["count"]) == [3600.0, 3600.0]
+    assert min(hours["min"]) == 0.0 and max(hours["max"]) == 59.0
+
+    # Without a resolution, the finest one that fits in `max_points` is picked.
+    assert db.query("cpu", NODE, START, START + 600)["resolution"] == "raw"
+    assert db.query("cpu", NODE, START, START + 7200)["resolution"] == "1m"
+    assert db.query("cpu", NODE, START, START + 7200, max_points=10)["resolution"] == "1h"
+    db.close()
+
+
+def test_reopen_resumes_rollups(tmp_path) -> None:
+    db = TimeSeriesDB(str(tmp_path))
+    for second in range(30):
+        db.append("cpu", NODE, 10.0, START + second)
+    db.close()
+
+    db = TimeSeriesDB(str(tmp_path))
+    assert db.latest("cpu", NODE) == (START + 29, 10.0)
+    # Older points are ignored.
+    assert not db.append("cpu", NODE, 99.0, START)
+    for second in range(30, 60):
+        db.append("cpu", NODE, 40.0, START + second)
+
+    minute = db.query("cpu", NODE, resolution="1m")
+    assert list(minute["count"]) == [60.0]
+    assert list(minute["mean"]) == [25.0]
+    assert db.series() == [("cpu", NODE)]
+    db.close()
+
+
+def test_vitals_and_retention(tmp_path) -> None:
+    db = TimeSeriesDB(
+        str(tmp_path), segment_capacity=100, retention={"raw": 3600.0}
+    )
+    vitals = {
+        "location": NODE,
+        "cpu": 12.5,
+        "memory": 40.0,
+        "windows": {
+            "10s": {"cpu": 11.0, "tasks": 50, "latency_p50": 0.2},
+            "1s": {"cpu": 12.0, "tasks": 4, "latency_p50": 0.1},
+        },
+    }
+    for second in range(0, 7200, 10):
+        db.append_vitals(NODE, vitals, START + second)
+
+    assert sorted(metric for metric, _ in db.series()) == [
+        "cpu", "latency_p50", "memory", "tasks",
+    ]
+    assert db.latest("tasks", NODE) == (START + 7190, 4.0)
+
+    assert db.enforce_retention(now=START + 7200) > 0
+    raw = db.query("cpu", NODE, resolution="raw")
+    assert raw["timestamps"][0] >= START + 3600 - 100 * 10
+    # The rollups are kept longer.
+    assert db.query("cpu", NODE, resolution="1m")["timestamps"][0] == START
+    assert len(os.listdir(os.path.join(str(tmp_path), "raw", "0"))) < 8
+    db.close()
+
+
+def test_query_speed(tmp_path) -> None:
+    db = TimeSeriesDB(str(tmp_path))
+    # Two days of one point every 10 seconds, for 20 nodes.
+    for node in range(20):
+        for step in range(0, 2 * 86400, 10):
+            db.append("cpu", str(node), 50.0, START + step)
+    db.flush()
+
+    started: float = time.perf_counter()
+    results = db.query_nodes("cpu", [str(node) for node in range(20)], START, START + 2 * 86400)
+    elapsed: float = time.perf_counter() - started
+
+    assert {result["resolution"] for result in results.values()} == {"1h"}
+    assert all(len(result["timestamps"]) == 48 for result in results.values())
+    assert elapsed < 0.5
+    db.close()
+
+
+if __name__ == "__main__":
+    import tempfile
+
+    for test in (test_rollups, test_reopen_resumes_rollups, test_vitals_and_retention, test_query_speed):
+        with tempfile.TemporaryDirectory() as path:
+            test(path)
@@ -0,0 +1,132 @@
+import asyncio
+import json
+
+import aiohttp
+from aiohttp import web
+
+from serpytor.components.connection.monitor.vitals import (VitalsSampler,
+                                                           VitalsSubscriber,
+                                                           apply_delta,
+                                                           diff_vitals)
+
+PORT = 8791
+
+
+class FixedVitalsSampler(VitalsSampler):
+    def __init__(self, *args, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        self.samples = 0
+        self.cpu = 12.5
+
+    def sample(self):
+        self.samples += 1
+        return {"location": self.location, "cpu": self.cpu, "memory": 40.0}
+
+
+async def poll(sampler: VitalsSampler, count: int):
+    app = web.Application()
+    app.on_startup.append(sampler.start)
+    app.on_cleanup.append(sampler.stop)
+    app.add_routes([web.get("/heartbeat", sampler.handle)])
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, "127.0.0.1", PORT).start()
+
+    try:
+        async with aiohttp.ClientSession() as session:
+            url = f"http://127.0.0.1:{PORT}/heartbeat"
+            async with session.get(url) as resp:
+                first = (resp.status, resp.headers["ETag"], await resp.read())
+
+            async def conditional_get():
+                async with session.get(url, headers={"If-None-Match": first[1]}) as resp:
+                    return resp.status
+
+            statuses = await asyncio.gather(*[conditional_get() for _ in range(count)])
+            return first, statuses
+    finally:
+        await runner.cleanup()
+
+
+def test_heartbeats_are_cached() -> None:
+    sampler = FixedVitalsSampler("http://127.0.0.1:8100", interval=60)
+
+    (status, etag, body), statuses = asyncio.run(poll(sampler, 20))
+
+    assert status == 200
+    vitals = json.loads(body)
+    assert vitals["location"] == "http://127.0.0.1:8100"
+    assert vitals["cpu"] == 12.5
+    assert vitals["memory"] == 40.0
+    assert vitals["windows"]["10s"]["cpu"] == 12.5
+    assert etag == sampler.etag
+    assert statuses == [304] * 20
+    # Sampled once at startup, however many times it was polled.
+    assert sampler.samples == 1
+
+
+def test_etag_changes_with_vitals() -> None:
+    sampler = FixedVitalsSampler("http://127.0.0.1:8100")
+    sampler.refresh()
+    etag = sampler.etag
+
+    sampler.refresh()
+    assert sampler.etag == etag
+
+    sampler.location = "http://127.0.0.1:8101"
+    sampler.refresh()
+    assert sampler.etag != etag
+
+
+def test_delta_encoding() -> None:
+    old = {"cpu": 10.0, "memory": 40.0, "windows": {"1s": {"cpu": 10.0, "memory": 40.0}}}
+    new = {"cpu": 20.0, "memory": 40.0, "windows": {"1s": {"cpu": 20.0, "memory": 40.0}}}
+
+    changes = diff_vitals(old, new)
+
+    assert changes == {"cpu": 20.0, "windows": {"1s": {"cpu": 20.0}}}
+    assert apply_delta(old, changes) == new
+    assert diff_vitals(new, new) == {}
+
+
+async def subscribe(sampler: FixedVitalsSampler):
+    app = web.Application()
+    app.on_startup.append(sampler.start)
+    app.on_cleanup.append(sampler.stop)
+    app.add_routes([web.get("/heartbeat/ws", sampler.subscribe)])
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, "127.0.0.1", PORT + 1).start()
+
+    updates = []
+    subscriber = VitalsSubscriber(
+        [f"http://127.0.0.1:{PORT + 1}/heartbeat"],
+        on_update=lambda address, vitals: updates.append(vitals["cpu"]),
+    )
+    try:
+        await subscriber.start()
+        assert await subscriber.wait_ready(timeout=5)
+        sampler.cpu = 50.0
+        await asyncio.sleep(sampler.interval * 5)
+        return updates, subscriber.vitals
+    finally:
+        await subscriber.stop()
+        await runner.cleanup()
+
+
+def test_vitals_are_pushed() -> None:
+    sampler = FixedVitalsSampler("http://127.0.0.1:8100", interval=0.05)
+
+    updates, vitals = asyncio.run(subscribe(sampler))
+
+    assert updates[0] == 12.5
+    assert updates[-1] == 50.0
+    assert vitals[f"http://127.0.0.1:{PORT + 1}/heartbeat"]["cpu"] == 50.0
+    assert vitals[f"http://127.0.0.1:{PORT + 1}/heartbeat"]["memory"] == 40.0
+
+
+if __name__ == "__main__":
+    test_heartbeats_are_cached()
+    test_etag_changes_with_vitals()
+    test_delta_encoding()
+    test_vitals_are_pushed()
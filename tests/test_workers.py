@@ -0,0 +1,86 @@
+import os
+import signal
+import time
+from multiprocessing import Process
+
+import requests
+from aiohttp import web
+
+from serpytor.components.connection.monitor.server import Server
+from serpytor.components.connection.monitor.workers import WorkerSupervisor
+
+PORT = 8795
+SERVER_PORT = 8794
+HEARTBEAT_PORT = 8792
+
+
+async def hello(request: web.Request) -> web.Response:
+    return web.json_response({"pid": os.getpid()})
+
+
+def wait_for_health(generation: int, timeout: float = 20.0, port: int = PORT) -> dict:
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            health = requests.get(f"http://127.0.0.1:{port}/health", timeout=1).json()
+            if health["generation"] == generation:
+                return health
+        except requests.RequestException:
+            pass
+        time.sleep(0.1)
+    raise TimeoutError(f"No worker of generation {generation} answered.")
+
+
+def test_workers_share_port_and_reload() -> None:
+    app = web.Application()
+    app.add_routes([web.get("/hello", hello)])
+    supervisor = WorkerSupervisor(
+        app, host="127.0.0.1", port=PORT, workers=2, health_interval=0.2
+    )
+    process = Process(target=supervisor.run)
+    process.start()
+
+    try:
+        health = wait_for_health(1)
+        assert health["slot"] in (0, 1)
+        assert requests.get(f"http://127.0.0.1:{PORT}/hello", timeout=1).ok
+
+        os.kill(process.pid, signal.SIGHUP)
+        health = wait_for_health(2)
+        assert health["generation"] == 2
+        assert requests.get(f"http://127.0.0.1:{PORT}/hello", timeout=1).ok
+    finally:
+        process.terminate()
+        process.join(timeout=40)
+
+    assert not process.is_alive()
+
+
+def test_server_execute_reload_and_stop() -> None:
+    server = Server(
+        mappings={},
+        server_port=SERVER_PORT,
+        server_host="127.0.0.1",
+        heartbeat_port=HEARTBEAT_PORT,
+        service_workers=2,
+        exec_pool="thread",
+        exec_workers=1,
+    )
+    server.execute()
+
+    try:
+        # The processes are known here, where execute() was called.
+        assert server.service_process.is_alive() and server.heartbeat_process.is_alive()
+        wait_for_health(1, port=SERVER_PORT)
+        server.reload_service()
+        wait_for_health(2, port=SERVER_PORT)
+    finally:
+        server.stop(timeout=40)
+
+    assert not server.service_process.is_alive()
+    assert not server.heartbeat_process.is_alive()
+
+
+if __name__ == "__main__":
+    test_workers_share_port_and_reload()
+    test_server_execute_reload_and_stop()